@@ -1,27 +1,101 @@
+import os
 from flask import Flask
-from SPARQLWrapper import SPARQLWrapper, JSON, POST
 from config import Config
+from .sparql_client import SparqlClient
+from .local_store import LocalStore
+from .cache import query_cache
+from .search_index import search_index
+from .auth import credential_index, login_throttle
+from .changes import shared_changes
+from .metrics import metrics
+from .catalog import semester_catalog
+from .timetable import timetable_index
+from .coenrollment import co_enrollment
+from .analytics import cohort_analytics
 
-# Khởi tạo biến sparql toàn cục
+# Khởi tạo client SPARQL toàn cục (an toàn khi dùng chung giữa các thread)
 sparql = None
 
-def init_driver(endpoint):
+def init_driver(endpoint, pool_size=10, connect_timeout=3.0, read_timeout=30.0,
+                backend="graphdb", store_path=None, engine="auto"):
+    """
+    backend "graphdb": GraphDB qua HTTP tại `endpoint`;
+    backend "local": RDF store nhúng trong process (xem LocalStore), bỏ qua `endpoint`
+    """
     global sparql
-    sparql = SPARQLWrapper(endpoint)
-    # Cấu hình trả về JSON để dễ xử lý trong Python
-    sparql.setReturnFormat(JSON)
-    # Cấu hình method để hỗ trợ cả Query (SELECT) và Update (INSERT/DELETE)
-    sparql.setMethod(POST) 
+    if sparql is not None:
+        sparql.close()
+    if backend == "local":
+        sparql = LocalStore(store_path, engine=engine)
+    elif backend == "graphdb":
+        sparql = SparqlClient(endpoint, pool_size=pool_size,
+                              connect_timeout=connect_timeout, read_timeout=read_timeout)
+    else:
+        raise ValueError(f"SPARQL_BACKEND không hợp lệ: {backend}")
 
 def get_driver():
     return sparql
 
-def create_app():
+def close_driver():
+    global sparql
+    if sparql is not None:
+        sparql.close()
+        sparql = None
+
+def create_app(**overrides):
+    """`overrides`: ghi đè vài giá trị của Config (vd. serve.py bật ENROLL_JOURNAL_PER_PROCESS)"""
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config.update(overrides)
+
+    # Kết nối GraphDB (hoặc store nhúng nếu SPARQL_BACKEND=local)
+    init_driver(app.config['GRAPHDB_ENDPOINT'],
+                pool_size=app.config['GRAPHDB_POOL_SIZE'],
+                connect_timeout=app.config['GRAPHDB_CONNECT_TIMEOUT'],
+                read_timeout=app.config['GRAPHDB_READ_TIMEOUT'],
+                backend=app.config['SPARQL_BACKEND'],
+                store_path=app.config['LOCAL_STORE_PATH'],
+                engine=app.config['LOCAL_STORE_ENGINE'])
+    if app.config['METRICS_ENABLED']:
+        metrics.enable(app.config['SLOW_QUERY_SECONDS'])
+        sparql.observer = metrics.observe
+    query_cache.configure(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL_SECONDS'])
+    credential_index.ttl = app.config['AUTH_CACHE_TTL_SECONDS']
+    shared_changes.configure(app.config['SHARED_CHANGES_PATH'] or None)
+    search_index.ttl = app.config['SEARCH_TTL_SECONDS']
+    login_throttle.max_failures = app.config['AUTH_MAX_FAILURES']
+    login_throttle.window = app.config['AUTH_LOCKOUT_SECONDS']
+    semester_catalog.ttl = app.config['CATALOG_TTL_SECONDS']
+    timetable_index.ttl = app.config['TIMETABLE_TTL_SECONDS']
+    co_enrollment.ttl = app.config['COENROLLMENT_TTL_SECONDS']
+    cohort_analytics.pass_score = app.config['ANALYTICS_PASS_SCORE']
+
+    from .dao import init_fanout
+    init_fanout(app.config['SPARQL_FANOUT_WORKERS'])
+
+    from .dao import Dao
+    from .queries import queries
+    if app.config['QUERY_VALIDATE_ON_START']:
+        queries.validate()  # câu truy vấn sai cú pháp thì báo ngay khi khởi động
+    from .enrollment_queue import enrollment_queue, worker_journal_path, claim_orphan_journals
+    if app.config['ENROLL_QUEUE_ENABLED'] and not enrollment_queue.running:
+        journal_path, adopt = app.config['ENROLL_JOURNAL_PATH'], []
+        if journal_path:
+            # Nhận journal của các worker đã thoát (chỉ có khi chạy bằng serve.py)
+            adopt = claim_orphan_journals(journal_path, os.getpid())
+            if app.config['ENROLL_JOURNAL_PER_PROCESS']:
+                journal_path = worker_journal_path(journal_path, os.getpid())
+        enrollment_queue.start(Dao.apply_enrollment_batch,
+                               interval=app.config['ENROLL_FLUSH_INTERVAL'],
+                               max_batch=app.config['ENROLL_BATCH_MAX'],
+                               ack_timeout=app.config['ENROLL_ACK_TIMEOUT'],
+                               journal_path=journal_path, adopt=adopt,
+                               max_attempts=app.config['ENROLL_RETRY_MAX'],
+                               retry_delay_max=app.config['ENROLL_RETRY_DELAY_MAX'])
 
-    # Kết nối GraphDB
-    init_driver(app.config['GRAPHDB_ENDPOINT'])
+    from .stats_counters import start_reconciler
+    if app.config['STATS_RECONCILE_SECONDS'] > 0:
+        start_reconciler(Dao.reconcile_stats, app.config['STATS_RECONCILE_SECONDS'])
 
     from .routes import main_bp
     app.register_blueprint(main_bp)
@@ -30,4 +104,5 @@ def create_app():
 
 def init_db_data():
     from .dao import Dao
-    Dao.init_db()
\ No newline at end of file
+    Dao.init_db()
+    Dao.migrate_grade_nodes()
\ No newline at end of file
@@ -0,0 +1,137 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GPA_BINS = 10   # phân bố GPA thang 10 theo khoảng 1 điểm: [0,1), [1,2), ..., [9,10]
+
+
+def _round(value):
+    return None if value is None or value != value else round(float(value), 2)
+
+
+def _ratio(num, den):
+    """num / den theo từng phần tử, chỗ den = 0 thì NaN"""
+    return np.divide(num, den, out=np.full(len(num), np.nan), where=den > 0)
+
+
+def _score(text):
+    try:
+        value = float(str(text).replace(",", "."))
+    except (TypeError, ValueError):
+        return np.nan
+    return value if 0 <= value <= 10 else np.nan
+
+
+class CohortAnalytics:
+    """
+    Thống kê cả khóa (phân bố GPA theo Khoa, tỉ lệ qua môn theo lớp, phân bố số tín chỉ đăng ký)
+    của 1 học kỳ. Dao lấy toàn bộ lượt đăng ký kèm tín chỉ, điểm bằng 1 truy vấn; ở đây dữ liệu
+    được chuyển thành các cột NumPy (mỗi lượt đăng ký 1 phần tử) và tính gộp bằng bincount
+    thay vì lặp từng sinh viên. Cần numpy (pip install numpy), không có thì `available` = False.
+    """
+
+    def __init__(self, pass_score=4.0):
+        self.pass_score = pass_score
+
+    @property
+    def available(self):
+        return np is not None
+
+    def columns(self, rows):
+        """
+        rows: [(mã SV, Khoa, mã lớp, tín chỉ, điểm)], mỗi (SV, lớp) lấy dòng đầu; tín chỉ / điểm
+        thiếu hoặc sai định dạng thì là 0 / NaN. Trả về dict các cột: chỉ số SV, Khoa, lớp của
+        từng lượt đăng ký cùng nhãn tương ứng.
+        """
+        seen, sids, depts, classes, credits, scores = set(), [], [], [], [], []
+        for sid, dept, class_id, credit, score in rows:
+            if (sid, class_id) in seen:
+                continue
+            seen.add((sid, class_id))
+            sids.append(sid)
+            depts.append(dept or "")
+            classes.append(class_id)
+            try:
+                credits.append(float(credit))
+            except (TypeError, ValueError):
+                credits.append(0.0)
+            scores.append(_score(score))
+        students, s_idx = np.unique(np.array(sids, dtype=str), return_inverse=True)
+        dept_names, d_idx = np.unique(np.array(depts, dtype=str), return_inverse=True)
+        class_ids, c_idx = np.unique(np.array(classes, dtype=str), return_inverse=True)
+        return {"student": s_idx, "dept": d_idx, "class": c_idx,
+                "credit": np.array(credits, dtype=float), "score": np.array(scores, dtype=float),
+                "students": students, "depts": dept_names, "classes": class_ids}
+
+    def summarize(self, semester, rows):
+        cols = self.columns(rows)
+        s_idx, c_idx, credit, score = cols["student"], cols["class"], cols["credit"], cols["score"]
+        n_students, n_depts, n_classes = len(cols["students"]), len(cols["depts"]), len(cols["classes"])
+        graded = ~np.isnan(score)
+        passed = graded & (score >= self.pass_score)
+
+        # Theo sinh viên: tổng tín chỉ đăng ký và GPA (trung bình điểm có trọng số tín chỉ)
+        load = np.bincount(s_idx, weights=credit, minlength=n_students)
+        points = np.bincount(s_idx[graded], weights=(score * credit)[graded], minlength=n_students)
+        gpa = _ratio(points, np.bincount(s_idx[graded], weights=credit[graded], minlength=n_students))
+        has_gpa = ~np.isnan(gpa)
+        student_dept = np.zeros(n_students, dtype=np.int64)
+        student_dept[s_idx] = cols["dept"]
+        gpa_bin = np.minimum(np.floor(gpa[has_gpa]), GPA_BINS - 1).astype(np.int64)
+
+        # Theo Khoa (của sinh viên): số SV, GPA trung bình / trung vị, phân bố GPA, tỉ lệ qua môn
+        dept_of_gpa = student_dept[has_gpa]
+        dept_gpa_count = np.bincount(dept_of_gpa, minlength=n_depts)
+        dept_gpa_mean = _ratio(np.bincount(dept_of_gpa, weights=gpa[has_gpa], minlength=n_depts), dept_gpa_count)
+        dept_hist = np.bincount(dept_of_gpa * GPA_BINS + gpa_bin,
+                                minlength=n_depts * GPA_BINS).reshape(n_depts, GPA_BINS)
+        order = np.lexsort((gpa[has_gpa], dept_of_gpa))
+        sorted_gpa, bounds = gpa[has_gpa][order], np.concatenate(([0], np.cumsum(dept_gpa_count)))
+        row_dept = cols["dept"]
+        dept_rate = _ratio(np.bincount(row_dept[passed], minlength=n_depts).astype(float),
+                           np.bincount(row_dept[graded], minlength=n_depts).astype(float))
+        by_dept = [{"dept": str(cols["depts"][d]) or "(Chưa có Khoa)",
+                    "students": int(n), "with_gpa": int(dept_gpa_count[d]),
+                    "gpa_mean": _round(dept_gpa_mean[d]),
+                    "gpa_median": _round(np.median(sorted_gpa[bounds[d]:bounds[d + 1]]))
+                    if dept_gpa_count[d] else None,
+                    "pass_rate": _round(dept_rate[d] * 100),
+                    "histogram": dept_hist[d].tolist()}
+                   for d, n in enumerate(np.bincount(student_dept, minlength=n_depts))]
+        by_dept.sort(key=lambda x: (-x["students"], x["dept"]))
+
+        # Theo lớp: sĩ số, số đầu điểm, tỉ lệ qua môn, điểm trung bình; lớp tỉ lệ qua thấp nhất trước
+        class_graded = np.bincount(c_idx[graded], minlength=n_classes)
+        class_passed = np.bincount(c_idx[passed], minlength=n_classes)
+        class_rate = _ratio(class_passed.astype(float), class_graded.astype(float))
+        class_mean = _ratio(np.bincount(c_idx[graded], weights=score[graded], minlength=n_classes),
+                            class_graded.astype(float))
+        class_size = np.bincount(c_idx, minlength=n_classes)
+        ranked = [c for c in np.lexsort((cols["classes"], class_rate)) if class_graded[c]]
+        by_class = [{"class_id": str(cols["classes"][c]), "enrolled": int(class_size[c]),
+                     "graded": int(class_graded[c]), "passed": int(class_passed[c]),
+                     "pass_rate": _round(class_rate[c] * 100), "mean_score": _round(class_mean[c])}
+                    for c in ranked]
+
+        loads, counts = np.unique(load.astype(np.int64), return_counts=True)
+        return {
+            "semester": semester,
+            "pass_score": self.pass_score,
+            "students": n_students,
+            "enrollments": len(s_idx),
+            "graded": int(graded.sum()),
+            "pass_rate": _round(passed.sum() / graded.sum() * 100) if graded.any() else None,
+            "gpa_mean": _round(gpa[has_gpa].mean()) if has_gpa.any() else None,
+            "gpa_median": _round(np.median(gpa[has_gpa])) if has_gpa.any() else None,
+            "gpa_histogram": [{"label": f"{b}-{b + 1}", "count": int(n)}
+                              for b, n in enumerate(np.bincount(gpa_bin, minlength=GPA_BINS))],
+            "credit_load_mean": _round(load.mean()) if n_students else None,
+            "credit_load": [{"credits": int(c), "students": int(n)} for c, n in zip(loads, counts)],
+            "by_dept": by_dept,
+            "by_class": by_class,
+        }
+
+
+# Dùng chung cho Dao (kết quả được cache theo học kỳ, xem Dao.get_cohort_analytics)
+cohort_analytics = CohortAnalytics()
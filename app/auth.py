@@ -0,0 +1,109 @@
+import hashlib
+import hmac
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+class CredentialIndex:
+    """
+    Chỉ mục tài khoản trong bộ nhớ: (role, username) -> hash SHA-256 có salt riêng.
+    Không giữ mật khẩu gốc. Mỗi mục có hạn dùng (TTL, có dao động ngẫu nhiên để
+    không hết hạn cùng lúc) để nhận cả thay đổi ghi thẳng vào GraphDB. Thay đổi từ
+    worker khác của ứng dụng được báo qua shared_changes (xem Dao.verify_user).
+    """
+
+    def __init__(self, ttl=900):
+        self.ttl = ttl
+        self.ready = False
+        self._creds = {}   # (role, username) -> (salt, digest, hết hạn lúc)
+        self._lock = threading.Lock()
+
+    def _digest(self, salt, password):
+        return hashlib.sha256(salt + str(password).encode('utf-8')).digest()
+
+    def _entry(self, password):
+        salt = os.urandom(16)
+        expires = time.monotonic() + self.ttl * random.uniform(0.8, 1.2)
+        return salt, self._digest(salt, password), expires
+
+    def load(self, entries):
+        """Nạp lại toàn bộ từ danh sách (role, username, password)"""
+        creds = {(role, username): self._entry(password) for role, username, password in entries}
+        with self._lock:
+            self._creds = creds
+            self.ready = True
+
+    def set(self, role, username, password):
+        entry = self._entry(password)
+        with self._lock:
+            self._creds[(role, username)] = entry
+
+    def remove(self, role, username):
+        with self._lock:
+            self._creds.pop((role, username), None)
+
+    def invalidate(self):
+        """Đánh dấu cần nạp lại toàn bộ (vd. sau khi import hàng loạt)"""
+        self.ready = False
+
+    def verify(self, role, username, password):
+        """True/False nếu tài khoản có trong chỉ mục và còn hạn, None nếu cần hỏi lại GraphDB"""
+        with self._lock:
+            entry = self._creds.get((role, username))
+        if entry is None or entry[2] < time.monotonic():
+            return None
+        salt, digest, _ = entry
+        return hmac.compare_digest(digest, self._digest(salt, password))
+
+
+class LoginThrottle:
+    """
+    Giới hạn số lần đăng nhập sai: quá `max_failures` lần trong `window` giây
+    thì khóa tạm khóa đó (vd. (role, username, IP)) cho tới khi lần sai cũ hết hạn.
+    """
+
+    def __init__(self, max_failures=5, window=60):
+        self.max_failures = max_failures
+        self.window = window
+        self._failures = {}   # key -> deque[thời điểm sai]
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return None
+        return attempts
+
+    def blocked(self, key):
+        with self._lock:
+            attempts = self._recent(key, time.monotonic())
+            return attempts is not None and len(attempts) >= self.max_failures
+
+    def failed(self, key):
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._recent(key, now)
+            if attempts is None:
+                attempts = self._failures[key] = deque(maxlen=self.max_failures)
+            attempts.append(now)
+            # Dọn các khóa đã hết hạn khi bảng phình to
+            if len(self._failures) > 10000:
+                for k in list(self._failures):
+                    self._recent(k, now)
+
+    def succeeded(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+# Dùng chung cho toàn ứng dụng (cấu hình lại trong create_app)
+credential_index = CredentialIndex()
+login_throttle = LoginThrottle()
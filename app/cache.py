@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    Cache kết quả truy vấn (LRU, có TTL) dùng chung giữa các thread.
+    Mỗi mục gắn với các tag là loại dữ liệu nó phụ thuộc (vd. 'students',
+    'student:SV001'); khi ghi dữ liệu chỉ cần xóa đúng các tag bị ảnh hưởng.
+    """
+
+    def __init__(self, max_entries=512, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (hết hạn lúc, tags, giá trị)
+        self._by_tag = {}            # tag -> set(key)
+        self._gen = {}               # tag -> số lần bị invalidate
+        # Phân biệt các lần khởi động / process khác nhau khi dùng _gen làm phiên bản dữ liệu
+        self.new_epoch()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0       # bị đẩy ra do vượt max_entries
+        self.expirations = 0     # hết TTL
+        self.invalidations = 0   # bị xóa do ghi dữ liệu
+
+    def new_epoch(self):
+        self.epoch = f"{os.getpid():x}{int(time.time()):x}"
+
+    def configure(self, max_entries, ttl):
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def get(self, key):
+        """Trả về (True, giá trị) nếu có trong cache và còn hạn, ngược lại (False, None)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+    def snapshot(self, tags):
+        """Ghi nhận phiên bản của các tag trước khi chạy truy vấn (dùng cho set)"""
+        with self._lock:
+            return tuple(self._gen.get(t, 0) for t in tags)
+
+    def version(self, tags):
+        """
+        Chuỗi phiên bản của dữ liệu thuộc các tag, đổi mỗi khi có ghi (invalidate).
+        Kèm mốc TTL: ghi từ process khác không làm tăng _gen ở đây, nên phiên bản
+        cũng chỉ được tin trong tối đa 1 TTL giống như kết quả cache.
+        """
+        gens = ".".join(str(g) for g in self.snapshot(tags))
+        return f"{self.epoch}-{gens}-{int(time.time() // max(self.ttl, 1))}"
+
+    def set(self, key, value, tags, snapshot=None):
+        """
+        Lưu kết quả. Nếu truyền `snapshot` mà có tag đã bị invalidate trong lúc
+        truy vấn đang chạy thì bỏ qua, tránh ghi đè kết quả cũ vào cache.
+        """
+        with self._lock:
+            if snapshot is not None and snapshot != tuple(self._gen.get(t, 0) for t in tags):
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, tags, value)
+            for t in tags:
+                self._by_tag.setdefault(t, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for t in tags:
+                self._gen[t] = self._gen.get(t, 0) + 1
+                for key in list(self._by_tag.get(t, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_tag.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _drop(self, key):
+        _, tags, _ = self._data.pop(key)
+        for t in tags:
+            keys = self._by_tag.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[t]
+
+
+# Cache dùng chung cho toàn bộ Dao (cấu hình lại trong create_app)
+query_cache = QueryCache()
+# Worker fork từ process master (serve.py) phải có epoch riêng, nếu không 2 worker có thể
+# trả cùng ETag cho dữ liệu khác nhau
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=query_cache.new_epoch)
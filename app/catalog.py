@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class SemesterCatalog:
+    """
+    Danh mục lớp học phần của học kỳ đang mở đăng ký, dựng 1 lần từ GraphDB (các lớp có
+    uni:offeredIn học kỳ đó) và dùng chung cho mọi sinh viên. Trang Đăng ký học phần chỉ
+    cần trừ đi tập lớp sinh viên đã đăng ký trong bộ nhớ, nên không phụ thuộc số lớp của
+    các học kỳ cũ. Sĩ số được Dao cộng/trừ ngay khi ghi đăng ký; cả danh mục được dựng lại
+    khi lớp/môn/giảng viên/học kỳ thay đổi hoặc sau `ttl` giây (nhận thay đổi từ process khác).
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.ready = False
+        self.semester = None
+        self._classes = {}     # mã lớp (theo IRI) -> thông tin lớp + "enrolled", "capacity"
+        self._order = []       # mã lớp theo thứ tự hiển thị
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def fresh(self):
+        return self.ready and time.monotonic() < self._expires
+
+    def load(self, semester, classes):
+        """Thay toàn bộ danh mục. classes: [dict có "key" (mã lớp theo IRI), "class_id", ...]"""
+        by_key = {}
+        for c in classes:
+            by_key.setdefault(c["key"], c)   # lớp có nhiều GV/môn: giữ dòng đầu
+        with self._lock:
+            self.semester = semester
+            self._classes = by_key
+            self._order = sorted(by_key, key=lambda k: by_key[k]["class_id"])
+            self._expires = time.monotonic() + self.ttl
+            self.ready = True
+
+    def invalidate(self):
+        """Đánh dấu cần dựng lại (vd. vừa mở lớp mới, đổi tên môn học)"""
+        self.ready = False
+
+    def add_enrolled(self, key, delta):
+        with self._lock:
+            c = self._classes.get(key)
+            if c is not None:
+                c["enrolled"] = max(c["enrolled"] + delta, 0)
+
+    def available(self, enrolled_keys, hide=None):
+        """
+        Các lớp trong danh mục mà sinh viên chưa đăng ký (bản sao, kèm số chỗ còn trống).
+        `hide(mã lớp)` trả về giá trị đúng thì bỏ lớp đó (vd. trùng lịch).
+        """
+        with self._lock:
+            items = [dict(self._classes[k]) for k in self._order if k not in enrolled_keys]
+        if hide is not None:
+            items = [c for c in items if not hide(c["key"])]
+        for c in items:
+            del c["key"]
+            cap = c["capacity"]
+            c["seats_left"] = None if cap is None else max(cap - c["enrolled"], 0)
+        return items
+
+
+# Danh mục dùng chung cho Dao (dựng lần đầu khi mở trang Đăng ký học phần)
+semester_catalog = SemesterCatalog()
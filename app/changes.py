@@ -0,0 +1,87 @@
+import os
+import threading
+
+
+class SharedChanges:
+    """
+    Tín hiệu thay đổi dùng chung giữa các process (worker của serve.py): file append-only,
+    mỗi dòng "<pid>\\t<khóa>". Process ghi dữ liệu thì `publish` khóa của phần vừa đổi
+    (vd. "auth:student:SV001"); process khác gọi `poll` (1 lần os.stat, chỉ đọc file khi có
+    dòng mới) để lấy các khóa đó và bỏ phần cache tương ứng, thay vì chờ hết TTL.
+    File lớn quá `max_bytes` thì được thay bằng file mới; process đọc thấy file đổi (inode
+    khác hoặc ngắn đi) thì `poll` trả về None: không biết đã bỏ lỡ gì, phải bỏ toàn bộ cache.
+    """
+
+    def __init__(self, path=None, max_bytes=1 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._pid = str(os.getpid())
+        self._file = None       # (inode, offset) đã đọc tới
+        self._lock = threading.Lock()
+
+    def configure(self, path):
+        """Đặt file dùng chung (None = tắt); các thay đổi trước lúc này được bỏ qua"""
+        with self._lock:
+            self.path = path
+            self._pid = str(os.getpid())
+            self._file = self._stat() if path else None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def publish(self, *keys):
+        if not self.path or not keys:
+            return
+        data = "".join(f"{self._pid}\t{key}\n" for key in keys).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if self._stat()[1] + len(data) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.old")
+            # O_APPEND: mỗi lần ghi nằm trọn ở cuối file, không chen vào dòng của process khác
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Lỗi ghi tín hiệu thay đổi {self.path}: {e}")
+
+    def poll(self):
+        """Các khóa process khác đã publish kể từ lần gọi trước ([] nếu không có), None nếu phải bỏ toàn bộ"""
+        if not self.path:
+            return []
+        with self._lock:
+            inode, size = self._stat()
+            if self._file is None:
+                self._file = (inode, size)
+                return []
+            seen_inode, offset = self._file
+            if seen_inode is None:
+                seen_inode = inode   # file vừa được tạo: đọc từ đầu
+            if inode != seen_inode or size < offset:
+                self._file = (inode, size)
+                return None
+            if size == offset:
+                return []
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read(size - offset)
+            except OSError:
+                return []
+            chunk = chunk[:chunk.rfind(b"\n") + 1]   # dòng ghi dở thì để lần sau
+            self._file = (inode, offset + len(chunk))
+        keys = []
+        for line in chunk.decode("utf-8", "replace").splitlines():
+            pid, _, key = line.partition("\t")
+            if key and pid != self._pid:
+                keys.append(key)
+        return keys
+
+
+# Dùng chung cho Dao (cấu hình trong create_app)
+shared_changes = SharedChanges()
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import Counter
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+
+class CoEnrollment:
+    """
+    Ma trận thưa sinh viên x lớp học phần (1 = đã đăng ký) giữ trong bộ nhớ, để tìm bạn học
+    chung nhiều lớp nhất mà không self-join uni:enrolledIn trên GraphDB.
+    - Có numpy + scipy: ma trận CSC; số lớp chung với sinh viên s = tổng các cột (lớp) của s,
+      cộng thêm các thay đổi chưa gộp vào ma trận (`_delta`). Gộp lại khi delta đủ lớn.
+    - Không có scipy: danh sách thành viên theo lớp (dict of set) và Counter.
+    Dao cập nhật ngay khi ghi đăng ký; dựng lại toàn bộ sau `ttl` giây để nhận thay đổi
+    từ process khác.
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self.ready = False
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._students = []     # hàng -> mã SV
+        self._row = {}          # mã SV -> hàng
+        self._classes = []      # cột -> mã lớp (theo IRI)
+        self._class_ids = []    # cột -> mã lớp hiển thị (uni:id)
+        self._col = {}          # mã lớp -> cột
+        self._by_student = {}   # hàng -> set(cột), luôn là trạng thái hiện tại
+        self._members = {}      # cột -> set(hàng), chỉ dùng khi không có scipy
+        self._base = None       # scipy CSC (hàng x cột) tại lần gộp gần nhất
+        self._delta = {}        # cột -> {hàng: +1/-1} so với _base
+
+    def fresh(self):
+        return self.ready and time.monotonic() < self._expires
+
+    def invalidate(self):
+        """Đánh dấu cần dựng lại toàn bộ (vd. sau khi import hàng loạt)"""
+        self.ready = False
+
+    def load(self, enrollments):
+        """enrollments: [(mã SV, mã lớp, mã lớp hiển thị)]"""
+        with self._lock:
+            self._reset()
+            for sid, key, class_id in enrollments:
+                self._by_student.setdefault(self._row_of(sid), set()).add(self._col_of(key, class_id))
+            self._compact()
+            self._expires = time.monotonic() + self.ttl
+            self.ready = True
+
+    def _row_of(self, sid):
+        row = self._row.get(sid)
+        if row is None:
+            row = self._row[sid] = len(self._students)
+            self._students.append(sid)
+        return row
+
+    def _col_of(self, key, class_id=None):
+        col = self._col.get(key)
+        if col is None:
+            col = self._col[key] = len(self._classes)
+            self._classes.append(key)
+            self._class_ids.append(class_id or key)
+        return col
+
+    def _compact(self):
+        """Dựng lại ma trận CSC từ trạng thái hiện tại (hoặc danh sách thành viên nếu không có scipy)"""
+        self._delta = {}
+        if sparse is None:
+            self._members = {}
+            for row, cols in self._by_student.items():
+                for col in cols:
+                    self._members.setdefault(col, set()).add(row)
+            return
+        rows = [row for row, cols in self._by_student.items() for _ in cols]
+        cols = [col for cols in self._by_student.values() for col in cols]
+        self._base = sparse.csc_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(self._students), len(self._classes)))
+
+    # --- Cập nhật ---
+    def add(self, sid, key):
+        self._change(sid, key, 1)
+
+    def remove(self, sid, key):
+        self._change(sid, key, -1)
+
+    def _change(self, sid, key, delta):
+        with self._lock:
+            if not self.ready or (delta < 0 and (sid not in self._row or key not in self._col)):
+                return
+            row, col = self._row_of(sid), self._col_of(key)
+            cols = self._by_student.setdefault(row, set())
+            if (col in cols) == (delta > 0):
+                return
+            if delta > 0:
+                cols.add(col)
+            else:
+                cols.discard(col)
+            if sparse is None:
+                members = self._members.setdefault(col, set())
+                if delta > 0:
+                    members.add(row)
+                else:
+                    members.discard(row)
+                return
+            changes = self._delta.setdefault(col, {})
+            changes[row] = changes.get(row, 0) + delta
+            if not changes[row]:
+                del changes[row]
+            if sum(len(c) for c in self._delta.values()) > max(1000, self._base.nnz // 20):
+                self._compact()
+
+    # --- Truy vấn ---
+    def top(self, sid, k=10):
+        """
+        k sinh viên học chung nhiều lớp nhất với `sid`: [(mã SV, số lớp chung, [mã lớp chung])],
+        nhiều lớp chung trước, bằng nhau thì theo mã SV.
+        """
+        with self._lock:
+            row = self._row.get(sid)
+            cols = sorted(self._by_student.get(row, ())) if row is not None else []
+            if not cols:
+                return []
+            if sparse is None:
+                counts = Counter(r for col in cols for r in self._members.get(col, ()))
+                counts.pop(row, None)
+                ranked = sorted(counts.items(), key=lambda rc: (-rc[1], self._students[rc[0]]))[:k]
+            else:
+                ranked = self._top_sparse(row, cols, k)
+            mine = set(cols)
+            return [(self._students[r], n,
+                     sorted(self._class_ids[c] for c in self._by_student.get(r, ()) if c in mine))
+                    for r, n in ranked]
+
+    def _top_sparse(self, row, cols, k):
+        counts = np.zeros(len(self._students), dtype=np.int64)
+        base_cols = [c for c in cols if c < self._base.shape[1]]
+        if base_cols:
+            summed = np.asarray(self._base[:, base_cols].sum(axis=1)).ravel()
+            counts[:len(summed)] += summed
+        for col in cols:
+            for r, d in self._delta.get(col, {}).items():
+                counts[r] += d
+        counts[row] = 0
+        candidates = np.flatnonzero(counts > 0)
+        if len(candidates) > k:
+            # Lấy ngưỡng của phần tử thứ k rồi giữ mọi ứng viên >= ngưỡng để xếp hạng hòa đúng theo mã SV
+            threshold = np.partition(counts[candidates], len(candidates) - k)[len(candidates) - k]
+            candidates = candidates[counts[candidates] >= threshold]
+        ranked = sorted(((int(r), int(counts[r])) for r in candidates),
+                        key=lambda rc: (-rc[1], self._students[rc[0]]))
+        return ranked[:k]
+
+
+# Dùng chung cho Dao (dựng lần đầu khi xem bạn cùng lớp)
+co_enrollment = CoEnrollment()
@@ -1,125 +1,322 @@
 from . import get_driver
-from SPARQLWrapper import JSON, POST
-import requests # Thêm thư viện này
-import uuid
-
-# Namespace dùng chung cho dự án
-PREFIXES = """
-    PREFIX uni: <http://example.org/university/>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-"""
+from .cache import query_cache
+from .search_index import search_index, fold
+from .auth import credential_index
+from .changes import shared_changes
+from .enrollment_queue import enrollment_queue
+from .stats_counters import stats_counters
+from .catalog import semester_catalog
+from .timetable import timetable_index, room_key
+from .coenrollment import co_enrollment
+from .analytics import cohort_analytics
+from .metrics import metrics
+from .queries import queries, UNI, _local, _unlocal, Lit, Int, Bool, Node, Iri, Choice, Values, Fragments
+import base64
+import csv
+import functools
+import inspect
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import json
+
+def _uri_local(uri, prefix):
+    """'http://example.org/university/class_A1', 'class_' -> 'A1' (None nếu không đúng dạng)"""
+    head = UNI + prefix
+    return uri[len(head):] if uri.startswith(head) else None
+
+# Map tên Khoa (trong file JSON export) -> mã Khoa
+DEPT_IDS_BY_NAME = {
+    "Công nghệ thông tin": "CNTT",
+    "Kinh tế": "KT",
+    "Ngoại ngữ": "NN",
+    "Quản trị Kinh doanh": "QTKD",
+    "Du lịch & Khách sạn": "DL",
+}
+
+# Đếm số truy vấn lỗi theo từng thread, để không đưa kết quả rỗng do lỗi vào cache
+_tls = threading.local()
+
+def _query_failures():
+    return getattr(_tls, "failures", 0)
+
+def _cached(*tags):
+    """
+    Decorator: cache kết quả hàm Dao theo tham số, gắn với các tag dữ liệu.
+    `tags` có thể chứa "{0}" (hoặc "{tên_tham_số}") để tạo tag theo tham số, vd. "student:{0}".
+    Tham số được chuẩn hóa theo chữ ký hàm (kể cả giá trị mặc định) trước khi làm khóa, nên
+    f(1), f(1, size=20) và f(x=1) dùng chung 1 mục cache.
+    Lưu ý: kết quả trả về được dùng chung, nơi gọi không được sửa trực tiếp.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            args, kwargs = bound.args, bound.kwargs
+            key = (func.__name__,) + args + tuple(sorted(kwargs.items()))
+            found, value = query_cache.get(key)
+            if found:
+                return value
+            entry_tags = tuple(t.format(*args, **bound.arguments) for t in tags)
+            snapshot = query_cache.snapshot(entry_tags)
+            failures = _query_failures()
+            value = func(*args, **kwargs)
+            if _query_failures() == failures:
+                query_cache.set(key, value, entry_tags, snapshot)
+            return value
+        return wrapper
+    return decorator
+
+# Thread pool (giới hạn số luồng) để chạy song song các truy vấn độc lập trong 1 request
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+_fanout_workers = 8
+
+def init_fanout(workers):
+    global _fanout_executor, _fanout_workers
+    with _fanout_lock:
+        if _fanout_executor is not None:
+            _fanout_executor.shutdown(wait=False)
+            _fanout_executor = None
+        _fanout_workers = workers
+
+def _get_fanout_executor():
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(max_workers=_fanout_workers,
+                                                  thread_name_prefix="sparql-fanout")
+        return _fanout_executor
+
+def _run_fanout_call(func, args, label=None):
+    """Chạy trong thread của pool; trả kèm số truy vấn lỗi để báo lại cho thread gọi"""
+    _tls.in_fanout = True
+    metrics.set_label(label)  # đo truy vấn theo hàm Dao của thread gọi
+    before = _query_failures()
+    try:
+        return func(*args), _query_failures() - before
+    finally:
+        _tls.in_fanout = False
+        metrics.set_label(None)
 
 class Dao:
     @staticmethod
-    def _query(query_str):
-        """Hàm hỗ trợ chạy lệnh SELECT (Vẫn dùng SPARQLWrapper tốt)"""
-        sparql = get_driver()
-        sparql.setQuery(PREFIXES + query_str)
-        sparql.setReturnFormat(JSON)
+    def gather(*calls):
+        """
+        Chạy song song các lời gọi độc lập `(func, *args)`, trả về kết quả theo đúng thứ tự.
+        Thời gian ~ lời gọi chậm nhất thay vì tổng các lời gọi. Lỗi giữ nguyên như khi
+        chạy tuần tự: truy vấn lỗi vẫn trả [] (và không được cache), exception được ném lại
+        ở thread gọi. Gọi lồng bên trong pool thì chạy tuần tự để tránh deadlock.
+        """
+        if len(calls) <= 1 or getattr(_tls, "in_fanout", False):
+            return [func(*args) for func, *args in calls]
+        executor = _get_fanout_executor()
+        label = metrics.caller() if metrics.enabled else None
+        futures = [executor.submit(_run_fanout_call, func, args, label) for func, *args in calls]
+        results = []
+        for future in futures:
+            value, failures = future.result()
+            if failures:
+                _tls.failures = _query_failures() + failures
+            results.append(value)
+        return results
+
+    @staticmethod
+    def _query_many(*bound):
+        """Chạy song song nhiều SELECT độc lập (xem gather)"""
+        return Dao.gather(*((Dao._query, q) for q in bound))
+
+    @staticmethod
+    def _query(query):
+        """Hàm hỗ trợ chạy lệnh SELECT đã bind tham số (xem app/queries.py)"""
         try:
-            results = sparql.query().convert()
-            return results["results"]["bindings"]
+            return get_driver().select(query.text, name=query.name)
         except Exception as e:
             print(f"Lỗi SPARQL Query: {e}")
+            _tls.failures = _query_failures() + 1
             return []
 
     @staticmethod
-    def _update(update_str):
+    def _invalidate(*tags):
+        """Xóa các kết quả cache phụ thuộc vào dữ liệu vừa bị ghi, báo cho các worker khác cùng xóa"""
+        Dao._drop_cached(tags)
+        shared_changes.publish(*(f"tag:{t}" for t in tags))
+
+    @staticmethod
+    def _drop_cached(tags):
+        query_cache.invalidate(*tags)
+        if not Dao._CATALOG_TAGS.isdisjoint(tags):
+            semester_catalog.invalidate()
+
+    @staticmethod
+    def data_version(*tags):
+        """Phiên bản dữ liệu của các loại `tags` (dùng làm ETag), không truy vấn GraphDB"""
+        return query_cache.version(tags)
+
+    @staticmethod
+    def cache_stats():
+        return query_cache.stats()
+
+    @staticmethod
+    def _update(update):
         """
-        Hàm hỗ trợ chạy lệnh INSERT/DELETE
-        Sử dụng 'requests' trực tiếp để tránh lỗi QueryBadFormed của SPARQLWrapper
-        khi làm việc với GraphDB /statements endpoint.
+        Hàm hỗ trợ chạy lệnh INSERT/DELETE (đã bind) qua endpoint /statements của GraphDB.
+        Kết nối được lấy từ pool của client dùng chung, không mở TCP mới mỗi lần.
+        Trả về True nếu ghi thành công; lỗi chỉ được in ra, nơi gọi dùng kết quả để
+        không cập nhật các chỉ mục / bộ đếm trong bộ nhớ khi GraphDB chưa ghi.
         """
-        sparql = get_driver()
-        base_endpoint = sparql.endpoint
-        
-        # GraphDB yêu cầu endpoint kết thúc bằng /statements cho lệnh Update SPARQL 1.1
-        if not base_endpoint.endswith('/statements'):
-            update_endpoint = base_endpoint + "/statements"
-        else:
-            update_endpoint = base_endpoint
-            
-        # Header bắt buộc cho GraphDB Update
-        headers = {
-            "Content-Type": "application/sparql-update",
-            "Accept": "application/json"
-        }
-        
-        full_query = PREFIXES + update_str
-        
         try:
-            # Gửi POST request trực tiếp với raw body
-            response = requests.post(update_endpoint, data=full_query.encode('utf-8'), headers=headers)
-            response.raise_for_status() # Sẽ báo lỗi nếu HTTP Code không phải 200/204
+            get_driver().update(update.text, name=update.name)
+            return True
+        except requests.HTTPError as e:
+            print(f"Lỗi SPARQL Update: {e}")
+            print(f"Chi tiết lỗi từ Server: {e.response.text}")
         except Exception as e:
             print(f"Lỗi SPARQL Update: {e}")
-            if 'response' in locals():
-                print(f"Chi tiết lỗi từ Server: {response.text}")
+        return False
+
+    _Q_HAS_ADMIN = queries.register("has_admin", "SELECT ?s WHERE { ?s rdf:type uni:Admin } LIMIT 1")
+    _Q_SEED = queries.register("seed_data", """
+        INSERT DATA {
+            uni:admin_01 rdf:type uni:Admin ;
+                         uni:username "admin" ;
+                         uni:password "admin123" ;
+                         uni:name "Quản trị viên" .
+
+            uni:dept_CNTT rdf:type uni:Department ;
+                          uni:id "CNTT" ;
+                          uni:name "Công nghệ thông tin" .
+
+            uni:dept_KT rdf:type uni:Department ;
+                        uni:id "KT" ;
+                        uni:name "Kinh tế" .
+
+            uni:dept_NN rdf:type uni:Department ;
+                        uni:id "NN" ;
+                        uni:name "Ngoại ngữ" .
+
+            uni:dept_QTKD rdf:type uni:Department ;
+                          uni:id "QTKD" ;
+                          uni:name "Quản trị Kinh doanh" .
+
+            uni:dept_DL rdf:type uni:Department ;
+                        uni:id "DL" ;
+                        uni:name "Du lịch & Khách sạn" .
+
+            uni:sem_HK1_2024 rdf:type uni:Semester ;
+                             uni:id "HK1_2024" ;
+                             uni:year "2024" ;
+                             uni:term "1" .
+        }""", kind="update")
 
     @staticmethod
     def init_db():
         # Kiểm tra xem đã có admin chưa
-        check_admin = Dao._query("SELECT ?s WHERE { ?s rdf:type uni:Admin } LIMIT 1")
+        check_admin = Dao._query(Dao._Q_HAS_ADMIN.bind())
         if not check_admin:
             print("Đang khởi tạo dữ liệu mẫu...")
-            query = """
-            INSERT DATA {
-                uni:admin_01 rdf:type uni:Admin ;
-                             uni:username "admin" ;
-                             uni:password "admin123" ;
-                             uni:name "Quản trị viên" .
-                             
-                uni:dept_CNTT rdf:type uni:Department ;
-                              uni:id "CNTT" ;
-                              uni:name "Công nghệ thông tin" .
-                              
-                uni:dept_KT rdf:type uni:Department ;
-                            uni:id "KT" ;
-                            uni:name "Kinh tế" .
-
-                uni:dept_NN rdf:type uni:Department ;
-                            uni:id "NN" ;
-                            uni:name "Ngoại ngữ" .
-
-                uni:dept_QTKD rdf:type uni:Department ;
-                              uni:id "QTKD" ;
-                              uni:name "Quản trị Kinh doanh" .
-
-                uni:dept_DL rdf:type uni:Department ;
-                            uni:id "DL" ;
-                            uni:name "Du lịch & Khách sạn" .
-                            
-                uni:sem_HK1_2024 rdf:type uni:Semester ;
-                                 uni:id "HK1_2024" ;
-                                 uni:year "2024" ;
-                                 uni:term "1" .
-            }
-            """
-            Dao._update(query)
+            Dao._update(Dao._Q_SEED.bind())
+            Dao._invalidate("departments", "semesters")
+
+    @staticmethod
+    def warm_up():
+        """
+        Nạp sẵn chỉ mục đăng nhập, tìm kiếm, thời khóa biểu, ma trận bạn cùng lớp và bộ đếm thống kê
+        (song song, đồng thời mở sẵn kết nối tới GraphDB) để request đầu tiên của 1 worker mới không phải chờ.
+        Trả về danh sách phần đã nạp được.
+        """
+        parts = ("credentials", "search", "stats", "timetable", "classmates")
+        done = Dao.gather((Dao.load_credentials,), (Dao.rebuild_search_index,),
+                          (lambda: Dao.reconcile_stats() is not None,), (Dao.rebuild_timetable,),
+                          (Dao.rebuild_coenrollment,))
+        return [part for part, ok in zip(parts, done) if ok]
+
+    # --- ĐĂNG NHẬP ---
+    _credential_load_lock = threading.Lock()
+    _Q_ADMIN_CREDENTIALS = queries.register(
+        "admin_credentials", "SELECT ?u ?p WHERE { ?s rdf:type uni:Admin ; uni:username ?u ; uni:password ?p }")
+    _Q_STUDENT_CREDENTIALS = queries.register(
+        "student_credentials", "SELECT ?u ?p WHERE { ?s rdf:type uni:Student ; uni:id ?u ; uni:password ?p }")
+    _Q_ADMIN_PASSWORD = queries.register("admin_password", """
+        SELECT ?p WHERE { ?s rdf:type uni:Admin ; uni:username $username ; uni:password ?p } LIMIT 1
+        """, username=Lit())
+    _Q_STUDENT_PASSWORD = queries.register("student_password", """
+        SELECT ?p WHERE { ?s rdf:type uni:Student ; uni:id $username ; uni:password ?p } LIMIT 1
+        """, username=Lit())
+
+    @staticmethod
+    def load_credentials():
+        """Nạp toàn bộ tài khoản Admin/Sinh viên vào chỉ mục đăng nhập (2 truy vấn)"""
+        failures = _query_failures()
+        admins, students = Dao._query_many(Dao._Q_ADMIN_CREDENTIALS.bind(), Dao._Q_STUDENT_CREDENTIALS.bind())
+        if _query_failures() != failures:
+            return False
+        entries = [("admin", r["u"]["value"], r["p"]["value"]) for r in admins]
+        entries += [("student", r["u"]["value"], r["p"]["value"]) for r in students]
+        credential_index.load(entries)
+        return True
+
+    @staticmethod
+    def _apply_shared_changes():
+        """
+        Bỏ phần cache mà worker khác đã báo thay đổi (xem SharedChanges): tag của query_cache
+        (kèm danh mục học kỳ) và tài khoản trong chỉ mục đăng nhập. Gọi đầu mỗi request.
+        """
+        keys = shared_changes.poll()
+        if keys is None:
+            query_cache.new_epoch()
+            query_cache.clear()
+            semester_catalog.invalidate()
+            credential_index.invalidate()
+            return
+        tags = []
+        for key in keys:
+            kind, _, rest = key.partition(":")
+            if kind == "tag":
+                tags.append(rest)
+            elif key == "auth:*":
+                credential_index.invalidate()
+            elif kind == "auth":
+                role, _, username = rest.partition(":")
+                credential_index.remove(role, username)
+        if tags:
+            Dao._drop_cached(tuple(dict.fromkeys(tags)))
+
+    @staticmethod
+    def _lookup_password(username, role):
+        """Lấy mật khẩu của 1 tài khoản từ GraphDB (không đưa mật khẩu người dùng nhập vào truy vấn)"""
+        template = Dao._Q_ADMIN_PASSWORD if role == 'admin' else Dao._Q_STUDENT_PASSWORD
+        res = Dao._query(template.bind(username=username))
+        return res[0]["p"]["value"] if res else None
 
     @staticmethod
     def verify_user(username, password, role):
-        rdf_type = "uni:Admin" if role == 'admin' else "uni:Student"
-        if role == 'admin':
-            query = f"""
-            SELECT ?s WHERE {{
-                ?s rdf:type {rdf_type} ;
-                   uni:username "{username}" ;
-                   uni:password "{password}" .
-            }}
-            """
-        else:
-            query = f"""
-            SELECT ?s WHERE {{
-                ?s rdf:type {rdf_type} ;
-                   uni:id "{username}" ;
-                   uni:password "{password}" .
-            }}
-            """
-        res = Dao._query(query)
-        return len(res) > 0
+        """
+        Kiểm tra đăng nhập bằng chỉ mục trong bộ nhớ (không gọi GraphDB khi trúng).
+        Chỉ hỏi lại GraphDB khi tài khoản chưa có/đã hết hạn trong chỉ mục, hoặc khi
+        sai mật khẩu (có thể mật khẩu vừa được đổi ở process khác). Tài khoản vừa đổi
+        mật khẩu ở worker khác (báo qua shared_changes) được bỏ khỏi chỉ mục trước khi
+        kiểm tra, nên mật khẩu cũ không còn khớp.
+        """
+        role = 'admin' if role == 'admin' else 'student'
+        Dao._apply_shared_changes()
+        if not credential_index.ready:
+            with Dao._credential_load_lock:
+                if not credential_index.ready:
+                    Dao.load_credentials()
+
+        if credential_index.verify(role, username, password):
+            return True
+        stored = Dao._lookup_password(username, role)
+        if stored is None:
+            credential_index.remove(role, username)
+            return False
+        credential_index.set(role, username, stored)
+        return bool(credential_index.verify(role, username, password))
 
     @staticmethod
     def _parse_result(binding, keys):
@@ -132,9 +329,7 @@ class Dao:
         return res
 
     # --- TEACHER ---
-    @staticmethod
-    def get_all_teachers():
-        query = """
+    _Q_ALL_TEACHERS = queries.register("all_teachers", """
         SELECT ?id ?name ?phone ?pos ?status ?deptName
         WHERE {
             ?t rdf:type uni:Teacher ;
@@ -144,43 +339,62 @@ class Dao:
             OPTIONAL { ?t uni:position ?pos }
             OPTIONAL { ?t uni:status ?status }
             OPTIONAL { ?t uni:belongsTo ?d . ?d uni:name ?deptName }
-        }
-        """
-        bindings = Dao._query(query)
-        teachers = []
-        for b in bindings:
-            t_data = Dao._parse_result(b, ["id", "name", "phone", "pos", "status"])
-            t_data['teacher_id'] = t_data['id'] 
-            teachers.append({
-                "data": t_data,
-                "dept": b.get("deptName", {}).get("value", "")
-            })
-        return teachers
+        }""")
+    _F_TEACHER = queries.register("teacher_triples", """
+        $t rdf:type uni:Teacher ;
+           uni:id $id ;
+           uni:name $name ;
+           uni:phone $phone ;
+           uni:position $position ;
+           uni:status "Đang giảng dạy" ;
+           uni:belongsTo $dept .
+        """, kind="fragment", t=Node("teacher_"), id=Lit(), name=Lit(), phone=Lit(), position=Lit(),
+        dept=Node("dept_"))
+    # Lệnh ghi chung cho các khối triple đã bind (add_*, import)
+    _Q_INSERT_DATA = queries.register("insert_data", "INSERT DATA { $triples }", kind="update",
+                                      triples=Fragments())
+    _Q_DELETE_TEACHER = queries.register("delete_teacher", "DELETE WHERE { $t ?p ?o . }", kind="update",
+                                         t=Node("teacher_"))
+
+    @staticmethod
+    @_cached("teachers", "departments")
+    def get_all_teachers():
+        return [Dao._teacher_row(b) for b in Dao._query(Dao._Q_ALL_TEACHERS.bind())]
+
+    @staticmethod
+    def _teacher_row(b):
+        t_data = Dao._parse_result(b, ["id", "name", "phone", "pos", "status"])
+        t_data['teacher_id'] = t_data['id']
+        return {"data": t_data, "dept": b.get("deptName", {}).get("value", "")}
+
+    @staticmethod
+    def _teacher_triples(tid, name, phone, position, dept_id):
+        return Dao._F_TEACHER.bind(t=tid, id=tid, name=name, phone=phone, position=position, dept=dept_id)
 
     @staticmethod
     def add_teacher(tid, name, phone, position, dept_id):
-        query = f"""
-        INSERT {{
-            uni:teacher_{tid} rdf:type uni:Teacher ;
-                              uni:id "{tid}" ;
-                              uni:name "{name}" ;
-                              uni:phone "{phone}" ;
-                              uni:position "{position}" ;
-                              uni:status "Đang giảng dạy" ;
-                              uni:belongsTo uni:dept_{dept_id} .
-        }} WHERE {{}}
-        """
-        Dao._update(query)
+        triples = Dao._teacher_triples(tid, name, phone, position, dept_id)
+        written = Dao._update(Dao._Q_INSERT_DATA.bind(triples=[triples]))
+        Dao._invalidate("teachers", f"teacher:{tid}")
+        if written:
+            stats_counters.add("types", "Teacher", 1)
+            Dao._reindex("teacher", tid, name)
 
     @staticmethod
     def delete_teacher(tid):
-        query = f"DELETE WHERE {{ uni:teacher_{tid} ?p ?o . }}"
-        Dao._update(query)
+        try:
+            query = Dao._Q_DELETE_TEACHER.bind(t=tid)
+        except ValueError:
+            return  # mã không hợp lệ thì không thể có trong dữ liệu
+        written = Dao._update(query)
+        Dao._invalidate("teachers", f"teacher:{tid}")
+        if written:
+            stats_counters.add("types", "Teacher", -1)
+            Dao._reindex("teacher", tid)
+            timetable_index.drop_owner("teacher", tid)
 
     # --- STUDENT ---
-    @staticmethod
-    def get_all_students():
-        query = """
+    _Q_ALL_STUDENTS = queries.register("all_students", """
         SELECT ?id ?name ?class ?year ?status ?deptName
         WHERE {
             ?s rdf:type uni:Student ;
@@ -190,45 +404,81 @@ class Dao:
             OPTIONAL { ?s uni:year ?year }
             OPTIONAL { ?s uni:status ?status }
             OPTIONAL { ?s uni:majorIn ?d . ?d uni:name ?deptName }
-        }
-        """
-        bindings = Dao._query(query)
-        students = []
-        for b in bindings:
-            s_data = Dao._parse_result(b, ["id", "name", "class", "year", "status"])
-            s_data['student_id'] = s_data['id']
-            students.append({
-                "data": s_data,
-                "major": b.get("deptName", {}).get("value", "")
-            })
-        return students
+        }""")
+    _F_STUDENT = queries.register("student_triples", """
+        $s rdf:type uni:Student ;
+           uni:id $id ;
+           uni:name $name ;
+           uni:phone $phone ;
+           uni:class $cls ;
+           uni:year $year ;
+           uni:status "Đang học" ;
+           uni:password $password ;
+           uni:majorIn $dept .
+        """, kind="fragment", s=Node("student_"), id=Lit(), name=Lit(), phone=Lit(), cls=Lit(),
+        year=Lit(), password=Lit(), dept=Node("dept_"))
+    _Q_STUDENT_CLASSES = queries.register(
+        "student_classes", "SELECT ?cl WHERE { $s uni:enrolledIn ?cl }", s=Node("student_"))
+    _Q_STUDENT_FOOTPRINT = queries.register("student_footprint", """
+        SELECT ?d ?cl WHERE {
+            $s rdf:type uni:Student .
+            OPTIONAL { $s uni:majorIn ?d }
+            OPTIONAL { $s uni:enrolledIn ?cl }
+        }""", s=Node("student_"))
+    _Q_DELETE_STUDENT = queries.register("delete_student", "DELETE WHERE { $s ?p ?o }", kind="update",
+                                         s=Node("student_"))
+
+    @staticmethod
+    @_cached("students", "departments")
+    def get_all_students():
+        return [Dao._student_row(b) for b in Dao._query(Dao._Q_ALL_STUDENTS.bind())]
+
+    @staticmethod
+    def _student_row(b):
+        s_data = Dao._parse_result(b, ["id", "name", "class", "year", "status"])
+        s_data['student_id'] = s_data['id']
+        return {"data": s_data, "major": b.get("deptName", {}).get("value", "")}
+
+    @staticmethod
+    def _student_triples(sid, name, phone, _class, year, major_id, password):
+        return Dao._F_STUDENT.bind(s=sid, id=sid, name=name, phone=phone, cls=_class, year=year,
+                                   password=password, dept=major_id)
 
     @staticmethod
     def add_student(sid, name, phone, _class, year, major_id, password):
-        query = f"""
-        INSERT {{
-            uni:student_{sid} rdf:type uni:Student ;
-                              uni:id "{sid}" ;
-                              uni:name "{name}" ;
-                              uni:phone "{phone}" ;
-                              uni:class "{_class}" ;
-                              uni:year "{year}" ;
-                              uni:status "Đang học" ;
-                              uni:password "{password}" ;
-                              uni:majorIn uni:dept_{major_id} .
-        }} WHERE {{}}
-        """
-        Dao._update(query)
+        triples = Dao._student_triples(sid, name, phone, _class, year, major_id, password)
+        written = Dao._update(Dao._Q_INSERT_DATA.bind(triples=[triples]))
+        Dao._invalidate("students", f"student:{sid}")
+        if written:
+            stats_counters.add("types", "Student", 1)
+            stats_counters.add("students_by_dept", _local(major_id), 1)
+            Dao._reindex("student", sid, name, _class)
+            credential_index.set("student", sid, password)
+            shared_changes.publish(f"auth:student:{sid}")
 
     @staticmethod
     def delete_student(sid):
-        query = f"DELETE WHERE {{ uni:student_{sid} ?p ?o }}"
-        Dao._update(query)
+        try:
+            query = Dao._Q_DELETE_STUDENT.bind(s=sid)
+        except ValueError:
+            return
+        # Xóa SV cũng xóa các cạnh enrolledIn của SV -> cần biết Khoa và các lớp để trừ bộ đếm, sĩ số
+        rows = Dao._query(Dao._Q_STUDENT_FOOTPRINT.bind(s=sid))
+        written = Dao._update(query)
+        if written and rows:
+            dept = rows[0].get("d", {}).get("value")
+            stats_counters.add("types", "Student", -1)
+            stats_counters.add("students_by_dept", _uri_local(dept, "dept_") if dept else None, -1)
+            Dao._enrollments_changed([], sorted({(sid, _uri_local(b["cl"]["value"], "class_"))
+                                                 for b in rows if "cl" in b}))
+        Dao._invalidate("students", f"student:{sid}")
+        if written:
+            Dao._reindex("student", sid)
+        credential_index.remove("student", sid)
+        shared_changes.publish(f"auth:student:{sid}")
 
     # --- COURSE ---
-    @staticmethod
-    def get_all_courses():
-        query = """
+    _Q_ALL_COURSES = queries.register("all_courses", """
         SELECT ?id ?name ?credit ?sem ?deptName
         WHERE {
             ?c rdf:type uni:Course ;
@@ -237,56 +487,253 @@ class Dao:
             OPTIONAL { ?c uni:credit ?credit }
             OPTIONAL { ?c uni:semester ?sem }
             OPTIONAL { ?c uni:belongsTo ?d . ?d uni:name ?deptName }
-        }
-        """
-        bindings = Dao._query(query)
-        courses = []
-        for b in bindings:
-            c_data = Dao._parse_result(b, ["id", "name", "credit", "sem"])
-            c_data['course_id'] = c_data['id']
-            c_data['semester'] = c_data['sem']
-            courses.append({
-                "data": c_data,
-                "dept": b.get("deptName", {}).get("value", "")
-            })
-        return courses
+        }""")
+    _F_COURSE = queries.register("course_triples", """
+        $c rdf:type uni:Course ;
+           uni:id $id ;
+           uni:name $name ;
+           uni:credit $credit ;
+           uni:semester $semester ;
+           uni:belongsTo $dept .
+        """, kind="fragment", c=Node("course_"), id=Lit(), name=Lit(), credit=Lit(), semester=Lit(),
+        dept=Node("dept_"))
+
+    @staticmethod
+    @_cached("courses", "departments")
+    def get_all_courses():
+        return [Dao._course_row(b) for b in Dao._query(Dao._Q_ALL_COURSES.bind())]
+
+    @staticmethod
+    def _course_row(b):
+        c_data = Dao._parse_result(b, ["id", "name", "credit", "sem"])
+        c_data['course_id'] = c_data['id']
+        c_data['semester'] = c_data['sem']
+        return {"data": c_data, "dept": b.get("deptName", {}).get("value", "")}
+
+    @staticmethod
+    def _course_triples(cid, name, credit, semester_std, dept_id):
+        return Dao._F_COURSE.bind(c=cid, id=cid, name=name, credit=credit, semester=semester_std, dept=dept_id)
 
     @staticmethod
     def add_course(cid, name, credit, semester_std, dept_id):
-        query = f"""
-        INSERT {{
-            uni:course_{cid} rdf:type uni:Course ;
-                             uni:id "{cid}" ;
-                             uni:name "{name}" ;
-                             uni:credit "{credit}" ;
-                             uni:semester "{semester_std}" ;
-                             uni:belongsTo uni:dept_{dept_id} .
-        }} WHERE {{}}
-        """
-        Dao._update(query)
+        triples = Dao._course_triples(cid, name, credit, semester_std, dept_id)
+        written = Dao._update(Dao._Q_INSERT_DATA.bind(triples=[triples]))
+        Dao._invalidate("courses", f"course:{cid}")
+        if written:
+            stats_counters.add("types", "Course", 1)
+            Dao._reindex("course", cid, name)
+
+    # --- PHÂN TRANG DANH SÁCH (KEYSET) ---
+    # kind: (rdf:type, các biến SELECT, các OPTIONAL, hàm parse 1 dòng)
+    _LIST_SPECS = {
+        "teachers": ("uni:Teacher", "?phone ?pos ?status ?deptName", """
+            OPTIONAL { ?e uni:phone ?phone }
+            OPTIONAL { ?e uni:position ?pos }
+            OPTIONAL { ?e uni:status ?status }
+            OPTIONAL { ?e uni:belongsTo ?d . ?d uni:name ?deptName }""",
+            lambda b: Dao._teacher_row(b)),
+        "students": ("uni:Student", "?class ?year ?status ?deptName", """
+            OPTIONAL { ?e uni:class ?class }
+            OPTIONAL { ?e uni:year ?year }
+            OPTIONAL { ?e uni:status ?status }
+            OPTIONAL { ?e uni:majorIn ?d . ?d uni:name ?deptName }""",
+            lambda b: Dao._student_row(b)),
+        "courses": ("uni:Course", "?credit ?sem ?deptName", """
+            OPTIONAL { ?e uni:credit ?credit }
+            OPTIONAL { ?e uni:semester ?sem }
+            OPTIONAL { ?e uni:belongsTo ?d . ?d uni:name ?deptName }""",
+            lambda b: Dao._course_row(b)),
+    }
+    SORT_FIELDS = ("id", "name")
+    # 1 template trang + 1 template đếm cho mỗi loại; cột sắp xếp, chiều và mốc keyset là tham số.
+    # Không có cursor thì $cursor = false và điều kiện keyset luôn đúng.
+    _Q_PAGE = {kind: queries.register(f"{kind}_page", f"""
+        SELECT ?id ?name {opt_vars}
+        WHERE {{
+            ?e rdf:type {rdf_type} ;
+               uni:id ?id ;
+               uni:name ?name .
+            FILTER(!$cursor || $sort $op $sort_val || ($sort = $sort_val && ?id $op $last_id))
+            {optionals}
+        }}
+        ORDER BY $order($sort) $order(?id)
+        LIMIT $limit
+        """, cursor=Bool(), sort=Choice("?id", "?name"), op=Choice(">", "<"), sort_val=Lit(),
+        last_id=Lit(), order=Choice("ASC", "DESC"), limit=Int())
+        for kind, (rdf_type, opt_vars, optionals, _) in _LIST_SPECS.items()}
+    _Q_COUNT = {kind: queries.register(f"{kind}_count", f"SELECT (COUNT(?e) AS ?cnt) WHERE {{ ?e rdf:type {spec[0]} }}")
+                for kind, spec in _LIST_SPECS.items()}
+
+    @staticmethod
+    def _encode_cursor(item, sort):
+        key = [item["data"][sort], item["data"]["id"]]
+        return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        """Cursor = [giá trị cột sắp xếp, id] của dòng mốc; cursor hỏng thì coi như trang đầu"""
+        try:
+            sort_val, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return str(sort_val), str(last_id)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _entity_page(kind, sort, desc, after, before, size):
+        """
+        Lấy 1 trang theo keyset: lọc theo (cột sắp xếp, id) của dòng mốc thay vì
+        OFFSET, nên trang sâu tốn như trang đầu. `after`/`before` là cursor của
+        dòng cuối trang trước / dòng đầu trang sau.
+        """
+        parse = Dao._LIST_SPECS[kind][3]
+        if sort not in Dao.SORT_FIELDS:
+            sort = "id"
+        backward = bool(before) and not after
+        cursor = Dao._decode_cursor(before if backward else (after or ""))
+        # Đi lùi (trang trước) = sắp xếp ngược chiều rồi đảo lại kết quả
+        descending = desc != backward
+        sort_val, last_id = cursor or ("", "")
+        if sort == "id":
+            sort_val = last_id
+        query = Dao._Q_PAGE[kind].bind(
+            cursor=bool(cursor), sort=f"?{sort}", op="<" if descending else ">",
+            sort_val=sort_val, last_id=last_id, order="DESC" if descending else "ASC", limit=size + 1)
+        bindings, total = Dao.gather((Dao._query, query), (Dao.count_entities, kind))
+        rows = [parse(b) for b in bindings]
+        has_more = len(rows) > size
+        items = rows[:size]
+        if backward:
+            items.reverse()
+
+        page = {"items": items, "sort": sort, "desc": desc, "size": size,
+                "total": total, "next": None, "prev": None}
+        if items:
+            # Trang trước tồn tại nếu đang đi tới từ 1 cursor, hoặc đi lùi mà còn dòng
+            if (backward and has_more) or (not backward and cursor):
+                page["prev"] = Dao._encode_cursor(items[0], sort)
+            if (not backward and has_more) or backward:
+                page["next"] = Dao._encode_cursor(items[-1], sort)
+        return page
+
+    @staticmethod
+    @_cached("{0}")
+    def count_entities(kind):
+        """Đếm tổng số bản ghi (truy vấn riêng, nhẹ, được cache)"""
+        res = Dao._query(Dao._Q_COUNT[kind].bind())
+        return int(res[0]["cnt"]["value"]) if res else 0
+
+    @staticmethod
+    @_cached("teachers", "departments")
+    def get_teachers_page(sort="id", desc=False, after=None, before=None, size=50):
+        return Dao._entity_page("teachers", sort, desc, after, before, size)
+
+    @staticmethod
+    @_cached("students", "departments")
+    def get_students_page(sort="id", desc=False, after=None, before=None, size=50):
+        return Dao._entity_page("students", sort, desc, after, before, size)
+
+    @staticmethod
+    @_cached("courses", "departments")
+    def get_courses_page(sort="id", desc=False, after=None, before=None, size=50):
+        return Dao._entity_page("courses", sort, desc, after, before, size)
 
     # --- CLASS SECTION ---
+    _Q_CREATE_SECTION = queries.register("create_section", """
+        INSERT DATA {
+            $cl rdf:type uni:Class ;
+                uni:id $id ;
+                uni:room $room ;
+                uni:schedule $schedule ;
+                uni:offeredIn $sem .
+            $course uni:hasClass $cl .
+            $teacher uni:teaches $cl .
+        }""", kind="update", cl=Node("class_"), id=Lit(), room=Lit(), schedule=Lit(), sem=Node("sem_"),
+        course=Node("course_"), teacher=Node("teacher_"))
+    # Sĩ số tối đa (không bắt buộc), được kiểm tra khi đăng ký học phần
+    _Q_CREATE_SECTION_CAPPED = queries.register("create_section_capped", """
+        INSERT DATA {
+            $cl rdf:type uni:Class ;
+                uni:id $id ;
+                uni:room $room ;
+                uni:schedule $schedule ;
+                uni:offeredIn $sem ;
+                uni:capacity $capacity .
+            $course uni:hasClass $cl .
+            $teacher uni:teaches $cl .
+        }""", kind="update", cl=Node("class_"), id=Lit(), room=Lit(), schedule=Lit(), sem=Node("sem_"),
+        course=Node("course_"), teacher=Node("teacher_"), capacity=Int())
+    # Lịch, phòng, giảng viên của các lớp trong 1 học kỳ: đối chiếu trùng lịch trước khi tạo lớp
+    _Q_SEMESTER_TIMETABLE = queries.register("semester_timetable", """
+        SELECT ?cl ?schedule ?room ?t WHERE {
+            ?cl uni:offeredIn $sem ;
+                uni:schedule ?schedule .
+            OPTIONAL { ?cl uni:room ?room }
+            OPTIONAL { ?t uni:teaches ?cl }
+        }""", sem=Node("sem_"))
+
     @staticmethod
-    def create_section(class_id, room, schedule, course_id, teacher_id, semester_id):
-        class_uri = class_id.replace(" ", "_")
-        query = f"""
-        INSERT {{
-            uni:class_{class_uri} rdf:type uni:Class ;
-                                  uni:id "{class_id}" ;
-                                  uni:room "{room}" ;
-                                  uni:schedule "{schedule}" ;
-                                  uni:offeredIn uni:sem_{semester_id} .
-            uni:course_{course_id} uni:hasClass uni:class_{class_uri} .
-            uni:teacher_{teacher_id} uni:teaches uni:class_{class_uri} .
-        }} WHERE {{}}
+    def _sync_semester_timetable(semester_id):
         """
-        Dao._update(query)
+        Nạp lại các lớp của 1 học kỳ (kèm giảng viên, phòng) từ GraphDB vào chỉ mục thời khóa biểu
+        (1 truy vấn), để lớp vừa tạo ở process khác cũng được tính khi tạo lớp mới. Giữ nguyên chỉ
+        mục nếu truy vấn lỗi.
+        """
+        failures = _query_failures()
+        rows = Dao._query(Dao._Q_SEMESTER_TIMETABLE.bind(sem=semester_id))
+        if _query_failures() != failures:
+            return
+        classes = {}
+        for b in rows:
+            key = _uri_local(b["cl"]["value"], "class_")
+            _, links = classes.setdefault(key, (b["schedule"]["value"], []))
+            if "room" in b:
+                links.append(("room", room_key(b["room"]["value"])))
+            if "t" in b:
+                links.append(("teacher", _uri_local(b["t"]["value"], "teacher_")))
+        for key, (schedule, links) in classes.items():
+            timetable_index.add_class(key, semester_id, schedule, links)
+
+    @staticmethod
+    def create_section(class_id, room, schedule, course_id, teacher_id, semester_id, capacity=None):
+        """
+        Tạo lớp học phần; ném ValueError nếu trùng lịch giảng viên / phòng. Lịch học là chữ tự do,
+        dạng không đọc được (xem parse_schedule) vẫn được lưu nhưng không được kiểm tra trùng lịch.
+        """
+        params = dict(cl=class_id, id=class_id, room=room, schedule=schedule, sem=semester_id,
+                      course=course_id, teacher=teacher_id)
+        if capacity:
+            query = Dao._Q_CREATE_SECTION_CAPPED.bind(capacity=capacity, **params)
+        else:
+            query = Dao._Q_CREATE_SECTION.bind(**params)
+        key, room_id = _local(class_id), room_key(room)
+        if Dao._ensure_timetable():
+            Dao._sync_semester_timetable(semester_id)
+            for kind, owner, label in (("teacher", teacher_id, f"Giảng viên {teacher_id}"),
+                                       ("room", room_id, f"Phòng {room}")):
+                clash = timetable_index.conflicts_for(kind, owner, semester_id, schedule, ignore=(key,))
+                if clash:
+                    raise ValueError(f"{label} đã có lớp {', '.join(map(_unlocal, clash))} trùng lịch!")
+        written = Dao._update(query)
+        Dao._invalidate("classes")
+        if not written:
+            return
+        timetable_index.add_class(key, semester_id, schedule, [("teacher", teacher_id), ("room", room_id)])
+        stats_counters.add("types", "Class", 1)
+        Dao._reindex("class", class_id, class_id)
+        if search_index.ready:
+            search_index.link_class(class_id, course_id, teacher_id)
+
+    _Q_TEACHER_NAMES = queries.register(
+        "teacher_names", "SELECT ?id ?name WHERE { ?t rdf:type uni:Teacher ; uni:id ?id ; uni:name ?name }")
+    _Q_COURSE_NAMES = queries.register(
+        "course_names", "SELECT ?id ?name WHERE { ?c rdf:type uni:Course ; uni:id ?id ; uni:name ?name }")
+    _Q_SEMESTER_IDS = queries.register("semester_ids", "SELECT ?id WHERE { ?s rdf:type uni:Semester ; uni:id ?id }")
 
     @staticmethod
+    @_cached("teachers", "courses", "semesters")
     def get_data_for_section_form():
-        t_res = Dao._query("SELECT ?id ?name WHERE { ?t rdf:type uni:Teacher ; uni:id ?id ; uni:name ?name }")
-        c_res = Dao._query("SELECT ?id ?name WHERE { ?c rdf:type uni:Course ; uni:id ?id ; uni:name ?name }")
-        s_res = Dao._query("SELECT ?id WHERE { ?s rdf:type uni:Semester ; uni:id ?id }")
+        t_res, c_res, s_res = Dao._query_many(
+            Dao._Q_TEACHER_NAMES.bind(), Dao._Q_COURSE_NAMES.bind(), Dao._Q_SEMESTER_IDS.bind())
         return {
             "teachers": [Dao._parse_result(r, ["id", "name"]) for r in t_res],
             "courses": [Dao._parse_result(r, ["id", "name"]) for r in c_res],
@@ -294,19 +741,24 @@ class Dao:
         }
 
     # --- SINH VIÊN ---
+    _Q_STUDENT_INFO = queries.register("student_info", """
+        SELECT ?id ?name ?class ?year ?status ?majorName
+        WHERE {
+            $s uni:id ?id ;
+               uni:name ?name .
+            OPTIONAL { $s uni:class ?class }
+            OPTIONAL { $s uni:year ?year }
+            OPTIONAL { $s uni:status ?status }
+            OPTIONAL { $s uni:majorIn ?d . ?d uni:name ?majorName }
+        }""", s=Node("student_"))
+
     @staticmethod
+    @_cached("student:{0}", "departments")
     def get_student_info(sid):
-        query = f"""
-        SELECT ?id ?name ?class ?year ?status ?majorName
-        WHERE {{
-            uni:student_{sid} uni:id ?id ;
-                              uni:name ?name .
-            OPTIONAL {{ uni:student_{sid} uni:class ?class }}
-            OPTIONAL {{ uni:student_{sid} uni:year ?year }}
-            OPTIONAL {{ uni:student_{sid} uni:status ?status }}
-            OPTIONAL {{ uni:student_{sid} uni:majorIn ?d . ?d uni:name ?majorName }}
-        }}
-        """
+        try:
+            query = Dao._Q_STUDENT_INFO.bind(s=sid)
+        except ValueError:
+            return None
         res = Dao._query(query)
         if res:
             data = Dao._parse_result(res[0], ["id", "name", "class", "year", "status"])
@@ -314,12 +766,92 @@ class Dao:
             return {"data": data, "major": res[0].get("majorName", {}).get("value", "")}
         return None
 
+    _Q_STUDENT_DASHBOARD = queries.register("student_dashboard", """
+        SELECT ?part ?id ?name ?class ?year ?status ?majorName
+               ?cl ?c ?classId ?room ?schedule ?courseName ?credit ?teacherName ?deptName
+        WHERE {
+            {
+                BIND("profile" AS ?part)
+                $s uni:id ?id ;
+                   uni:name ?name .
+                OPTIONAL { $s uni:class ?class }
+                OPTIONAL { $s uni:year ?year }
+                OPTIONAL { $s uni:status ?status }
+                OPTIONAL { $s uni:majorIn ?m . ?m uni:name ?majorName }
+            } UNION {
+                BIND("class" AS ?part)
+                $s uni:enrolledIn ?cl .
+                ?c uni:hasClass ?cl .
+                OPTIONAL { ?c uni:name ?courseName }
+                OPTIONAL { ?c uni:credit ?credit }
+                OPTIONAL { ?c uni:belongsTo ?d . ?d uni:name ?deptName }
+                OPTIONAL { ?cl uni:id ?classId }
+                OPTIONAL { ?cl uni:room ?room }
+                OPTIONAL { ?cl uni:schedule ?schedule }
+                OPTIONAL { ?t uni:teaches ?cl ; uni:name ?teacherName }
+            }
+        }""", s=Node("student_"))
+
     @staticmethod
-    def get_available_classes_for_registration(sid):
-        query = f"""
-        SELECT ?classId ?room ?schedule ?courseName ?credit ?teacherName
-        WHERE {{
-            ?cl rdf:type uni:Class ;
+    def get_student_dashboard(sid):
+        """
+        Toàn bộ dữ liệu trang Dashboard trong 1 truy vấn (thay cho get_student_info +
+        get_student_enrolled_classes + get_credit_stats): nhánh 'profile' lấy hồ sơ,
+        nhánh 'class' lấy các lớp đã đăng ký kèm khoa của môn, rồi gộp trong 1 lượt.
+        """
+        info = None
+        classes, seen_classes = [], set()
+        credit_by_dept, seen_credits = {}, set()
+        for b in Dao._query(Dao._Q_STUDENT_DASHBOARD.bind(s=sid)):
+            v = {k: b[k]["value"] for k in b}
+            if v["part"] == "profile":
+                if info is None:
+                    data = Dao._parse_result(b, ["id", "name", "class", "year", "status"])
+                    data['student_id'] = data['id']
+                    info = {"data": data, "major": v.get("majorName", "")}
+                continue
+
+            # Lớp hiển thị: cần đủ mã lớp, phòng, lịch, tên môn, tín chỉ, giảng viên
+            item = (v.get("classId"), v.get("room"), v.get("schedule"),
+                    v.get("courseName"), v.get("credit"), v.get("teacherName"))
+            if None not in item and item not in seen_classes:
+                seen_classes.add(item)
+                classes.append({"class_id": item[0], "room": item[1], "schedule": item[2],
+                                "course_name": item[3], "credit": item[4], "teacher_name": item[5]})
+
+            # Tín chỉ theo Khoa: mỗi (lớp, môn, khoa) chỉ tính 1 lần
+            credit_key = (v["cl"], v["c"], v.get("credit"), v.get("deptName"))
+            if None not in credit_key and credit_key not in seen_credits:
+                seen_credits.add(credit_key)
+                try:
+                    credit_by_dept[credit_key[3]] = credit_by_dept.get(credit_key[3], 0) + int(credit_key[2])
+                except ValueError:
+                    pass
+
+        total_credit = 0
+        for c in classes:
+            try:
+                total_credit += int(c["credit"])
+            except ValueError:
+                pass
+        stats = [{"dept": dept, "total_credit": str(total)} for dept, total in credit_by_dept.items()]
+        return {"info": info, "classes": classes, "stats": stats, "total_credit": total_credit}
+
+    # Danh mục lớp của học kỳ đang mở đăng ký (app/catalog.py) phụ thuộc các loại dữ liệu này;
+    # sĩ số được cộng/trừ riêng khi ghi đăng ký nên không có "enrollments"
+    _CATALOG_TAGS = frozenset(("classes", "courses", "teachers", "semesters"))
+    _catalog_lock = threading.Lock()
+    _Q_SEMESTERS = queries.register("semesters", """
+        SELECT ?id ?year ?term WHERE {
+            ?s rdf:type uni:Semester ; uni:id ?id .
+            OPTIONAL { ?s uni:year ?year }
+            OPTIONAL { ?s uni:term ?term }
+        }""")
+    _Q_CATALOG = queries.register("semester_catalog", """
+        SELECT ?cl ?classId ?room ?schedule ?courseName ?credit ?teacherName ?cap (COUNT(DISTINCT ?s) AS ?n)
+        WHERE {
+            ?cl uni:offeredIn $sem ;
+                rdf:type uni:Class ;
                 uni:id ?classId ;
                 uni:room ?room ;
                 uni:schedule ?schedule .
@@ -328,25 +860,169 @@ class Dao:
                uni:credit ?credit .
             ?t uni:teaches ?cl ;
                uni:name ?teacherName .
-            FILTER NOT EXISTS {{ uni:student_{sid} uni:enrolledIn ?cl . }}
-        }}
-        """
-        bindings = Dao._query(query)
-        results = []
+            OPTIONAL { ?cl uni:capacity ?cap }
+            OPTIONAL { ?s uni:enrolledIn ?cl }
+        }
+        GROUP BY ?cl ?classId ?room ?schedule ?courseName ?credit ?teacherName ?cap""", sem=Node("sem_"))
+
+    @staticmethod
+    @_cached("semesters")
+    def get_semesters():
+        """Mã các học kỳ, cũ trước mới sau (theo năm, kỳ)"""
+        def order(r):
+            try:
+                return int(r["year"]), int(r["term"]), r["id"]
+            except (TypeError, ValueError):
+                return 0, 0, r["id"]
+        semesters = [Dao._parse_result(b, ["id", "year", "term"]) for b in Dao._query(Dao._Q_SEMESTERS.bind())]
+        return [r["id"] for r in sorted((r for r in semesters if r["id"]), key=order)]
+
+    @staticmethod
+    def get_active_semester():
+        """Mã học kỳ mới nhất (theo năm, kỳ), dùng làm học kỳ đang mở đăng ký nếu không cấu hình"""
+        semesters = Dao.get_semesters()
+        return semesters[-1] if semesters else None
+
+    @staticmethod
+    def rebuild_catalog(semester):
+        """Dựng lại danh mục lớp của `semester` từ GraphDB; giữ danh mục cũ nếu truy vấn lỗi"""
+        if semester is None:
+            semester_catalog.load(None, [])
+            return True
+        failures = _query_failures()
+        bindings = Dao._query(Dao._Q_CATALOG.bind(sem=semester))
+        if _query_failures() != failures:
+            return False
+        classes = []
         for b in bindings:
-            item = Dao._parse_result(b, ["class_id", "room", "schedule", "course_name", "credit", "teacher_name"])
-            item['class_id'] = b['classId']['value']
-            item['course_name'] = b['courseName']['value']
-            item['teacher_name'] = b['teacherName']['value']
-            results.append(item)
-        return results
+            if "cl" not in b:
+                continue
+            item = Dao._parse_result(b, ["room", "schedule", "credit"])
+            item["key"] = _uri_local(b["cl"]["value"], "class_")
+            item["class_id"] = b["classId"]["value"]
+            item["course_name"] = b["courseName"]["value"]
+            item["teacher_name"] = b["teacherName"]["value"]
+            item["enrolled"] = int(b["n"]["value"])
+            try:
+                item["capacity"] = int(float(b["cap"]["value"])) if "cap" in b else None
+            except ValueError:
+                item["capacity"] = None
+            classes.append(item)
+        semester_catalog.load(semester, classes)
+        return True
+
+    # Chỉ mục thời khóa biểu (app/timetable.py): lịch học của từng lớp + ai học / dạy / dùng phòng lớp nào
+    _timetable_lock = threading.Lock()
+    _Q_TIMETABLE_CLASSES = queries.register("timetable_classes", """
+        SELECT ?cl ?sem ?schedule ?room ?t WHERE {
+            ?cl rdf:type uni:Class ;
+                uni:schedule ?schedule .
+            OPTIONAL { ?cl uni:offeredIn ?sem }
+            OPTIONAL { ?cl uni:room ?room }
+            OPTIONAL { ?t uni:teaches ?cl }
+        }""")
+    _Q_TIMETABLE_ENROLLMENTS = queries.register("timetable_enrollments", """
+        SELECT ?s ?cl WHERE { ?s uni:enrolledIn ?cl . ?cl uni:schedule ?schedule }""")
 
     @staticmethod
-    def get_student_enrolled_classes(sid):
-        query = f"""
+    def rebuild_timetable():
+        """Dựng lại chỉ mục thời khóa biểu từ GraphDB (2 truy vấn); giữ chỉ mục cũ nếu có truy vấn lỗi"""
+        failures = _query_failures()
+        class_rows, enrollment_rows = Dao._query_many(
+            Dao._Q_TIMETABLE_CLASSES.bind(), Dao._Q_TIMETABLE_ENROLLMENTS.bind())
+        if _query_failures() != failures:
+            return False
+        classes, links = {}, []
+        for b in class_rows:
+            if "cl" not in b:
+                continue
+            key = _uri_local(b["cl"]["value"], "class_")
+            sem = _uri_local(b["sem"]["value"], "sem_") if "sem" in b else None
+            classes.setdefault(key, (key, sem, b["schedule"]["value"]))
+            if "room" in b:
+                links.append(("room", room_key(b["room"]["value"]), key))
+            if "t" in b:
+                links.append(("teacher", _uri_local(b["t"]["value"], "teacher_"), key))
+        links += [("student", _uri_local(b["s"]["value"], "student_"), _uri_local(b["cl"]["value"], "class_"))
+                  for b in enrollment_rows if "s" in b]
+        timetable_index.load(classes.values(), links)
+        return True
+
+    # Đọc lại lịch các lớp trong batch đăng ký và các lớp đã đăng ký của sinh viên trong batch
+    _Q_TIMETABLE_SYNC = queries.register("timetable_sync", """
+        SELECT ?s ?cl ?sem ?schedule WHERE {
+            { VALUES ?s { $students } ?s uni:enrolledIn ?cl . }
+            UNION
+            { VALUES ?cl { $classes } }
+            ?cl uni:schedule ?schedule .
+            OPTIONAL { ?cl uni:offeredIn ?sem }
+        }""", students=Values(Node("student_")), classes=Values(Node("class_")))
+
+    @staticmethod
+    def _sync_timetable(ops):
+        """
+        Cập nhật chỉ mục thời khóa biểu cho các sinh viên / lớp của 1 batch đăng ký theo GraphDB
+        (1 truy vấn), để đăng ký và lớp mới ghi từ process khác (chưa tới hạn dựng lại chỉ mục)
+        vẫn được tính khi kiểm tra trùng lịch. Giữ nguyên chỉ mục nếu truy vấn lỗi.
+        """
+        students = sorted({o["sid"] for o in ops if o["op"] != "unenroll"})
+        if not students:
+            return
+        failures = _query_failures()
+        rows = Dao._query(Dao._Q_TIMETABLE_SYNC.bind(
+            students=students, classes=sorted({o["class_id"] for o in ops})))
+        if _query_failures() != failures:
+            return
+        classes, enrolled = {}, {sid: set() for sid in students}
+        for b in rows:
+            if "cl" not in b:
+                continue
+            key = _uri_local(b["cl"]["value"], "class_")
+            sem = _uri_local(b["sem"]["value"], "sem_") if "sem" in b else None
+            classes.setdefault(key, (sem, b["schedule"]["value"]))
+            if "s" in b:
+                enrolled.setdefault(_uri_local(b["s"]["value"], "student_"), set()).add(key)
+        for key, (sem, schedule) in classes.items():
+            timetable_index.add_class(key, sem, schedule)
+        for sid, keys in enrolled.items():
+            timetable_index.sync("student", sid, keys)
+
+    @staticmethod
+    def _ensure_timetable():
+        """Dựng chỉ mục thời khóa biểu nếu chưa có / đã hết hạn; False nếu không dựng được"""
+        if not timetable_index.fresh():
+            with Dao._timetable_lock:
+                if not timetable_index.fresh():
+                    Dao.rebuild_timetable()
+        return timetable_index.ready
+
+    @staticmethod
+    def get_available_classes_for_registration(sid, semester=None):
+        """
+        Các lớp của học kỳ đang mở (`semester`, mặc định học kỳ mới nhất) mà sinh viên chưa
+        đăng ký: lấy từ danh mục dùng chung rồi trừ tập lớp của sinh viên (1 truy vấn nhỏ).
+        Mỗi lớp kèm sĩ số "enrolled", "capacity" và "seats_left" (None nếu không giới hạn).
+        """
+        try:
+            query = Dao._Q_STUDENT_CLASSES.bind(s=sid)
+        except ValueError:
+            return []
+        semester = semester or Dao.get_active_semester()
+        if not semester_catalog.fresh() or semester_catalog.semester != semester:
+            with Dao._catalog_lock:
+                if not semester_catalog.fresh() or semester_catalog.semester != semester:
+                    Dao.rebuild_catalog(semester)
+        enrolled = {_uri_local(b["cl"]["value"], "class_") for b in Dao._query(query)}
+        if not Dao._ensure_timetable():
+            return semester_catalog.available(enrolled)
+        # Ẩn các lớp trùng lịch với lớp đã đăng ký
+        return semester_catalog.available(
+            enrolled, hide=lambda key: timetable_index.conflicts("student", sid, key))
+
+    _Q_ENROLLED_CLASSES = queries.register("enrolled_classes", """
         SELECT ?classId ?room ?schedule ?courseName ?credit ?teacherName
-        WHERE {{
-            uni:student_{sid} uni:enrolledIn ?cl .
+        WHERE {
+            $s uni:enrolledIn ?cl .
             ?cl uni:id ?classId ;
                 uni:room ?room ;
                 uni:schedule ?schedule .
@@ -355,9 +1031,11 @@ class Dao:
                uni:credit ?credit .
             ?t uni:teaches ?cl ;
                uni:name ?teacherName .
-        }}
-        """
-        bindings = Dao._query(query)
+        }""", s=Node("student_"))
+
+    @staticmethod
+    def get_student_enrolled_classes(sid):
+        bindings = Dao._query(Dao._Q_ENROLLED_CLASSES.bind(s=sid))
         results = []
         for b in bindings:
             item = Dao._parse_result(b, ["room", "schedule", "credit"])
@@ -369,304 +1047,992 @@ class Dao:
 
     @staticmethod
     def enroll_class(sid, class_id):
-        class_uri = class_id.replace(" ", "_")
-        query = f"INSERT DATA {{ uni:student_{sid} uni:enrolledIn uni:class_{class_uri} . }}"
-        Dao._update(query)
+        """Đăng ký lớp, trả về {"ok": bool|None, "message": str} (None: đang xử lý)"""
+        return Dao._submit_enrollment("enroll", sid, class_id)
 
     @staticmethod
     def unenroll_class(sid, class_id):
-        class_uri = class_id.replace(" ", "_")
-        query = f"DELETE DATA {{ uni:student_{sid} uni:enrolledIn uni:class_{class_uri} . }}"
-        Dao._update(query)
+        return Dao._submit_enrollment("unenroll", sid, class_id)
+
+    @staticmethod
+    def _submit_enrollment(op, sid, class_id):
+        """
+        Khi hàng đợi đang chạy: xếp yêu cầu vào batch chung và chờ kết quả.
+        Ngược lại (vd. script, chưa gọi create_app) thì ghi ngay như 1 batch 1 phần tử.
+        """
+        try:
+            sid, class_id = _local(sid), _local(class_id)
+        except ValueError as e:
+            return {"ok": False, "message": str(e)}
+        if enrollment_queue.running:
+            return enrollment_queue.submit(op, sid, class_id)
+        try:
+            return Dao.apply_enrollment_batch([{"op": op, "sid": sid, "class_id": class_id}])[0]
+        except Exception:
+            return {"ok": False, "message": "Hệ thống đang bận, vui lòng thử lại!"}
+
+    _Q_CLASS_STATE = queries.register("enrollment_class_state", """
+        SELECT ?key ?known ?cap (COUNT(DISTINCT ?s) AS ?n) WHERE {
+            VALUES (?key ?cl) { $classes }
+            OPTIONAL { ?cl rdf:type uni:Class . BIND(true AS ?known) }
+            OPTIONAL { ?cl uni:capacity ?cap }
+            OPTIONAL { ?s uni:enrolledIn ?cl }
+        } GROUP BY ?key ?known ?cap""", classes=Values(Lit(), Node("class_")))
+    _Q_PAIR_STATE = queries.register("enrollment_pair_state", """
+        SELECT ?sid ?key WHERE {
+            VALUES (?sid ?key ?s ?cl) { $pairs }
+            ?s uni:enrolledIn ?cl .
+        }""", pairs=Values(Lit(), Lit(), Node("student_"), Node("class_")))
+    _Q_UNENROLL_MANY = queries.register("unenroll_many", """
+        DELETE DATA { $triples }""", kind="update", triples=Fragments())
+    _Q_ENROLL_MANY = queries.register("enroll_many", """
+        INSERT DATA { $triples }""", kind="update", triples=Fragments())
+    _F_ENROLLMENT = queries.register("enrollment_triple", "$s uni:enrolledIn $cl .", kind="fragment",
+                                     s=Node("student_"), cl=Node("class_"))
+    _Q_ENROLL_CAPPED = queries.register("enroll_capped", """
+        INSERT { $s uni:enrolledIn $cl . } WHERE {
+            $cl uni:capacity ?cap .
+            { SELECT (COUNT(DISTINCT ?x) AS ?n) WHERE { ?x uni:enrolledIn $cl . } }
+            FILTER(?n < xsd:integer(?cap))
+        }""", kind="update", s=Node("student_"), cl=Node("class_"))
+
+    @staticmethod
+    def _enrollment_state(ops):
+        """
+        Đọc trạng thái hiện tại của các lớp / cặp (SV, lớp) có trong batch:
+        classes: mã lớp -> {"known", "capacity", "count"}, enrolled: set((sid, mã lớp)).
+        Ném RuntimeError nếu truy vấn lỗi (để cả batch được báo lỗi thay vì ghi sai).
+        """
+        class_ids = sorted({o["class_id"] for o in ops})
+        pairs = sorted({(o["sid"], o["class_id"]) for o in ops})
+        failures = _query_failures()
+        class_res, pair_res = Dao._query_many(
+            Dao._Q_CLASS_STATE.bind(classes=[(c, c) for c in class_ids]),
+            Dao._Q_PAIR_STATE.bind(pairs=[(s, c, s, c) for s, c in pairs]))
+        if _query_failures() != failures:
+            raise RuntimeError("Không đọc được trạng thái lớp học phần")
+
+        classes = {c: {"known": False, "capacity": None, "count": 0} for c in class_ids}
+        for b in class_res:
+            # Một số engine trả 1 dòng rỗng cho truy vấn gộp không có nhóm nào
+            info = classes.get(b.get("key", {}).get("value"))
+            if info is None:
+                continue
+            info["known"] = info["known"] or "known" in b
+            info["count"] = int(b["n"]["value"])
+            if "cap" in b:
+                try:
+                    cap = int(float(b["cap"]["value"]))
+                except ValueError:
+                    continue
+                info["capacity"] = cap if info["capacity"] is None else min(info["capacity"], cap)
+        enrolled = {(b["sid"]["value"], b["key"]["value"]) for b in pair_res}
+        return classes, enrolled
+
+    @staticmethod
+    def apply_enrollment_batch(ops):
+        """
+        Ghi 1 batch yêu cầu Đăng ký/Hủy (theo thứ tự đến) bằng 1 lệnh Update duy nhất.
+        Sĩ số được kiểm tra ngay trong batch; với lớp có giới hạn, mỗi INSERT còn kèm
+        điều kiện sĩ số trong cùng transaction nên không vượt quá dù nhiều process
+        cùng ghi. Trả về kết quả theo đúng thứ tự `ops`.
+        """
+        classes, initial = Dao._enrollment_state(ops)
+        enrolled = set(initial)
+        results, accepted_at = [], {}
+        check_timetable = Dao._ensure_timetable()
+        if check_timetable:
+            Dao._sync_timetable(ops)
+        added, removed = {}, {}   # sid -> lớp nhận / hủy trong batch (chưa có trong chỉ mục thời khóa biểu)
+        for i, o in enumerate(ops):
+            pair, info = (o["sid"], o["class_id"]), classes[o["class_id"]]
+            if o["op"] == "unenroll":
+                if pair in enrolled:
+                    enrolled.discard(pair)
+                    info["count"] -= 1
+                    added.get(o["sid"], set()).discard(o["class_id"])
+                    removed.setdefault(o["sid"], set()).add(o["class_id"])
+                results.append({"ok": True, "message": f"Đã hủy đăng ký lớp {_unlocal(o['class_id'])}"})
+            elif pair in enrolled:
+                results.append({"ok": True, "message": f"Bạn đã đăng ký lớp {_unlocal(o['class_id'])}"})
+            elif not info["known"]:
+                results.append({"ok": False, "message": f"Lớp học phần {o['class_id']} không tồn tại!"})
+            elif info["capacity"] is not None and info["count"] >= info["capacity"]:
+                results.append({"ok": False, "message": f"Lớp {_unlocal(o['class_id'])} đã đủ sĩ số ({info['capacity']})!"})
+            else:
+                clash = timetable_index.conflicts(
+                    "student", o["sid"], o["class_id"], extra=added.get(o["sid"], ()),
+                    ignore=removed.get(o["sid"], ())) if check_timetable else []
+                if clash:
+                    results.append({"ok": False, "message": f"Lớp {_unlocal(o['class_id'])} trùng lịch với lớp "
+                                                            f"{', '.join(map(_unlocal, clash))}!"})
+                    continue
+                enrolled.add(pair)
+                info["count"] += 1
+                accepted_at[pair] = i
+                added.setdefault(o["sid"], set()).add(o["class_id"])
+                removed.get(o["sid"], set()).discard(o["class_id"])
+                results.append({"ok": True, "message": f"Đăng ký thành công lớp {_unlocal(o['class_id'])}"})
+
+        inserts, deletes = sorted(enrolled - initial), sorted(initial - enrolled)
+        if not inserts and not deletes:
+            return results
+
+        operations = []
+        if deletes:
+            operations.append(Dao._Q_UNENROLL_MANY.bind(
+                triples=[Dao._F_ENROLLMENT.bind(s=s, cl=c) for s, c in deletes]))
+        free = [(s, c) for s, c in inserts if classes[c]["capacity"] is None]
+        limited = [(s, c) for s, c in inserts if classes[c]["capacity"] is not None]
+        if free:
+            operations.append(Dao._Q_ENROLL_MANY.bind(
+                triples=[Dao._F_ENROLLMENT.bind(s=s, cl=c) for s, c in free]))
+        operations += [Dao._Q_ENROLL_CAPPED.bind(s=s, cl=c) for s, c in limited]
+        update = queries.join(*operations, name="enrollment_batch")
+        try:
+            get_driver().update(update.text, name=update.name)
+        except requests.HTTPError as e:
+            print(f"Lỗi SPARQL Update: {e}")
+            print(f"Chi tiết lỗi từ Server: {e.response.text}")
+            raise
+        finally:
+            Dao._invalidate("enrollments")
+
+        written = list(free)
+        if limited:
+            # Lớp có giới hạn: kiểm tra lại INSERT nào thực sự được ghi
+            # (process khác có thể đã lấy chỗ trống sau lúc đọc sĩ số)
+            try:
+                _, now_enrolled = Dao._enrollment_state(
+                    [{"sid": s, "class_id": c} for s, c in limited])
+            except RuntimeError as e:
+                print(f"Lỗi kiểm tra sĩ số sau khi ghi: {e}")
+                now_enrolled = set(limited)
+            for pair in limited:
+                if pair in now_enrolled:
+                    written.append(pair)
+                else:
+                    results[accepted_at[pair]] = {
+                        "ok": False, "message": f"Lớp {_unlocal(pair[1])} đã đủ sĩ số ({classes[pair[1]]['capacity']})!"}
+        Dao._enrollments_changed(written, deletes)
+        return results
+
+    @staticmethod
+    def _enrollments_changed(added, removed):
+        """Cập nhật các số liệu giữ trong bộ nhớ sau khi ghi đăng ký: [(sid, mã lớp)]"""
+        for sid, class_id in added:
+            stats_counters.add("enrollments", class_id, 1)
+            semester_catalog.add_enrolled(class_id, 1)
+            timetable_index.link("student", sid, class_id)
+            co_enrollment.add(sid, class_id)
+        for sid, class_id in removed:
+            stats_counters.add("enrollments", class_id, -1)
+            semester_catalog.add_enrolled(class_id, -1)
+            timetable_index.unlink("student", sid, class_id)
+            co_enrollment.remove(sid, class_id)
 
     # --- TRA CỨU ---
+    _search_build_lock = threading.Lock()
+
+    _Q_SEARCH_STUDENTS = queries.register("search_students", """
+        SELECT ?id ?name ?class WHERE {
+            ?s rdf:type uni:Student ; uni:id ?id ; uni:name ?name .
+            OPTIONAL { ?s uni:class ?class }
+        }""")
+    _Q_SEARCH_CLASSES = queries.register("search_classes", """
+        SELECT ?id ?courseId ?teacherId WHERE {
+            ?cl rdf:type uni:Class ; uni:id ?id .
+            OPTIONAL { ?c uni:hasClass ?cl ; uni:id ?courseId }
+            OPTIONAL { ?t uni:teaches ?cl ; uni:id ?teacherId }
+        }""")
+
+    @staticmethod
+    def rebuild_search_index():
+        """Xây lại chỉ mục tìm kiếm từ GraphDB; giữ chỉ mục cũ nếu có truy vấn lỗi"""
+        failures = _query_failures()
+        teachers, courses, students, classes = Dao._query_many(
+            Dao._Q_TEACHER_NAMES.bind(), Dao._Q_COURSE_NAMES.bind(),
+            Dao._Q_SEARCH_STUDENTS.bind(), Dao._Q_SEARCH_CLASSES.bind())
+        if _query_failures() != failures:
+            return False
+
+        docs = [("teacher", r["id"]["value"], r["name"]["value"], None) for r in teachers]
+        docs += [("course", r["id"]["value"], r["name"]["value"], None) for r in courses]
+        docs += [("student", r["id"]["value"], r["name"]["value"], r.get("class", {}).get("value"))
+                 for r in students]
+        docs += [("class", r["id"]["value"], r["id"]["value"], None) for r in classes]
+        links = [(r["id"]["value"], r.get("courseId", {}).get("value"), r.get("teacherId", {}).get("value"))
+                 for r in classes]
+        search_index.load(docs, links)
+        return True
+
+    @staticmethod
+    def _reindex(kind, key, name=None, extra=None):
+        """Cập nhật chỉ mục tìm kiếm sau khi ghi thành công (bỏ qua nếu chỉ mục chưa được xây)"""
+        if not search_index.ready:
+            return
+        if name is None:
+            search_index.remove(kind, key)
+        else:
+            search_index.upsert(kind, key, name, extra)
+
     @staticmethod
     def search_graph(keyword):
-        keyword = keyword.lower()
-        # Tìm Course
-        q1 = f"""
-        SELECT ?id ?name (GROUP_CONCAT(DISTINCT ?tName; separator=", ") AS ?related)
-        WHERE {{
-            ?c rdf:type uni:Course ;
-               uni:id ?id ;
-               uni:name ?name .
-            FILTER(CONTAINS(LCASE(?name), "{keyword}"))
-            OPTIONAL {{
-                ?c uni:hasClass ?cl .
-                ?t uni:teaches ?cl ; uni:name ?tName .
-            }}
-        }} GROUP BY ?id ?name
-        """
-        # Tìm Teacher
-        q2 = f"""
-        SELECT ?id ?name (GROUP_CONCAT(DISTINCT ?cName; separator=", ") AS ?related)
-        WHERE {{
-            ?t rdf:type uni:Teacher ;
-               uni:id ?id ;
-               uni:name ?name .
-            FILTER(CONTAINS(LCASE(?name), "{keyword}"))
-            OPTIONAL {{
-                ?t uni:teaches ?cl .
-                ?c uni:hasClass ?cl ; uni:name ?cName .
-            }}
-        }} GROUP BY ?id ?name
-        """
-        res1 = Dao._query(q1)
-        res2 = Dao._query(q2)
-        
-        final_res = []
-        for r in res1:
-            final_res.append({
-                "type": "Môn học", "title": r["name"]["value"], "id": r["id"]["value"],
-                "related_info": r["related"]["value"].split(", ") if "related" in r else []
-            })
-        for r in res2:
-            final_res.append({
-                "type": "Giảng viên", "title": r["name"]["value"], "id": r["id"]["value"],
-                "related_info": r["related"]["value"].split(", ") if "related" in r else []
-            })
-        return final_res
+        """Tìm Môn học, Giảng viên, Sinh viên, Lớp học phần theo tên (bỏ dấu, có xếp hạng)"""
+        if not search_index.fresh():
+            with Dao._search_build_lock:
+                if not search_index.fresh():
+                    Dao.rebuild_search_index()
+        return search_index.search(keyword)
 
     # --- VISUALIZATION ---
+    # Loại node được chọn làm gốc khi xem đồ thị: tiền tố tên node (vd. student_SV001)
+    GRAPH_ROOT_KINDS = ("student", "teacher", "course", "dept", "class", "sem")
+
     @staticmethod
-    def get_graph_data_json():
-        query = """
-        SELECT ?s ?p ?o ?sName ?oName ?sType ?oType
-        WHERE {
-            ?s ?p ?o .
-            FILTER(STRSTARTS(STR(?s), "http://example.org/university/"))
-            FILTER(STRSTARTS(STR(?o), "http://example.org/university/"))
-            # Lọc không hiển thị Grade node để đỡ rối
-            MINUS { ?s rdf:type uni:Grade }
-            MINUS { ?o rdf:type uni:Grade }
-
-            OPTIONAL { ?s uni:name ?sName }
-            OPTIONAL { ?s uni:id ?sId }
-            OPTIONAL { ?s rdf:type ?sType }
-            
-            OPTIONAL { ?o uni:name ?oName }
-            OPTIONAL { ?o uni:id ?oId }
-            OPTIONAL { ?o rdf:type ?oType }
-        } LIMIT 200
-        """
-        bindings = Dao._query(query)
-        nodes = {}
-        edges = []
-        
-        for b in bindings:
-            s_uri = b['s']['value']
-            o_uri = b['o']['value']
-            pred = b['p']['value'].split('/')[-1]
-            
-            if s_uri not in nodes:
-                label = b.get('sName', {}).get('value') or s_uri.split('_')[-1]
-                group = b.get('sType', {}).get('value', 'Unknown').split('/')[-1]
-                nodes[s_uri] = {"id": s_uri, "label": label, "group": group}
-                
-            if b['o']['type'] == 'uri':
-                if o_uri not in nodes:
-                    label = b.get('oName', {}).get('value') or o_uri.split('_')[-1]
-                    group = b.get('oType', {}).get('value', 'Unknown').split('/')[-1]
-                    nodes[o_uri] = {"id": o_uri, "label": label, "group": group}
-                edges.append({"from": s_uri, "to": o_uri, "label": pred})
-
-        return {"nodes": list(nodes.values()), "edges": edges}
+    def _graph_node(uri, name=None, rdf_type=None):
+        local = uri[len("http://example.org/university/"):]
+        return {"id": uri, "key": local,
+                "label": name or local.split('_', 1)[-1],
+                "group": (rdf_type or 'Unknown').split('/')[-1]}
+
+    _Q_GRAPH_DEPARTMENTS = queries.register("graph_departments", "SELECT ?d WHERE { ?d rdf:type uni:Department }")
+    _Q_GRAPH_NODES = queries.register("graph_nodes", """
+        SELECT ?n ?name ?type WHERE {
+            VALUES ?n { $nodes }
+            OPTIONAL { ?n uni:name ?name }
+            OPTIONAL { ?n rdf:type ?type }
+        }""", nodes=Values(Iri()))
+    _Q_GRAPH_EXPAND = queries.register("graph_expand", """
+        SELECT ?n ?p ?m ?out ?mName ?mType WHERE {
+            VALUES ?n { $nodes }
+            { ?n ?p ?m . BIND(true AS ?out) } UNION { ?m ?p ?n . BIND(false AS ?out) }
+            FILTER(isIRI(?m) && STRSTARTS(STR(?m), STR(uni:)) && ?p != rdf:type)
+            # Không hiển thị Grade node để đỡ rối
+            FILTER NOT EXISTS { ?m rdf:type uni:Grade }
+            OPTIONAL { ?m uni:name ?mName }
+            OPTIONAL { ?m rdf:type ?mType }
+        } LIMIT $limit""", nodes=Values(Iri()), limit=Int())
+
+    @staticmethod
+    def get_graph_data_json(root=None, depth=1, max_nodes=300, max_edges=1000):
+        """
+        Lấy vùng lân cận của 1 node để vẽ đồ thị: mở rộng theo chiều rộng từ `root`
+        (vd. 'student_SV001', 'dept_CNTT') tới `depth` bước, mỗi bước 1 truy vấn VALUES
+        cho cả tầng. Dừng khi đạt giới hạn node/cạnh (truncated=True).
+        Không có root: trả về các Khoa làm điểm xuất phát để trình duyệt mở rộng dần.
+        """
+        if root is None:
+            roots = [b["d"]["value"] for b in Dao._query(Dao._Q_GRAPH_DEPARTMENTS.bind())]
+            depth = 0
+        else:
+            local = _local(root)
+            if local.split('_', 1)[0] not in Dao.GRAPH_ROOT_KINDS or '_' not in local:
+                raise ValueError(f"Node gốc không hợp lệ: {root!r}")
+            roots = [UNI + local]
+
+        nodes, edges, seen_edges = {}, [], set()
+        truncated = False
+        if roots:
+            for b in Dao._query(Dao._Q_GRAPH_NODES.bind(nodes=roots)):
+                uri = b["n"]["value"]
+                if uri not in nodes:
+                    nodes[uri] = Dao._graph_node(uri, b.get("name", {}).get("value"), b.get("type", {}).get("value"))
+            nodes = dict(list(nodes.items())[:max_nodes])
+
+        frontier = list(nodes)
+        for _ in range(depth):
+            if not frontier or truncated:
+                break
+            bindings = Dao._query(Dao._Q_GRAPH_EXPAND.bind(nodes=frontier, limit=int(max_edges) * 2 + 1))
+            next_frontier = []
+            for b in bindings:
+                n, m = b["n"]["value"], b["m"]["value"]
+                if m not in nodes:
+                    if len(nodes) >= max_nodes:
+                        truncated = True
+                        continue
+                    nodes[m] = Dao._graph_node(m, b.get("mName", {}).get("value"), b.get("mType", {}).get("value"))
+                    next_frontier.append(m)
+                src, dst = (n, m) if b["out"]["value"] == "true" else (m, n)
+                edge = (src, b["p"]["value"].split('/')[-1], dst)
+                if edge in seen_edges:
+                    continue
+                if len(edges) >= max_edges:
+                    truncated = True
+                    continue
+                seen_edges.add(edge)
+                edges.append({"from": edge[0], "to": edge[2], "label": edge[1]})
+            if len(bindings) > int(max_edges) * 2:
+                truncated = True
+            frontier = next_frontier
+
+        return {"root": roots[0] if root is not None and roots else None,
+                "nodes": list(nodes.values()), "edges": edges, "truncated": truncated}
+
+    @staticmethod
+    def compact_graph(data):
+        """
+        Mã hóa kết quả get_graph_data_json dạng cột cho đường truyền chậm:
+        node đánh số theo vị trí, bảng group/predicate dùng chung, cạnh là các mảng song song.
+        id node = uri_base + key; label null nghĩa là dùng phần sau '_' của key.
+        """
+        base = "http://example.org/university/"
+        index = {n["id"]: i for i, n in enumerate(data["nodes"])}
+        groups, preds = {}, {}
+        nodes = {"key": [], "label": [], "group": []}
+        for n in data["nodes"]:
+            nodes["key"].append(n["key"])
+            nodes["label"].append(None if n["label"] == n["key"].split('_', 1)[-1] else n["label"])
+            nodes["group"].append(groups.setdefault(n["group"], len(groups)))
+        edges = {"from": [], "to": [], "pred": []}
+        for e in data["edges"]:
+            edges["from"].append(index[e["from"]])
+            edges["to"].append(index[e["to"]])
+            edges["pred"].append(preds.setdefault(e["label"], len(preds)))
+        return {"format": "compact", "uri_base": base,
+                "groups": list(groups), "predicates": list(preds),
+                "nodes": nodes, "edges": edges,
+                "root": index.get(data.get("root")), "truncated": data.get("truncated", False)}
 
     # --- THỐNG KÊ (STATS) ---
+    _stats_load_lock = threading.Lock()
+
+    _Q_COUNT_TYPES = queries.register(
+        "count_types", "SELECT ?type (COUNT(?s) AS ?cnt) WHERE { ?s rdf:type ?type } GROUP BY ?type")
+    _Q_COUNT_BY_DEPT = queries.register("count_students_by_dept", """
+        SELECT ?d ?name (COUNT(?s) AS ?cnt) WHERE {
+            ?d rdf:type uni:Department .
+            OPTIONAL { ?d uni:name ?name }
+            OPTIONAL { ?s rdf:type uni:Student ; uni:majorIn ?d }
+        } GROUP BY ?d ?name""")
+    _Q_COUNT_ENROLLMENTS = queries.register(
+        "count_enrollments", "SELECT ?cl (COUNT(?s) AS ?cnt) WHERE { ?s uni:enrolledIn ?cl } GROUP BY ?cl")
+    _Q_COUNT_GRADES = queries.register(
+        "count_grades", "SELECT ?cl (COUNT(?g) AS ?cnt) WHERE { ?g rdf:type uni:Grade ; uni:class ?cl } GROUP BY ?cl")
+
+    @staticmethod
+    def reconcile_stats():
+        """
+        Tính lại toàn bộ bộ đếm thống kê từ GraphDB (lần đầu và định kỳ) để sửa sai lệch
+        của các bộ đếm cộng dồn. Giữ số liệu cũ nếu có truy vấn lỗi.
+        """
+        failures = _query_failures()
+        types, depts, enrollments, grades = Dao._query_many(
+            Dao._Q_COUNT_TYPES.bind(), Dao._Q_COUNT_BY_DEPT.bind(),
+            Dao._Q_COUNT_ENROLLMENTS.bind(), Dao._Q_COUNT_GRADES.bind())
+        if _query_failures() != failures:
+            return None
+        types = [r for r in types if "type" in r]
+        depts = [r for r in depts if "d" in r]
+        enrollments = [r for r in enrollments if "cl" in r]
+        grades = [r for r in grades if "cl" in r]
+
+        counts = {
+            "types": {r["type"]["value"].split('/')[-1]: int(r["cnt"]["value"]) for r in types},
+            "students_by_dept": {_uri_local(r["d"]["value"], "dept_"): int(r["cnt"]["value"]) for r in depts},
+            "enrollments": {_uri_local(r["cl"]["value"], "class_"): int(r["cnt"]["value"]) for r in enrollments},
+            "grades": {_uri_local(r["cl"]["value"], "class_"): int(r["cnt"]["value"]) for r in grades},
+        }
+        dept_names = {_uri_local(r["d"]["value"], "dept_"): r.get("name", {}).get("value") for r in depts}
+        was_ready = stats_counters.ready
+        drift = stats_counters.load(counts, dept_names)
+        if drift:
+            print(f"Bộ đếm thống kê lệch {drift} so với GraphDB, đã cập nhật lại")
+        if drift or not was_ready:
+            Dao._invalidate("stats")
+        return drift
+
     @staticmethod
     def get_system_stats():
-        q_count = """
-        SELECT (COUNT(?s) as ?cnt) ?type
-        WHERE { ?s rdf:type ?type } GROUP BY ?type
-        """
-        res = Dao._query(q_count)
-        stats = {"students": 0, "teachers": 0, "courses": 0, "classes": 0}
-        for r in res:
-            t = r['type']['value'].split('/')[-1]
-            c = int(r['cnt']['value'])
-            if t == 'Student': stats['students'] = c
-            elif t == 'Teacher': stats['teachers'] = c
-            elif t == 'Course': stats['courses'] = c
-            elif t == 'Class': stats['classes'] = c
-            
-        q_dept = """
-        SELECT ?deptName (COUNT(?s) as ?cnt)
-        WHERE {
-            ?s rdf:type uni:Student ; uni:majorIn ?d .
-            ?d uni:name ?deptName .
-        } GROUP BY ?deptName
+        """Thống kê tổng quan, đọc từ bộ đếm trong bộ nhớ (không truy vấn GraphDB)"""
+        if not stats_counters.ready:
+            with Dao._stats_load_lock:
+                if not stats_counters.ready:
+                    Dao.reconcile_stats()
+        counts, dept_names = stats_counters.snapshot()
+        types = counts["types"]
+        stats = {"students": types.get("Student", 0), "teachers": types.get("Teacher", 0),
+                 "courses": types.get("Course", 0), "classes": types.get("Class", 0),
+                 "enrollments": sum(counts["enrollments"].values()),
+                 "grades": sum(counts["grades"].values())}
+        dept_stats = sorted(({"dept": dept_names.get(d) or d, "count": n}
+                             for d, n in counts["students_by_dept"].items()),
+                            key=lambda x: (-x["count"], x["dept"]))
+        busiest = sorted(counts["enrollments"].items(), key=lambda kv: (-kv[1], kv[0]))[:10]
+        class_stats = [{"class_id": c, "enrolled": n, "graded": counts["grades"].get(c, 0)} for c, n in busiest]
+        return {"general": stats, "by_dept": dept_stats, "by_class": class_stats,
+                "reconciled_at": stats_counters.reconciled_at}
+
+    # Thống kê cả khóa theo học kỳ (app/analytics.py): 1 truy vấn lấy mọi lượt đăng ký kèm Khoa,
+    # tín chỉ và điểm (Node Grade tra thẳng theo IRI như get_class_roster), tính gộp bằng NumPy
+    _Q_COHORT = queries.register("cohort_rows", """
+        SELECT ?s ?deptName ?clId ?credit ?score WHERE {
+            ?cl uni:offeredIn $sem ;
+                uni:id ?clId .
+            ?s uni:enrolledIn ?cl .
+            OPTIONAL { ?s uni:majorIn ?d . ?d uni:name ?deptName }
+            OPTIONAL { ?c uni:hasClass ?cl ; uni:credit ?credit }
+            BIND(IRI(CONCAT(STR(uni:grade_), STRAFTER(STR(?cl), STR(uni:class_)), ".",
+                            STRAFTER(STR(?s), STR(uni:student_)))) AS ?g)
+            OPTIONAL { ?g uni:value ?score }
+        }""", sem=Node("sem_"))
+
+    @staticmethod
+    @_cached("students", "departments", "courses", "classes", "enrollments", "grades", "semesters")
+    def get_cohort_analytics(semester):
         """
-        res_dept = Dao._query(q_dept)
-        dept_stats = [{"dept": r['deptName']['value'], "count": r['cnt']['value']} for r in res_dept]
-        return {"general": stats, "by_dept": dept_stats}
+        Phân bố GPA theo Khoa, tỉ lệ qua môn theo lớp và phân bố số tín chỉ đăng ký của sinh viên
+        trong `semester` (xem CohortAnalytics.summarize). None nếu thiếu numpy hoặc mã học kỳ sai.
+        """
+        if not cohort_analytics.available or not semester:
+            return None
+        try:
+            semester = _local(semester)
+        except ValueError:
+            return None
+        bindings = Dao._query(Dao._Q_COHORT.bind(sem=semester))
+        return cohort_analytics.summarize(semester, (
+            (_uri_local(b["s"]["value"], "student_"), b.get("deptName", {}).get("value"), b["clId"]["value"],
+             b.get("credit", {}).get("value"), b.get("score", {}).get("value"))
+            for b in bindings if "s" in b))
 
     # === CÁC HÀM MỚI CHUYỂN ĐỔI (Phần bạn yêu cầu) ===
 
+    # Bạn cùng lớp: ma trận thưa SV x lớp trong bộ nhớ (app/coenrollment.py) thay cho self-join uni:enrolledIn
+    _coenrollment_lock = threading.Lock()
+    _Q_COENROLLMENT = queries.register("coenrollment", """
+        SELECT ?s ?cl ?clId WHERE { ?s uni:enrolledIn ?cl . ?cl uni:id ?clId }""")
+    _Q_STUDENT_CARDS = queries.register("student_cards", """
+        SELECT ?s ?id ?name ?class WHERE {
+            VALUES ?s { $students }
+            ?s uni:id ?id ;
+               uni:name ?name .
+            OPTIONAL { ?s uni:class ?class }
+        }""", students=Values(Node("student_")))
+
+    @staticmethod
+    def rebuild_coenrollment():
+        """Dựng lại ma trận đăng ký SV x lớp từ GraphDB (1 truy vấn); giữ ma trận cũ nếu truy vấn lỗi"""
+        failures = _query_failures()
+        bindings = Dao._query(Dao._Q_COENROLLMENT.bind())
+        if _query_failures() != failures:
+            return False
+        co_enrollment.load((_uri_local(b["s"]["value"], "student_"), _uri_local(b["cl"]["value"], "class_"),
+                            b["clId"]["value"]) for b in bindings if "s" in b)
+        return True
+
     @staticmethod
     def get_classmates(sid):
-        """Tìm bạn cùng lớp: Đếm số lớp học chung"""
-        query = f"""
-        SELECT ?name ?id ?class (COUNT(?cl) as ?shared_count) (GROUP_CONCAT(DISTINCT ?clId; separator=", ") AS ?shared_classes)
-        WHERE {{
-            uni:student_{sid} uni:enrolledIn ?cl .
-            ?friend uni:enrolledIn ?cl ;
-                    uni:id ?id ;
-                    uni:name ?name .
-            FILTER(?friend != uni:student_{sid})
-            
-            ?cl uni:id ?clId .
-            OPTIONAL {{ ?friend uni:class ?class }}
-        }}
-        GROUP BY ?name ?id ?class
-        ORDER BY DESC(?shared_count)
-        LIMIT 10
-        """
-        bindings = Dao._query(query)
+        """Tìm bạn cùng lớp: 10 sinh viên học chung nhiều lớp nhất (tính trong bộ nhớ)"""
+        try:
+            sid = _local(sid)
+        except ValueError:
+            return []
+        if not co_enrollment.fresh():
+            with Dao._coenrollment_lock:
+                if not co_enrollment.fresh():
+                    Dao.rebuild_coenrollment()
+        top = co_enrollment.top(sid, 10)
+        if not top:
+            return []
+        # Chỉ còn lấy hồ sơ của đúng các bạn được chọn
+        cards = {_uri_local(b["s"]["value"], "student_"): b for b in
+                 Dao._query(Dao._Q_STUDENT_CARDS.bind(students=[friend for friend, _, _ in top]))}
         results = []
-        for b in bindings:
-            item = Dao._parse_result(b, ["name", "id", "class", "shared_count", "shared_classes"])
+        for friend, shared_count, shared_classes in top:
+            b = cards.get(friend)
+            if b is None:
+                continue
+            item = Dao._parse_result(b, ["name", "id", "class"])
             item['class_sh'] = item.pop('class') # Đổi tên key cho khớp HTML
-            item['shared_classes'] = item['shared_classes'].split(", ") if item['shared_classes'] else []
+            item['shared_count'] = str(shared_count)
+            item['shared_classes'] = shared_classes
             results.append(item)
         return results
 
-    @staticmethod
-    def get_credit_stats(sid):
-        """Thống kê tín chỉ theo Khoa"""
-        query = f"""
+    _Q_CREDIT_STATS = queries.register("credit_stats", """
         SELECT ?deptName (SUM(xsd:integer(?credit)) as ?total_credit)
-        WHERE {{
-            uni:student_{sid} uni:enrolledIn ?cl .
+        WHERE {
+            $s uni:enrolledIn ?cl .
             ?c uni:hasClass ?cl ;
                uni:credit ?credit ;
                uni:belongsTo ?d .
             ?d uni:name ?deptName .
-        }} GROUP BY ?deptName
-        """
-        res = Dao._query(query)
-        return [{"dept": r['deptName']['value'], "total_credit": r['total_credit']['value']} for r in res]
+        } GROUP BY ?deptName""", s=Node("student_"))
 
     @staticmethod
-    def get_class_roster(class_id):
-        """Lấy danh sách sinh viên kèm điểm số của 1 lớp"""
-        # Tạo URI cho class
-        class_uri = class_id.replace(" ", "_")
-        query = f"""
+    def get_credit_stats(sid):
+        """Thống kê tín chỉ theo Khoa"""
+        res = Dao._query(Dao._Q_CREDIT_STATS.bind(s=sid))
+        return [{"dept": r['deptName']['value'], "total_credit": r['total_credit']['value']} for r in res]
+
+    # Node Grade có IRI xác định theo (lớp, sinh viên): tra trực tiếp, không quét
+    _Q_CLASS_ROSTER = queries.register("class_roster", """
         SELECT ?id ?name ?score
-        WHERE {{
-            ?s uni:enrolledIn uni:class_{class_uri} ;
+        WHERE {
+            ?s uni:enrolledIn $cl ;
                uni:id ?id ;
                uni:name ?name .
-            
-            # Lấy điểm từ Node trung gian Grade (nếu có)
-            OPTIONAL {{
-                ?g rdf:type uni:Grade ;
-                   uni:class uni:class_{class_uri} ;
-                   uni:student ?s ;
-                   uni:value ?score .
-            }}
-        }} ORDER BY ?name
-        """
-        bindings = Dao._query(query)
+            BIND(IRI(CONCAT(STR(uni:grade_), $grade_prefix, STRAFTER(STR(?s), STR(uni:student_)))) AS ?g)
+            OPTIONAL { ?g uni:value ?score . }
+        } ORDER BY ?name""", cl=Node("class_"), grade_prefix=Lit())
+
+    @staticmethod
+    def get_class_roster(class_id):
+        """Lấy danh sách sinh viên kèm điểm số của 1 lớp"""
+        try:
+            class_uri = _local(class_id)
+        except ValueError:
+            return []
+        bindings = Dao._query(Dao._Q_CLASS_ROSTER.bind(cl=class_uri, grade_prefix=f"{class_uri}."))
         return [Dao._parse_result(b, ["id", "name", "score"]) for b in bindings]
 
+    @staticmethod
+    def _grade_node(class_uri, sid):
+        """IRI của Node Grade cho (lớp, sinh viên); mã đã qua _local không chứa '.' nên không bị trùng"""
+        return f"{UNI}grade_{class_uri}.{sid}"
+
     @staticmethod
     def update_grade(class_id, student_id, score):
-        """Cập nhật điểm: Xóa Node Grade cũ và tạo Node Grade mới"""
-        class_uri = class_id.replace(" ", "_")
-        
-        # 1. Xóa điểm cũ (nếu có)
-        delete_query = f"""
-        DELETE WHERE {{
-            ?g rdf:type uni:Grade ;
-               uni:class uni:class_{class_uri} ;
-               uni:student uni:student_{student_id} ;
-               ?p ?o .
-        }}
+        """Cập nhật điểm 1 sinh viên (điểm rỗng = xóa điểm), xem update_grades_bulk"""
+        return Dao.update_grades_bulk(class_id, [(student_id, score)])
+
+    @staticmethod
+    def _parse_score(score):
+        """Chuẩn hóa điểm thang 10: '' -> None (xóa điểm), '8,5' -> '8.5'; sai định dạng thì ValueError"""
+        text = str(score if score is not None else "").strip().replace(",", ".")
+        if not text:
+            return None
+        try:
+            value = float(text)
+        except ValueError:
+            raise ValueError(f"Điểm không hợp lệ: {score!r}")
+        if not 0 <= value <= 10:
+            raise ValueError(f"Điểm phải trong khoảng 0-10: {score!r}")
+        return f"{value:g}"
+
+    @staticmethod
+    def parse_grade_csv(text):
         """
-        Dao._update(delete_query)
-        
-        # 2. Nếu có điểm mới thì Insert
-        if score and score.strip():
-            # Tạo ID ngẫu nhiên cho Node Grade để không trùng
-            grade_uuid = str(uuid.uuid4())
-            insert_query = f"""
-            INSERT DATA {{
-                uni:grade_{grade_uuid} rdf:type uni:Grade ;
-                                       uni:class uni:class_{class_uri} ;
-                                       uni:student uni:student_{student_id} ;
-                                       uni:value "{score}" .
-            }}
-            """
-            Dao._update(insert_query)
-
-    @staticmethod
-    def export_full_data():
-        """Xuất toàn bộ dữ liệu quan trọng ra JSON"""
-        return {
-            "teachers": Dao.get_all_teachers(),
-            "students": Dao.get_all_students(),
-            "courses": Dao.get_all_courses()
-            # Lưu ý: Class Section có cấu trúc phức tạp hơn, 
-            # trong phạm vi demo ta tập trung vào 3 thực thể chính này trước.
-        }
+        Đọc file CSV bảng điểm thành [(student_id, score)].
+        Nhận dòng tiêu đề có cột MSSV/student_id/id và Diem/Điểm/score; không có tiêu đề
+        thì lấy 2 cột đầu. Dòng trống bị bỏ qua.
+        """
+        lines = [row for row in csv.reader(io.StringIO(text.lstrip("\ufeff"))) if any(c.strip() for c in row)]
+        if not lines:
+            return []
+        header = [fold(c) for c in lines[0]]
+        id_col = next((i for i, c in enumerate(header) if c in ("mssv", "student_id", "id", "ma sv")), None)
+        score_col = next((i for i, c in enumerate(header) if c in ("diem", "score", "grade")), None)
+        if id_col is not None and score_col is not None:
+            lines = lines[1:]
+        else:
+            id_col, score_col = 0, 1
+        return [(row[id_col].strip() if id_col < len(row) else "",
+                 row[score_col] if score_col < len(row) else "") for row in lines]
+
+    _Q_GRADED_ROSTER = queries.register("graded_roster", """
+        SELECT ?id ?graded WHERE {
+            ?s uni:enrolledIn $cl ; uni:id ?id .
+            BIND(IRI(CONCAT(STR(uni:grade_), $grade_prefix, STRAFTER(STR(?s), STR(uni:student_)))) AS ?g)
+            OPTIONAL { ?g rdf:type uni:Grade . BIND(true AS ?graded) }
+        }""", cl=Node("class_"), grade_prefix=Lit())
+    _Q_DELETE_NODES = queries.register("delete_nodes", """
+        DELETE { ?g ?p ?o } WHERE {
+            VALUES ?g { $nodes }
+            ?g ?p ?o .
+        }""", kind="update", nodes=Values(Iri()))
+    _F_GRADE = queries.register("grade_triples", """
+        $g rdf:type uni:Grade ;
+           uni:class $cl ;
+           uni:student $s ;
+           uni:value $value .
+        """, kind="fragment", g=Iri(), cl=Node("class_"), s=Node("student_"), value=Lit())
 
     @staticmethod
-    def import_from_json(data):
-        if "teachers" in data:
-            for t in data["teachers"]:
-                d = t["data"]
-                dept_id = "CNTT"
-                if t["dept"] == "Kinh tế": dept_id = "KT"
-                elif t["dept"] == "Ngoại ngữ": dept_id = "NN"
-                elif t["dept"] == "Quản trị Kinh doanh": dept_id = "QTKD"
-                elif t["dept"] == "Du lịch & Khách sạn": dept_id = "DL"
-                
-                Dao.add_teacher(d["teacher_id"], d["name"], d["phone"], d["position"], dept_id)
-
-        if "students" in data:
-            for s in data["students"]:
-                d = s["data"]
-                dept_id = "CNTT"
-                if s.get("major") == "Kinh tế": dept_id = "KT"
-                elif s.get("major") == "Ngoại ngữ": dept_id = "NN"
-                elif s.get("major") == "Quản trị Kinh doanh": dept_id = "QTKD"
-                elif s.get("major") == "Du lịch & Khách sạn": dept_id = "DL"
-                
-                pwd = d.get("password", "123456") 
-                
-                Dao.add_student(d["student_id"], d["name"], d["phone"], d["class"], d["year"], dept_id, pwd)
-
-        if "courses" in data:
-            for c in data["courses"]:
-                d = c["data"]
-                dept_id = "CNTT"
-                if c["dept"] == "Kinh tế": dept_id = "KT"
-                elif c["dept"] == "Ngoại ngữ": dept_id = "NN"
-                elif c["dept"] == "Quản trị Kinh doanh": dept_id = "QTKD"
-                elif c["dept"] == "Du lịch & Khách sạn": dept_id = "DL"
-                
-                Dao.add_course(d["course_id"], d["name"], d["credit"], d["semester"], dept_id)
-        
-        return True
-    
+    def update_grades_bulk(class_id, rows):
+        """
+        Ghi điểm cả lớp trong 1 lệnh Update (1 transaction): thay thế trực tiếp Node Grade
+        (IRI xác định theo lớp + sinh viên) của các dòng, điểm rỗng thì xóa Node.
+        Kiểm tra hết các dòng trước: có dòng lỗi thì không ghi gì cả.
+        rows: [(student_id, score)] -> {"updated", "cleared", "errors": [{"row", "student_id", "error"}]}
+        """
+        report = {"updated": 0, "cleared": 0, "errors": []}
+        try:
+            class_uri = _local(class_id)
+        except ValueError as e:
+            report["errors"].append({"row": None, "student_id": None, "error": str(e)})
+            return report
+
+        roster = Dao._query(Dao._Q_GRADED_ROSTER.bind(cl=class_uri, grade_prefix=f"{class_uri}."))
+        enrolled = {b["id"]["value"] for b in roster}
+        graded_before = {b["id"]["value"] for b in roster if "graded" in b}
+        grades, seen, delta = [], set(), 0
+        for no, (student_id, score) in enumerate(rows, start=1):
+            student_id = str(student_id or "").strip()
+            error = None
+            try:
+                sid = _local(student_id)
+                value = Dao._parse_score(score)
+            except ValueError as e:
+                error = str(e)
+            else:
+                if student_id in seen:
+                    error = "Trùng MSSV trong danh sách"
+                elif student_id not in enrolled:
+                    error = f"Sinh viên không thuộc lớp {class_id}"
+            if error:
+                report["errors"].append({"row": no, "student_id": student_id, "error": error})
+                continue
+            seen.add(student_id)
+            grades.append((sid, value))
+            delta += (value is not None) - (student_id in graded_before)
+        if report["errors"] or not grades:
+            return report
+
+        triples = []
+        for sid, value in grades:
+            if value is None:
+                report["cleared"] += 1
+                continue
+            triples.append(Dao._F_GRADE.bind(g=Dao._grade_node(class_uri, sid), cl=class_uri, s=sid, value=value))
+            report["updated"] += 1
+        update = queries.join(
+            Dao._Q_DELETE_NODES.bind(nodes=[Dao._grade_node(class_uri, sid) for sid, _ in grades]),
+            Dao._Q_INSERT_DATA.bind(triples=triples), name="update_grades")
+        try:
+            get_driver().update(update.text, name=update.name)
+        except Exception as e:
+            print(f"Lỗi SPARQL Update: {e}")
+            report["updated"] = report["cleared"] = 0
+            report["errors"].append({"row": None, "student_id": None, "error": "Lỗi ghi dữ liệu, chưa lưu điểm nào"})
+        else:
+            stats_counters.add("grades", class_uri, delta)
+        Dao._invalidate("grades")
+        return report
+
+    _Q_LEGACY_GRADES = queries.register("legacy_grades", """
+        SELECT ?cl ?s ?new (MAX(xsd:decimal(?v)) AS ?best) (SAMPLE(?cur) AS ?current)
+               (COUNT(DISTINCT ?g) AS ?n)
+        WHERE {
+            ?g rdf:type uni:Grade ; uni:class ?cl ; uni:student ?s .
+            FILTER(STRSTARTS(STR(?cl), STR(uni:class_)) && STRSTARTS(STR(?s), STR(uni:student_)))
+            BIND(IRI(CONCAT(STR(uni:grade_), STRAFTER(STR(?cl), STR(uni:class_)), ".",
+                            STRAFTER(STR(?s), STR(uni:student_)))) AS ?new)
+            FILTER(?g != ?new)
+            OPTIONAL { ?g uni:value ?v }
+            OPTIONAL { ?new uni:value ?cur }
+        } GROUP BY ?cl ?s ?new LIMIT $limit""", limit=Int())
+    _Q_DELETE_LEGACY_GRADES = queries.register("delete_legacy_grades", """
+        DELETE { ?g ?p ?o } WHERE {
+            VALUES (?cl ?s ?new) { $groups }
+            ?g rdf:type uni:Grade ; uni:class ?cl ; uni:student ?s ; ?p ?o .
+            FILTER(?g != ?new)
+        }""", kind="update", groups=Values(Iri(), Iri(), Iri()))
+    _F_MIGRATED_GRADE = queries.register("migrated_grade_triples", """
+        $g rdf:type uni:Grade ; uni:class $cl ; uni:student $s ; uni:value $value .
+        """, kind="fragment", g=Iri(), cl=Iri(), s=Iri(), value=Lit())
+
+    @staticmethod
+    def migrate_grade_nodes(batch_size=2000):
+        """
+        Chuyển các Node Grade cũ (uni:grade_{uuid}) sang IRI xác định theo (lớp, sinh viên)
+        và gộp các Node trùng. Nếu đã có Node mới thì giữ điểm của Node mới (lần ghi sau cùng),
+        ngược lại lấy điểm cao nhất trong các Node trùng. Chạy được nhiều lần.
+        """
+        migrated = 0
+        while True:
+            rows = Dao._query(Dao._Q_LEGACY_GRADES.bind(limit=batch_size))
+            # Một số engine trả 1 dòng rỗng cho truy vấn gộp không có nhóm nào
+            rows = [b for b in rows if "new" in b]
+            if not rows:
+                break
+            values, triples = [], []
+            for b in rows:
+                cl, st, new = (b[k]["value"] for k in ("cl", "s", "new"))
+                values.append((cl, st, new))
+                if "current" not in b and "best" in b:
+                    best = b["best"]["value"]
+                    try:
+                        best = Dao._parse_score(best)
+                    except ValueError:
+                        pass
+                    triples.append(Dao._F_MIGRATED_GRADE.bind(g=new, cl=cl, s=st, value=best))
+            update = queries.join(Dao._Q_DELETE_LEGACY_GRADES.bind(groups=values),
+                                  Dao._Q_INSERT_DATA.bind(triples=triples), name="migrate_grades")
+            try:
+                get_driver().update(update.text, name=update.name)
+            except Exception as e:
+                print(f"Lỗi chuyển đổi Node Grade: {e}")
+                break
+            migrated += len(rows)
+        if migrated:
+            print(f"Đã chuyển đổi điểm của {migrated} cặp (lớp, sinh viên) sang Node Grade mới")
+            Dao._invalidate("grades")
+            stats_counters.invalidate()
+        return migrated
+
+    # --- XUẤT DỮ LIỆU (EXPORT THEO LUỒNG) ---
+    # Mỗi loại thực thể: (template SELECT, hàm chuyển 1 dòng CSV -> bản ghi JSON).
+    # Bản ghi teachers/students/courses giữ đúng cấu trúc mà import_from_json đọc.
+    _EXPORT_QUERIES = {
+        "teachers": (queries.register("export_teachers", """
+            SELECT ?id ?name ?phone ?pos ?status ?deptName WHERE {
+                ?t rdf:type uni:Teacher ; uni:id ?id ; uni:name ?name .
+                OPTIONAL { ?t uni:phone ?phone }
+                OPTIONAL { ?t uni:position ?pos }
+                OPTIONAL { ?t uni:status ?status }
+                OPTIONAL { ?t uni:belongsTo ?d . ?d uni:name ?deptName }
+            }"""),
+            lambda r: {"data": {"id": r["id"], "name": r["name"], "phone": r["phone"] or None,
+                                "pos": r["pos"] or None, "status": r["status"] or None,
+                                "teacher_id": r["id"]},
+                       "dept": r["deptName"]}),
+        "students": (queries.register("export_students", """
+            SELECT ?id ?name ?phone ?class ?year ?status ?deptName WHERE {
+                ?s rdf:type uni:Student ; uni:id ?id ; uni:name ?name .
+                OPTIONAL { ?s uni:phone ?phone }
+                OPTIONAL { ?s uni:class ?class }
+                OPTIONAL { ?s uni:year ?year }
+                OPTIONAL { ?s uni:status ?status }
+                OPTIONAL { ?s uni:majorIn ?d . ?d uni:name ?deptName }
+            }"""),
+            lambda r: {"data": {"id": r["id"], "name": r["name"], "phone": r["phone"] or None,
+                                "class": r["class"] or None, "year": r["year"] or None,
+                                "status": r["status"] or None, "student_id": r["id"]},
+                       "major": r["deptName"]}),
+        "courses": (queries.register("export_courses", """
+            SELECT ?id ?name ?credit ?sem ?deptName WHERE {
+                ?c rdf:type uni:Course ; uni:id ?id ; uni:name ?name .
+                OPTIONAL { ?c uni:credit ?credit }
+                OPTIONAL { ?c uni:semester ?sem }
+                OPTIONAL { ?c uni:belongsTo ?d . ?d uni:name ?deptName }
+            }"""),
+            lambda r: {"data": {"id": r["id"], "name": r["name"], "credit": r["credit"] or None,
+                                "sem": r["sem"] or None, "course_id": r["id"],
+                                "semester": r["sem"] or None},
+                       "dept": r["deptName"]}),
+        "classes": (queries.register("export_classes", """
+            SELECT ?id ?room ?schedule ?courseId ?teacherId ?semId WHERE {
+                ?cl rdf:type uni:Class ; uni:id ?id .
+                OPTIONAL { ?cl uni:room ?room }
+                OPTIONAL { ?cl uni:schedule ?schedule }
+                OPTIONAL { ?c uni:hasClass ?cl ; uni:id ?courseId }
+                OPTIONAL { ?t uni:teaches ?cl ; uni:id ?teacherId }
+                OPTIONAL { ?cl uni:offeredIn ?sem . ?sem uni:id ?semId }
+            }"""),
+            lambda r: {"class_id": r["id"], "room": r["room"] or None, "schedule": r["schedule"] or None,
+                       "course_id": r["courseId"] or None, "teacher_id": r["teacherId"] or None,
+                       "semester_id": r["semId"] or None}),
+        "enrollments": (queries.register("export_enrollments", """
+            SELECT ?studentId ?classId WHERE {
+                ?s uni:enrolledIn ?cl ; uni:id ?studentId .
+                ?cl uni:id ?classId .
+            }"""),
+            lambda r: {"student_id": r["studentId"], "class_id": r["classId"]}),
+        "grades": (queries.register("export_grades", """
+            SELECT ?classId ?studentId ?score WHERE {
+                ?g rdf:type uni:Grade ; uni:class ?cl ; uni:student ?s ; uni:value ?score .
+                ?cl uni:id ?classId .
+                ?s uni:id ?studentId .
+            }"""),
+            lambda r: {"class_id": r["classId"], "student_id": r["studentId"], "score": r["score"]}),
+    }
+
+    # Toàn bộ dữ liệu trường (trừ tài khoản Admin và mật khẩu sinh viên, như bản JSON) cho định dạng RDF
+    _EXPORT_CONSTRUCT = queries.register("export_rdf", """
+        CONSTRUCT { ?s ?p ?o } WHERE {
+            ?s ?p ?o .
+            FILTER(STRSTARTS(STR(?s), "http://example.org/university/"))
+            FILTER(?p != uni:password)
+            FILTER NOT EXISTS { ?s rdf:type uni:Admin }
+        }""")
+
+    EXPORT_FORMATS = {
+        # format: (mimetype, đuôi file)
+        "json": ("application/json", "json"),
+        "ndjson": ("application/x-ndjson", "ndjson"),
+        "nt": ("application/n-triples", "nt"),
+        "ttl": ("text/turtle", "ttl"),
+    }
+
+    @staticmethod
+    def _iter_export(kind):
+        template, to_record = Dao._EXPORT_QUERIES[kind]
+        query = template.bind()
+        for row in get_driver().select_rows(query.text, name=query.name):
+            yield to_record(row)
+
+    @staticmethod
+    def _buffered(chunks, size=64 * 1024):
+        """Gom các chuỗi nhỏ thành khối ~64KB để không flush socket cho từng dòng"""
+        buf, buf_len = [], 0
+        for chunk in chunks:
+            buf.append(chunk)
+            buf_len += len(chunk)
+            if buf_len >= size:
+                yield "".join(buf).encode('utf-8')
+                buf, buf_len = [], 0
+        if buf:
+            yield "".join(buf).encode('utf-8')
+
+    @staticmethod
+    def stream_export(fmt="json"):
+        """
+        Xuất toàn bộ dữ liệu theo luồng (generator các khối bytes): dòng nào
+        GraphDB trả về thì ghi ra ngay, bộ nhớ không tăng theo kích thước dữ liệu.
+        - json:   {"teachers": [...], "students": [...], ...} (tương thích import)
+        - ndjson: mỗi dòng 1 bản ghi, có thêm trường "type"
+        - nt/ttl: toàn bộ triple của trường dạng N-Triples / Turtle
+        """
+        if fmt in ("nt", "ttl"):
+            accept = Dao.EXPORT_FORMATS[fmt][0]
+            query = Dao._EXPORT_CONSTRUCT.bind()
+            return get_driver().construct_chunks(query.text, accept=accept, name=query.name)
+        if fmt == "ndjson":
+            return Dao._buffered(Dao._ndjson_chunks())
+        return Dao._buffered(Dao._json_chunks())
+
+    @staticmethod
+    def _ndjson_chunks():
+        for kind in Dao._EXPORT_QUERIES:
+            for record in Dao._iter_export(kind):
+                yield json.dumps({"type": kind, **record}, ensure_ascii=False) + "\n"
+
+    @staticmethod
+    def _json_chunks():
+        yield "{"
+        for i, kind in enumerate(Dao._EXPORT_QUERIES):
+            yield ("," if i else "") + f'\n"{kind}": ['
+            sep = "\n"
+            for record in Dao._iter_export(kind):
+                yield sep + json.dumps(record, ensure_ascii=False)
+                sep = ",\n"
+            yield "\n]"
+        yield "\n}\n"
+
+    # Số bộ ba (triple) sinh ra cho mỗi loại bản ghi, dùng để chia batch
+    _TRIPLES_PER_RECORD = {"teachers": 7, "students": 9, "courses": 6}
+
+    @staticmethod
+    def _import_record_triples(kind, record):
+        """Sinh khối triple cho 1 bản ghi trong file JSON export"""
+        d = record["data"]
+        if kind == "teachers":
+            dept_id = DEPT_IDS_BY_NAME.get(record.get("dept"), "CNTT")
+            return d["teacher_id"], Dao._teacher_triples(
+                d["teacher_id"], d["name"], d.get("phone"), d.get("position", d.get("pos")), dept_id)
+        if kind == "students":
+            dept_id = DEPT_IDS_BY_NAME.get(record.get("major"), "CNTT")
+            pwd = d.get("password", "123456")
+            return d["student_id"], Dao._student_triples(
+                d["student_id"], d["name"], d.get("phone"), d.get("class"), d.get("year"), dept_id, pwd)
+        dept_id = DEPT_IDS_BY_NAME.get(record.get("dept"), "CNTT")
+        return d["course_id"], Dao._course_triples(
+            d["course_id"], d["name"], d.get("credit"), d.get("semester"), dept_id)
+
+    @staticmethod
+    def import_from_json(data, batch_triples=5000, progress=None):
+        """
+        Import hàng loạt: gom nhiều bản ghi vào 1 lệnh INSERT DATA
+        (khoảng `batch_triples` triple/lệnh) thay vì 1 request HTTP mỗi bản ghi.
+        `progress(batch_no, total_batches, loaded)` được gọi sau mỗi batch.
+        Trả về báo cáo gồm số bản ghi đã nạp, bản ghi lỗi và các batch lỗi.
+        """
+        report = {"loaded": 0, "triples": 0, "batches": 0, "invalid": [], "failed_batches": []}
+
+        # 1. Chia batch (mỗi batch chứa trọn vẹn các bản ghi)
+        batches = []
+        current, current_ids, current_size = [], [], 0
+        for kind in ("teachers", "students", "courses"):
+            for i, record in enumerate(data.get(kind, [])):
+                try:
+                    rid, triples = Dao._import_record_triples(kind, record)
+                except (KeyError, TypeError, ValueError) as e:
+                    report["invalid"].append({"record": f"{kind}[{i}]", "error": f"{type(e).__name__}: {e}"})
+                    continue
+                current.append(triples)
+                current_ids.append(f"{kind}:{rid}")
+                current_size += Dao._TRIPLES_PER_RECORD[kind]
+                if current_size >= batch_triples:
+                    batches.append((current, current_ids, current_size))
+                    current, current_ids, current_size = [], [], 0
+        if current:
+            batches.append((current, current_ids, current_size))
+
+        # 2. Gửi từng batch, ghi nhận lỗi theo batch thay vì bỏ qua
+        client = get_driver()
+        for no, (blocks, ids, size) in enumerate(batches, start=1):
+            try:
+                update = Dao._Q_INSERT_DATA.bind(triples=blocks)
+                client.update(update.text, name="import_batch")
+                report["loaded"] += len(ids)
+                report["triples"] += size
+            except Exception as e:
+                detail = e.response.text if isinstance(e, requests.HTTPError) else str(e)
+                report["failed_batches"].append({"batch": no, "records": ids, "error": detail})
+            report["batches"] = no
+            if progress:
+                progress(no, len(batches), report["loaded"])
+
+        # Xóa cache danh sách và cache tra cứu của đúng các mã vừa import
+        touched = [rid.split(":", 1) for _, ids, _ in batches for rid in ids]
+        Dao._invalidate(*{kind for kind, _ in touched},
+                        *(f"{kind[:-1]}:{rid}" for kind, rid in touched))
+        if touched:
+            search_index.invalidate()  # xây lại toàn bộ ở lần tìm kiếm kế tiếp
+            credential_index.invalidate()
+            shared_changes.publish("auth:*")
+            stats_counters.invalidate()
+            semester_catalog.invalidate()
+            timetable_index.invalidate()
+            co_enrollment.invalidate()
+        return report
+
         # === CÁC HÀM UPDATE (SỬA ĐỔI) ===
 
     # --- 1. UPDATE TEACHER ---
+    _Q_TEACHER_BY_ID = queries.register("teacher_by_id", """
+        SELECT ?id ?name ?phone ?pos ?status ?deptId
+        WHERE {
+            $t uni:id ?id ;
+               uni:name ?name .
+            OPTIONAL { $t uni:phone ?phone }
+            OPTIONAL { $t uni:position ?pos }
+            OPTIONAL { $t uni:status ?status }
+            OPTIONAL { $t uni:belongsTo ?d . ?d uni:id ?deptId }
+        }""", t=Node("teacher_"))
+    # Xóa thông tin cũ rồi ghi thông tin mới trong cùng 1 lệnh
+    # (Lưu ý: Không xóa quan hệ teaches để tránh mất lớp dạy)
+    _Q_UPDATE_TEACHER = queries.register("update_teacher", """
+        DELETE {
+            $t uni:name ?name ;
+               uni:phone ?phone ;
+               uni:position ?pos ;
+               uni:belongsTo ?d .
+        }
+        WHERE {
+            $t uni:name ?name .
+            OPTIONAL { $t uni:phone ?phone }
+            OPTIONAL { $t uni:position ?pos }
+            OPTIONAL { $t uni:belongsTo ?d }
+        } ;
+        INSERT DATA {
+            $t uni:name $name ;
+               uni:phone $phone ;
+               uni:position $position ;
+               uni:belongsTo $dept .
+        }""", kind="update", t=Node("teacher_"), name=Lit(), phone=Lit(), position=Lit(), dept=Node("dept_"))
+
     @staticmethod
+    @_cached("teacher:{0}")
     def get_teacher_by_id(tid):
         """Lấy thông tin chi tiết GV để đổ vào form sửa"""
-        query = f"""
-        SELECT ?id ?name ?phone ?pos ?status ?deptId
-        WHERE {{
-            uni:teacher_{tid} uni:id ?id ;
-                              uni:name ?name .
-            OPTIONAL {{ uni:teacher_{tid} uni:phone ?phone }}
-            OPTIONAL {{ uni:teacher_{tid} uni:position ?pos }}
-            OPTIONAL {{ uni:teacher_{tid} uni:status ?status }}
-            OPTIONAL {{ uni:teacher_{tid} uni:belongsTo ?d . ?d uni:id ?deptId }}
-        }}
-        """
+        try:
+            query = Dao._Q_TEACHER_BY_ID.bind(t=tid)
+        except ValueError:
+            return None
         res = Dao._query(query)
         if res:
             return Dao._parse_result(res[0], ["id", "name", "phone", "pos", "status", "deptId"])
@@ -675,101 +2041,120 @@ class Dao:
     @staticmethod
     def update_teacher(tid, name, phone, position, dept_id):
         """Cập nhật GV: Xóa thuộc tính cũ và Insert thuộc tính mới"""
-        # 1. Xóa thông tin cũ (Lưu ý: Không xóa quan hệ teaches để tránh mất lớp dạy)
-        delete_query = f"""
-        DELETE {{
-            uni:teacher_{tid} uni:name ?name ;
-                              uni:phone ?phone ;
-                              uni:position ?pos ;
-                              uni:belongsTo ?d .
-        }}
-        WHERE {{
-            uni:teacher_{tid} uni:name ?name .
-            OPTIONAL {{ uni:teacher_{tid} uni:phone ?phone }}
-            OPTIONAL {{ uni:teacher_{tid} uni:position ?pos }}
-            OPTIONAL {{ uni:teacher_{tid} uni:belongsTo ?d }}
-        }}
-        """
-        Dao._update(delete_query)
-        
-        # 2. Thêm thông tin mới
-        insert_query = f"""
-        INSERT DATA {{
-            uni:teacher_{tid} uni:name "{name}" ;
-                              uni:phone "{phone}" ;
-                              uni:position "{position}" ;
-                              uni:belongsTo uni:dept_{dept_id} .
-        }}
-        """
-        Dao._update(insert_query)
+        written = Dao._update(Dao._Q_UPDATE_TEACHER.bind(t=tid, name=name, phone=phone, position=position,
+                                                         dept=dept_id))
+        Dao._invalidate("teachers", f"teacher:{tid}")
+        if written:
+            Dao._reindex("teacher", tid, name)
 
     # --- 2. UPDATE STUDENT ---
+    _Q_STUDENT_BY_ID = queries.register("student_by_id", """
+        SELECT ?id ?name ?phone ?class ?year ?deptId ?password
+        WHERE {
+            $s uni:id ?id ;
+               uni:name ?name .
+            OPTIONAL { $s uni:phone ?phone }
+            OPTIONAL { $s uni:class ?class }
+            OPTIONAL { $s uni:year ?year }
+            OPTIONAL { $s uni:password ?password }
+            OPTIONAL { $s uni:majorIn ?d . ?d uni:id ?deptId }
+        }""", s=Node("student_"))
+    _Q_UPDATE_STUDENT = queries.register("update_student", """
+        DELETE {
+            $s uni:name ?name ;
+               uni:phone ?phone ;
+               uni:class ?class ;
+               uni:year ?year ;
+               uni:password ?pwd ;
+               uni:majorIn ?d .
+        }
+        WHERE {
+            $s uni:name ?name .
+            OPTIONAL { $s uni:phone ?phone }
+            OPTIONAL { $s uni:class ?class }
+            OPTIONAL { $s uni:year ?year }
+            OPTIONAL { $s uni:password ?pwd }
+            OPTIONAL { $s uni:majorIn ?d }
+        } ;
+        INSERT DATA {
+            $s uni:name $name ;
+               uni:phone $phone ;
+               uni:class $cls ;
+               uni:year $year ;
+               uni:password $password ;
+               uni:majorIn $dept .
+        }""", kind="update", s=Node("student_"), name=Lit(), phone=Lit(), cls=Lit(), year=Lit(),
+        password=Lit(), dept=Node("dept_"))
+
     @staticmethod
+    @_cached("student:{0}")
     def get_student_by_id(sid):
-        query = f"""
-        SELECT ?id ?name ?phone ?class ?year ?deptId ?password
-        WHERE {{
-            uni:student_{sid} uni:id ?id ;
-                              uni:name ?name .
-            OPTIONAL {{ uni:student_{sid} uni:phone ?phone }}
-            OPTIONAL {{ uni:student_{sid} uni:class ?class }}
-            OPTIONAL {{ uni:student_{sid} uni:year ?year }}
-            OPTIONAL {{ uni:student_{sid} uni:password ?password }}
-            OPTIONAL {{ uni:student_{sid} uni:majorIn ?d . ?d uni:id ?deptId }}
-        }}
-        """
+        try:
+            query = Dao._Q_STUDENT_BY_ID.bind(s=sid)
+        except ValueError:
+            return None
         res = Dao._query(query)
         if res:
             return Dao._parse_result(res[0], ["id", "name", "phone", "class", "year", "deptId", "password"])
         return None
 
     @staticmethod
-    def update_student(sid, name, phone, _class, year, dept_id, password):
-        delete_query = f"""
-        DELETE {{
-            uni:student_{sid} uni:name ?name ;
-                              uni:phone ?phone ;
-                              uni:class ?class ;
-                              uni:year ?year ;
-                              uni:password ?pwd ;
-                              uni:majorIn ?d .
-        }}
-        WHERE {{
-            uni:student_{sid} uni:name ?name .
-            OPTIONAL {{ uni:student_{sid} uni:phone ?phone }}
-            OPTIONAL {{ uni:student_{sid} uni:class ?class }}
-            OPTIONAL {{ uni:student_{sid} uni:year ?year }}
-            OPTIONAL {{ uni:student_{sid} uni:password ?pwd }}
-            OPTIONAL {{ uni:student_{sid} uni:majorIn ?d }}
-        }}
-        """
-        Dao._update(delete_query)
-        
-        insert_query = f"""
-        INSERT DATA {{
-            uni:student_{sid} uni:name "{name}" ;
-                              uni:phone "{phone}" ;
-                              uni:class "{_class}" ;
-                              uni:year "{year}" ;
-                              uni:password "{password}" ;
-                              uni:majorIn uni:dept_{dept_id} .
-        }}
-        """
-        Dao._update(insert_query)
+    def update_student(sid, name, phone, _class, year, dept_id, password, old_dept_id=None):
+        """old_dept_id: mã Khoa hiện tại của SV nếu nơi gọi đã có (để khỏi đọc lại khi cập nhật bộ đếm)"""
+        query = Dao._Q_UPDATE_STUDENT.bind(s=sid, name=name, phone=phone, cls=_class, year=year,
+                                           password=password, dept=dept_id)
+        if old_dept_id is None:
+            old_dept_id = (Dao.get_student_by_id(sid) or {}).get("deptId")
+        written = Dao._update(query)
+        Dao._invalidate("students", f"student:{sid}")
+        if not written:
+            return
+        if old_dept_id and old_dept_id != dept_id:
+            stats_counters.add("students_by_dept", old_dept_id, -1)
+            stats_counters.add("students_by_dept", dept_id, 1)
+        Dao._reindex("student", sid, name, _class)
+        credential_index.set("student", sid, password)
+        shared_changes.publish(f"auth:student:{sid}")
 
     # --- 3. UPDATE COURSE ---
+    _Q_COURSE_BY_ID = queries.register("course_by_id", """
+        SELECT ?id ?name ?credit ?sem ?deptId
+        WHERE {
+            $c uni:id ?id ;
+               uni:name ?name .
+            OPTIONAL { $c uni:credit ?credit }
+            OPTIONAL { $c uni:semester ?sem }
+            OPTIONAL { $c uni:belongsTo ?d . ?d uni:id ?deptId }
+        }""", c=Node("course_"))
+    _Q_UPDATE_COURSE = queries.register("update_course", """
+        DELETE {
+            $c uni:name ?name ;
+               uni:credit ?credit ;
+               uni:semester ?sem ;
+               uni:belongsTo ?d .
+        }
+        WHERE {
+            $c uni:name ?name .
+            OPTIONAL { $c uni:credit ?credit }
+            OPTIONAL { $c uni:semester ?sem }
+            OPTIONAL { $c uni:belongsTo ?d }
+        } ;
+        INSERT DATA {
+            $c uni:name $name ;
+               uni:credit $credit ;
+               uni:semester $semester ;
+               uni:belongsTo $dept .
+        }""", kind="update", c=Node("course_"), name=Lit(), credit=Lit(), semester=Lit(), dept=Node("dept_"))
+    _Q_DELETE_COURSE = queries.register("delete_course", "DELETE WHERE { $c ?p ?o . }", kind="update",
+                                        c=Node("course_"))
+
     @staticmethod
+    @_cached("course:{0}")
     def get_course_by_id(cid):
-        query = f"""
-        SELECT ?id ?name ?credit ?sem ?deptId
-        WHERE {{
-            uni:course_{cid} uni:id ?id ;
-                             uni:name ?name .
-            OPTIONAL {{ uni:course_{cid} uni:credit ?credit }}
-            OPTIONAL {{ uni:course_{cid} uni:semester ?sem }}
-            OPTIONAL {{ uni:course_{cid} uni:belongsTo ?d . ?d uni:id ?deptId }}
-        }}
-        """
+        try:
+            query = Dao._Q_COURSE_BY_ID.bind(c=cid)
+        except ValueError:
+            return None
         res = Dao._query(query)
         if res:
             return Dao._parse_result(res[0], ["id", "name", "credit", "sem", "deptId"])
@@ -777,35 +2162,22 @@ class Dao:
 
     @staticmethod
     def update_course(cid, name, credit, semester, dept_id):
-        delete_query = f"""
-        DELETE {{
-            uni:course_{cid} uni:name ?name ;
-                             uni:credit ?credit ;
-                             uni:semester ?sem ;
-                             uni:belongsTo ?d .
-        }}
-        WHERE {{
-            uni:course_{cid} uni:name ?name .
-            OPTIONAL {{ uni:course_{cid} uni:credit ?credit }}
-            OPTIONAL {{ uni:course_{cid} uni:semester ?sem }}
-            OPTIONAL {{ uni:course_{cid} uni:belongsTo ?d }}
-        }}
-        """
-        Dao._update(delete_query)
-        
-        insert_query = f"""
-        INSERT DATA {{
-            uni:course_{cid} uni:name "{name}" ;
-                             uni:credit "{credit}" ;
-                             uni:semester "{semester}" ;
-                             uni:belongsTo uni:dept_{dept_id} .
-        }}
-        """
-        Dao._update(insert_query)
+        written = Dao._update(Dao._Q_UPDATE_COURSE.bind(c=cid, name=name, credit=credit, semester=semester,
+                                                        dept=dept_id))
+        Dao._invalidate("courses", f"course:{cid}")
+        if written:
+            Dao._reindex("course", cid, name)
 
     @staticmethod
     def delete_course(cid):
         """Xóa môn học"""
-        # Xóa tất cả bộ ba có chủ ngữ là môn học này
-        query = f"DELETE WHERE {{ uni:course_{cid} ?p ?o . }}"
-        Dao._update(query)
\ No newline at end of file
+        try:
+            # Xóa tất cả bộ ba có chủ ngữ là môn học này
+            query = Dao._Q_DELETE_COURSE.bind(c=cid)
+        except ValueError:
+            return
+        written = Dao._update(query)
+        Dao._invalidate("courses", f"course:{cid}")
+        if written:
+            stats_counters.add("types", "Course", -1)
+            Dao._reindex("course", cid)
@@ -0,0 +1,300 @@
+import glob
+import json
+import os
+import threading
+import time
+
+
+class _Ticket:
+    __slots__ = ("seq", "op", "done", "result", "attempts")
+
+    def __init__(self, seq, op, waiting=True):
+        self.seq = seq
+        self.op = op              # {"op": "enroll"|"unenroll", "sid": ..., "class_id": ...}
+        self.done = threading.Event() if waiting else None   # None: không có người chờ (chạy lại)
+        self.result = None
+        self.attempts = 0         # số lần ghi batch chứa yêu cầu này bị lỗi
+
+
+class EnrollmentQueue:
+    """
+    Hàng đợi gom các yêu cầu Đăng ký / Hủy đăng ký lớp trong một khoảng ngắn
+    (`interval` giây hoặc tối đa `max_batch` yêu cầu) rồi ghi vào GraphDB bằng
+    1 batch duy nhất qua `apply_batch(ops) -> [{"ok": bool, "message": str}]`.
+
+    Mỗi yêu cầu được ghi vào file journal (fsync) trước khi xếp hàng; batch xong thì
+    ghi bản ghi "done". Nếu process chết giữa chừng, lần khởi động sau sẽ chạy lại
+    các yêu cầu chưa "done" (đăng ký/hủy là thao tác idempotent).
+    Batch ghi lỗi thì các yêu cầu được giữ lại và thử lại sau (chờ tăng dần 1, 2, 4, ...
+    tối đa `retry_delay_max` giây); quá `max_attempts` lần thì chuyển sang file dead-letter
+    (<journal>-dead.jsonl) để xử lý tay và không chạy lại nữa.
+    """
+
+    def __init__(self):
+        self.running = False
+        self._apply_batch = None
+        self.interval = 0.05
+        self.max_batch = 500
+        self.ack_timeout = 10.0
+        self.max_attempts = 8
+        self.retry_delay_max = 60.0
+        self.journal_path = None
+        self._journal = None
+        self._pending = []
+        self._in_flight = 0
+        self._seq = 0
+        self._failures = 0        # số batch lỗi liên tiếp (tính thời gian chờ trước lần thử lại)
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self, apply_batch, interval=0.05, max_batch=500, ack_timeout=10.0, journal_path=None, adopt=(),
+              max_attempts=8, retry_delay_max=60.0):
+        """
+        `adopt`: journal của process khác đã thoát (xem claim_orphan_journals), các yêu cầu
+        chưa hoàn tất trong đó được chuyển sang journal này và chạy lại cùng.
+        """
+        self._apply_batch = apply_batch
+        self.interval = interval
+        self.max_batch = max_batch
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay_max = retry_delay_max
+        self.journal_path = journal_path
+        replay = []
+        if journal_path:
+            ops = self.read_unfinished(journal_path)
+            for path in adopt:
+                ops.extend(self.read_unfinished(path))
+            os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+            # Viết lại journal chỉ gồm các yêu cầu còn dở, đánh số lại để seq mới không trùng seq cũ
+            tmp = f"{journal_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for op in ops:
+                    self._seq += 1
+                    f.write(json.dumps({"seq": self._seq, **op}, ensure_ascii=False) + "\n")
+                    # Yêu cầu chạy lại không có người chờ
+                    replay.append(_Ticket(self._seq, op, waiting=False))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, journal_path)
+            for path in adopt:
+                os.remove(path)
+            self._journal = open(journal_path, "a", encoding="utf-8")
+            if replay:
+                print(f"Enrollment journal: chạy lại {len(replay)} yêu cầu chưa hoàn tất")
+        with self._cond:
+            self._pending.extend(replay)
+            self.running = True
+        self._thread = threading.Thread(target=self._run, name="enrollment-queue", daemon=True)
+        self._thread.start()
+
+    def drain(self, timeout):
+        """Chờ các yêu cầu đang xếp hàng được ghi xong (khi worker tắt). True nếu hàng đợi đã rỗng"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.05))
+        return True
+
+    @staticmethod
+    def read_unfinished(journal_path):
+        """Đọc journal, trả về các yêu cầu chưa được ghi nhận "done" (theo thứ tự)"""
+        if not os.path.exists(journal_path):
+            return []
+        requests, done = {}, set()
+        with open(journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # dòng ghi dở khi process chết
+                if "done" in rec:
+                    done.update(rec["done"])
+                elif "seq" in rec:
+                    requests[rec["seq"]] = {k: rec[k] for k in ("op", "sid", "class_id")}
+        return [op for seq, op in sorted(requests.items()) if seq not in done]
+
+    def submit(self, op, sid, class_id):
+        """
+        Xếp hàng 1 yêu cầu và chờ batch chứa nó được ghi xong.
+        Trả về {"ok": bool, "message": str}; hết thời gian chờ thì ok=None (vẫn đang xử lý).
+        """
+        item = {"op": op, "sid": sid, "class_id": class_id}
+        with self._cond:
+            self._seq += 1
+            ticket = _Ticket(self._seq, item)
+            self._write_journal({"seq": ticket.seq, **item})
+            self._pending.append(ticket)
+            self._cond.notify()
+        # fsync ngoài khóa: các yêu cầu đến cùng lúc chờ chung 1 lần ghi đĩa thay vì xếp hàng sau khóa
+        self._sync_journal()
+        if not ticket.done.wait(self.ack_timeout):
+            return {"ok": None, "message": "Yêu cầu đang được xử lý, vui lòng tải lại trang sau ít giây."}
+        return ticket.result
+
+    def _write_journal(self, record):
+        """Ghi 1 bản ghi vào journal (gọi khi giữ self._cond); nơi gọi fsync bằng _sync_journal"""
+        if self._journal is None:
+            return
+        try:
+            self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal.flush()
+        except OSError as e:
+            print(f"Lỗi ghi enrollment journal: {e}")
+
+    def _sync_journal(self):
+        journal = self._journal
+        if journal is None:
+            return
+        try:
+            os.fsync(journal.fileno())
+        except (OSError, ValueError) as e:
+            print(f"Lỗi ghi enrollment journal: {e}")
+
+    def _dead_letter(self, tickets, error):
+        """Ghi các yêu cầu đã thử quá max_attempts lần vào <journal>-dead.jsonl (không chạy lại nữa)"""
+        print(f"Enrollment queue: bỏ {len(tickets)} yêu cầu sau {self.max_attempts} lần ghi lỗi: {error}")
+        if not self.journal_path:
+            return
+        root, ext = os.path.splitext(self.journal_path)
+        lines = "".join(json.dumps({**t.op, "attempts": t.attempts, "error": str(error), "at": time.time()},
+                                   ensure_ascii=False) + "\n" for t in tickets)
+        try:
+            with open(f"{root}-dead{ext}", "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"Lỗi ghi dead-letter đăng ký học phần: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Chờ thêm 1 khoảng ngắn để gom các yêu cầu đến gần nhau
+            deadline = time.monotonic() + self.interval
+            with self._cond:
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self._in_flight = len(batch)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            results = self._apply_batch([t.op for t in batch])
+        except Exception as e:
+            print(f"Lỗi ghi batch đăng ký học phần: {e}")
+            self._retry(batch, e)
+            return
+
+        self._failures = 0
+        with self._cond:
+            self._write_journal({"done": [t.seq for t in batch]})
+            self._in_flight = 0
+            if not self._pending:
+                self._compact_journal()
+        self._sync_journal()
+        for t, result in zip(batch, results):
+            if t.done is not None:
+                t.result = result
+                t.done.set()
+
+    def _retry(self, batch, error):
+        """
+        Batch ghi lỗi: người đang chờ được báo "đang xử lý" (yêu cầu vẫn nằm trong journal, chưa
+        "done"), các yêu cầu được xếp lại đầu hàng đợi và thử lại sau 1 khoảng chờ tăng dần.
+        Yêu cầu đã lỗi max_attempts lần thì chuyển sang dead-letter.
+        """
+        for t in batch:
+            t.attempts += 1
+            if t.done is not None and not t.done.is_set():
+                t.result = {"ok": None, "message": "Yêu cầu đang được xử lý, vui lòng tải lại trang sau ít giây."}
+                t.done.set()
+        dead = [t for t in batch if t.attempts >= self.max_attempts]
+        retry = [t for t in batch if t.attempts < self.max_attempts]
+        if dead:
+            self._dead_letter(dead, error)
+        with self._cond:
+            if dead:
+                self._write_journal({"done": [t.seq for t in dead]})
+            self._in_flight = 0
+            self._pending[:0] = retry
+        self._sync_journal()
+        self._failures += 1
+        if retry:
+            time.sleep(min(2.0 ** (self._failures - 1), self.retry_delay_max))
+
+    def _compact_journal(self):
+        """Hàng đợi rỗng -> mọi yêu cầu đã xong, xóa trắng journal cho gọn"""
+        if self._journal is None:
+            return
+        try:
+            self._journal.truncate(0)
+            self._journal.seek(0)
+        except OSError as e:
+            print(f"Lỗi dọn enrollment journal: {e}")
+
+
+# --- Journal riêng cho từng worker process (serve.py) ---
+# Mỗi worker ghi vào <journal>.<pid>.jsonl. Khi worker thoát, process master đổi tên file thành
+# "...jsonl.orphan"; worker khởi động sau nhận file đó (đổi tên thêm ".<pid của mình>") rồi chạy lại.
+
+def worker_journal_path(base, pid):
+    """enrollment_journal.jsonl -> enrollment_journal.<pid>.jsonl"""
+    root, ext = os.path.splitext(base)
+    return f"{root}.{pid}{ext}"
+
+
+def _mark_orphan(path, orphan):
+    """Đổi tên `path` thành `orphan` (thêm số nếu tên đã có) để không ghi đè journal mồ côi khác"""
+    target, n = orphan, 1
+    while os.path.exists(target):
+        target = f"{orphan[:-len('.orphan')]}.{n}.orphan"
+        n += 1
+    os.replace(path, target)
+
+
+def release_journals(base, pid=None):
+    """
+    (process master) Đánh dấu journal của worker `pid` vừa thoát là mồ côi. pid=None: lúc khởi động,
+    mọi journal còn lại từ lần chạy trước (kể cả journal chung của run.py) đều là mồ côi.
+    """
+    root, ext = os.path.splitext(base)
+    if pid is None:
+        paths = [base] + glob.glob(f"{glob.escape(root)}.*{ext}")
+        claimed = glob.glob(f"{glob.escape(root)}*.orphan.*")
+    else:
+        paths = [worker_journal_path(base, pid)]
+        claimed = glob.glob(f"{glob.escape(root)}*.orphan.{pid}")
+    for path in paths:
+        if os.path.exists(path):
+            _mark_orphan(path, f"{path}.orphan")
+    # File đã được worker khác nhận nhưng worker đó thoát trước khi chạy lại xong
+    for path in claimed:
+        _mark_orphan(path, path.rsplit(".", 1)[0])
+
+
+def claim_orphan_journals(base, pid):
+    """(worker) Nhận các journal mồ côi; đổi tên là nguyên tử nên mỗi file chỉ 1 worker nhận được"""
+    root, _ = os.path.splitext(base)
+    claimed = []
+    for path in sorted(glob.glob(f"{glob.escape(root)}*.orphan")):
+        try:
+            os.rename(path, f"{path}.{pid}")
+        except OSError:
+            continue
+        claimed.append(f"{path}.{pid}")
+    return claimed
+
+
+# Hàng đợi dùng chung (được start trong create_app nếu bật ENROLL_QUEUE_ENABLED)
+enrollment_queue = EnrollmentQueue()
@@ -0,0 +1,239 @@
+import atexit
+import os
+import threading
+import time
+
+from .sparql_client import SparqlBackend
+
+try:
+    import pyoxigraph
+except ImportError:
+    pyoxigraph = None
+
+try:
+    import rdflib
+except ImportError:
+    rdflib = None
+
+XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+RDF_LANG_STRING = "http://www.w3.org/1999/02/22-rdf-syntax-ns#langString"
+
+
+def _binding(kind, value, datatype=None, lang=None):
+    """1 giá trị theo đúng dạng SPARQL JSON mà GraphDB trả về"""
+    term = {"type": kind, "value": value}
+    if lang:
+        term["xml:lang"] = lang
+    elif datatype and datatype not in (XSD_STRING, RDF_LANG_STRING):
+        term["datatype"] = datatype
+    return term
+
+
+class _OxigraphEngine:
+    """pyoxigraph.Store: an toàn đa luồng (MVCC), lưu xuống thư mục RocksDB nếu có `path`"""
+
+    def __init__(self, path):
+        self.store = pyoxigraph.Store(path) if path else pyoxigraph.Store()
+
+    @staticmethod
+    def _term(term):
+        if isinstance(term, pyoxigraph.NamedNode):
+            return _binding("uri", term.value)
+        if isinstance(term, pyoxigraph.BlankNode):
+            return _binding("bnode", term.value)
+        return _binding("literal", term.value, term.datatype.value, term.language)
+
+    def select(self, query_str):
+        result = self.store.query(query_str)
+        names = [v.value for v in result.variables]
+        return names, ([(name, self._term(sol[i])) for i, name in enumerate(names) if sol[i] is not None]
+                       for sol in result)
+
+    def construct(self, query_str, turtle):
+        fmt = pyoxigraph.RdfFormat.TURTLE if turtle else pyoxigraph.RdfFormat.N_TRIPLES
+        return pyoxigraph.serialize(self.store.query(query_str), format=fmt)
+
+    def update(self, update_str):
+        self.store.update(update_str)
+
+    def load(self, data, fmt):
+        fmt = pyoxigraph.RdfFormat.TURTLE if fmt == "ttl" else pyoxigraph.RdfFormat.N_TRIPLES
+        self.store.load(data, format=fmt)
+
+    def __len__(self):
+        return len(self.store)
+
+    def close(self):
+        # Bỏ tham chiếu để RocksDB nhả khóa thư mục (cho phép mở lại cùng path)
+        self.store.flush()
+        self.store = None
+
+
+class _RdflibEngine:
+    """
+    rdflib.Graph trong bộ nhớ (dự phòng khi không có pyoxigraph). Không an toàn đa luồng
+    nên mọi lời gọi đi qua 1 khóa; nếu có `path` thì nạp từ file N-Triples khi khởi động
+    và ghi đè file (qua file tạm) sau lệnh update: gom các thay đổi trong `save_delay` giây
+    rồi ghi 1 lần (ghi cả đồ thị tốn O(N), không làm sau từng lệnh), và ghi nốt khi đóng /
+    thoát process.
+    """
+
+    def __init__(self, path, save_delay=2.0):
+        self.graph = rdflib.Graph()
+        self.path = path
+        self.save_delay = save_delay
+        self.lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        if path and os.path.exists(path):
+            self.graph.parse(path, format="nt")
+        if path:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def _term(term):
+        if isinstance(term, rdflib.URIRef):
+            return _binding("uri", str(term))
+        if isinstance(term, rdflib.BNode):
+            return _binding("bnode", str(term))
+        return _binding("literal", str(term), str(term.datatype) if term.datatype else None, term.language)
+
+    def select(self, query_str):
+        with self.lock:
+            result = self.graph.query(query_str)
+            names = [str(v) for v in result.vars]
+            rows = [[(name, self._term(row[i])) for i, name in enumerate(names) if row[i] is not None]
+                    for row in result]
+        return names, rows
+
+    def construct(self, query_str, turtle):
+        with self.lock:
+            return self.graph.query(query_str).graph.serialize(
+                format="turtle" if turtle else "nt", encoding="utf-8")
+
+    def update(self, update_str):
+        with self.lock:
+            self.graph.update(update_str)
+            self._changed()
+
+    def load(self, data, fmt):
+        with self.lock:
+            self.graph.parse(data=data, format="turtle" if fmt == "ttl" else "nt")
+            self._changed()
+
+    def _changed(self):
+        """Đánh dấu có thay đổi chưa ghi và hẹn giờ ghi (gọi khi đang giữ khóa)"""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Ghi đồ thị ra file nếu còn thay đổi chưa ghi"""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                self._save()
+                self._dirty = False
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        self.graph.serialize(tmp, format="nt", encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self.graph)
+
+    def close(self):
+        self.flush()
+
+
+class LocalStore(SparqlBackend):
+    """
+    RDF store nhúng trong process, thay cho GraphDB khi triển khai nhỏ 1 máy hoặc khi chạy thử:
+    không qua HTTP, không serialize/parse JSON kết quả.
+    - engine "oxigraph" (pip install pyoxigraph), "rdflib", hoặc "auto" (oxigraph nếu có)
+    - path: thư mục dữ liệu (oxigraph) / file .nt (rdflib); None = chỉ trong bộ nhớ
+    """
+
+    def __init__(self, path=None, engine="auto"):
+        if engine == "auto":
+            engine = "oxigraph" if pyoxigraph is not None else "rdflib"
+        if engine == "oxigraph":
+            if pyoxigraph is None:
+                raise RuntimeError("SPARQL_BACKEND=local với engine oxigraph cần: pip install pyoxigraph")
+            self._engine = _OxigraphEngine(path)
+        elif engine == "rdflib":
+            if rdflib is None:
+                raise RuntimeError("SPARQL_BACKEND=local với engine rdflib cần: pip install rdflib")
+            self._engine = _RdflibEngine(path)
+        else:
+            raise ValueError(f"Engine không hợp lệ: {engine}")
+        self.engine = engine
+        self.path = path
+        self.endpoint = f"local:{engine}:{path or 'memory'}"
+        self.observer = None
+
+    def select(self, query_str, name=None):
+        started = time.perf_counter() if self.observer else None
+        bindings = []
+        error = True
+        try:
+            _, rows = self._engine.select(query_str)
+            bindings = [dict(row) for row in rows]
+            error = False
+            return bindings
+        finally:
+            self._observe("select", query_str, started, len(bindings), 0, error, name)
+
+    def select_rows(self, query_str, name=None):
+        started = time.perf_counter() if self.observer else None
+        rows = 0
+        error = True
+        try:
+            names, result = self._engine.select(query_str)
+            for row in result:
+                values = dict.fromkeys(names, "")
+                values.update((name, term["value"]) for name, term in row)
+                rows += 1
+                yield values
+            error = False
+        finally:
+            self._observe("select_rows", query_str, started, rows, 0, error, name)
+
+    def construct_chunks(self, query_str, accept="application/n-triples", chunk_size=64 * 1024, name=None):
+        started = time.perf_counter() if self.observer else None
+        nbytes = 0
+        error = True
+        try:
+            data = self._engine.construct(query_str, turtle="turtle" in accept)
+            for i in range(0, len(data), chunk_size):
+                chunk = data[i:i + chunk_size]
+                nbytes += len(chunk)
+                yield chunk
+            error = False
+        finally:
+            self._observe("construct", query_str, started, 0, nbytes, error, name)
+
+    def update(self, update_str, name=None):
+        started = time.perf_counter() if self.observer else None
+        error = True
+        try:
+            self._engine.update(update_str)
+            error = False
+        finally:
+            self._observe("update", update_str, started, 0, len(update_str), error, name)
+
+    def load(self, data, fmt="nt"):
+        """Nạp dữ liệu RDF (N-Triples hoặc Turtle, vd. file export .nt/.ttl), trả về tổng số triple"""
+        self._engine.load(data, fmt)
+        return len(self._engine)
+
+    def close(self):
+        self._engine.close()
@@ -0,0 +1,131 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Ngưỡng histogram thời gian truy vấn (giây)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Các hàm hạ tầng trong dao.py, bỏ qua khi tìm hàm Dao đã gọi truy vấn
+_INFRA_FUNCS = {"_query", "_update", "_query_many", "gather", "wrapper", "_run_fanout_call",
+                "_iter_export", "_buffered", "<genexpr>", "<listcomp>", "<lambda>"}
+_DAO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dao.py")
+
+
+class _Series:
+    __slots__ = ("buckets", "count", "total", "rows", "bytes", "errors", "slow")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.errors = 0
+        self.slow = 0
+
+
+class Metrics:
+    """
+    Đo thời gian mọi lời gọi SPARQL, gắn nhãn theo hàm Dao đã gọi (vd. get_all_students),
+    loại lời gọi (select, select_rows, construct, update) và tên template truy vấn
+    (app/queries.py): histogram thời gian,
+    số dòng, số bytes, số lỗi. Lời gọi chậm hơn `slow_threshold` được in ra kèm câu truy vấn
+    và giữ lại vài mục gần nhất. Khi chưa enable thì SparqlClient không gọi vào đây.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_threshold = 1.0
+        self._lock = threading.Lock()
+        self._series = {}          # (method, op, tên truy vấn) -> _Series
+        self._slow = deque(maxlen=50)
+        self._local = threading.local()
+
+    def enable(self, slow_threshold=1.0):
+        self.slow_threshold = slow_threshold
+        self.enabled = True
+
+    # --- Nhãn hàm Dao ---
+    def caller(self):
+        """Tên hàm Dao đang chạy truy vấn (hoặc nhãn được truyền sang thread fan-out)"""
+        label = getattr(self._local, "label", None)
+        if label:
+            return label
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == _DAO_FILE and code.co_name not in _INFRA_FUNCS:
+                return code.co_name
+            frame = frame.f_back
+        return "other"
+
+    def set_label(self, label):
+        """Gán nhãn cho thread hiện tại (None để bỏ), dùng khi chạy hộ trong pool"""
+        self._local.label = label
+
+    # --- Ghi nhận ---
+    def observe(self, op, query, seconds, rows=0, nbytes=0, error=False, name=None):
+        method = self.caller()
+        name = name or ""
+        with self._lock:
+            series = self._series.get((method, op, name))
+            if series is None:
+                series = self._series[(method, op, name)] = _Series()
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series.buckets[i] += 1
+            series.count += 1
+            series.total += seconds
+            series.rows += rows
+            series.bytes += nbytes
+            series.errors += bool(error)
+            slow = seconds >= self.slow_threshold
+            if slow:
+                series.slow += 1
+                self._slow.append({"method": method, "op": op, "name": name, "seconds": round(seconds, 3),
+                                   "at": time.time(), "query": " ".join(query.split())[:4000]})
+        if slow:
+            print(f"[SLOW SPARQL] {method} {op} {name} {seconds:.3f}s: {' '.join(query.split())[:500]}")
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self._slow)
+
+    # --- Xuất dạng Prometheus text ---
+    def render(self, extra_gauges=None):
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items())
+
+        def emit(name, kind, help_text, rows):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(rows)
+
+        def labels(method, op, name, extra=""):
+            return f'method="{method}",op="{op}",query="{name}"{extra}'
+
+        hist = []
+        bounds = [f',le="{b}"' for b in BUCKETS] + [',le="+Inf"']
+        for (method, op, name), s in items:
+            for le, n in zip(bounds, s.buckets + [s.count]):
+                hist.append(f"sparql_query_duration_seconds_bucket{{{labels(method, op, name, le)}}} {n}")
+            hist.append(f"sparql_query_duration_seconds_sum{{{labels(method, op, name)}}} {s.total:.6f}")
+            hist.append(f"sparql_query_duration_seconds_count{{{labels(method, op, name)}}} {s.count}")
+        emit("sparql_query_duration_seconds", "histogram", "Thời gian lời gọi SPARQL theo hàm Dao", hist)
+        for name, attr, help_text in (
+                ("sparql_query_rows_total", "rows", "Số dòng kết quả SPARQL"),
+                ("sparql_query_bytes_total", "bytes", "Số bytes kết quả (hoặc lệnh update) SPARQL"),
+                ("sparql_query_errors_total", "errors", "Số lời gọi SPARQL lỗi"),
+                ("sparql_slow_queries_total", "slow", "Số lời gọi SPARQL vượt ngưỡng chậm")):
+            emit(name, "counter", help_text,
+                 [f"{name}{{{labels(method, op, query)}}} {getattr(s, attr)}" for (method, op, query), s in items])
+        for name, (help_text, value) in (extra_gauges or {}).items():
+            emit(name, "gauge", help_text, [f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+
+# Dùng chung cho toàn ứng dụng (bật trong create_app nếu METRICS_ENABLED)
+metrics = Metrics()
@@ -0,0 +1,266 @@
+import re
+from urllib.parse import unquote
+
+# Namespace dùng chung cho dự án
+PREFIXES = """
+    PREFIX uni: <http://example.org/university/>
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+"""
+
+UNI = "http://example.org/university/"
+
+
+def _lit(value):
+    """Chuyển giá trị Python thành literal SPARQL (đã escape dấu nháy, xuống dòng)"""
+    text = "" if value is None else str(value)
+    text = (text.replace('\\', '\\\\').replace('"', '\\"')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+    return f'"{text}"'
+
+
+_ESCAPED = re.compile(r"%[0-9A-Fa-f]{2}")
+
+
+def _local_char(ch):
+    """Ký tự được giữ nguyên trong tên uni:xxx_{id}: chữ / số (ASCII hoặc từ U+00C0, vd. chữ có dấu), '_', '-'"""
+    return ch in "_-" or ch.isalnum() and (ch.isascii() or ord(ch) >= 0xC0)
+
+
+def _local(value):
+    """
+    Chuẩn hóa mã (ID) để ghép vào tên uni:xxx_{id}: khoảng trắng -> '_', các ký tự khác (vd. '.',
+    '/', '#', '-' ở đầu) được percent-encode theo UTF-8 ('SV.01' -> 'SV%2E01') nên mã nào cũng dùng
+    được mà không chèn được gì vào câu truy vấn. Đoạn %XX có sẵn được giữ nguyên: mã lấy lại từ
+    IRI (đã encode) ghép lại vẫn ra đúng IRI đó. Chỉ báo lỗi nếu mã rỗng.
+    """
+    local = str(value).strip().replace(" ", "_")
+    if not local:
+        raise ValueError(f"Mã không hợp lệ: {value!r}")
+    out, i = [], 0
+    while i < len(local):
+        if _ESCAPED.match(local, i):
+            out.append(local[i:i + 3])
+            i += 3
+            continue
+        ch = local[i]
+        if _local_char(ch) and not (i == 0 and ch == "-"):
+            out.append(ch)
+        else:
+            out.append("".join(f"%{b:02X}" for b in ch.encode("utf-8")))
+        i += 1
+    return "".join(out)
+
+
+def _unlocal(local):
+    """Ngược lại của _local để hiển thị: 'SV%2E01' -> 'SV.01'"""
+    return unquote(local)
+
+
+# --- Kiểu tham số: chuyển giá trị Python thành đoạn SPARQL an toàn ---
+class Lit:
+    """Literal chuỗi đã escape"""
+    sample = "x"
+
+    def __call__(self, value):
+        return _lit(value)
+
+
+class Int:
+    sample = 1
+
+    def __call__(self, value):
+        if isinstance(value, bool):
+            raise ValueError(f"Không phải số nguyên: {value!r}")
+        return str(int(value))
+
+
+class Bool:
+    sample = True
+
+    def __call__(self, value):
+        return "true" if value else "false"
+
+
+class Node:
+    """Node của trường theo mã: Node("student_")("SV001") -> uni:student_SV001"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.sample = "X1"
+
+    def __call__(self, value):
+        return f"uni:{self.prefix}{_local(value)}"
+
+
+class Iri:
+    """IRI đầy đủ trong namespace uni: (vd. lấy từ kết quả truy vấn trước)"""
+    sample = UNI + "x"
+    _FORBIDDEN = set('<>"{}|^`\\ \t\n\r')
+
+    def __call__(self, value):
+        value = str(value)
+        if not value.startswith(UNI) or self._FORBIDDEN & set(value):
+            raise ValueError(f"IRI không hợp lệ: {value!r}")
+        return f"<{value}>"
+
+
+class Choice:
+    """1 trong các đoạn cố định (từ khóa, tên biến, toán tử): Choice("ASC", "DESC")"""
+
+    def __init__(self, *options):
+        self.options = options
+        self.sample = options[0]
+
+    def __call__(self, value):
+        if value not in self.options:
+            raise ValueError(f"Giá trị không hợp lệ: {value!r}")
+        return value
+
+
+class Values:
+    """
+    Danh sách cho khối VALUES: Values(Lit()) -> '"a" "b"',
+    Values(Lit(), Node("class_")) nhận các tuple -> '("a" uni:class_a) ...'
+    """
+
+    def __init__(self, *columns):
+        self.columns = columns
+        self.sample = [tuple(c.sample for c in columns) if len(columns) > 1 else columns[0].sample]
+
+    def __call__(self, items):
+        if len(self.columns) == 1:
+            return " ".join(self.columns[0](v) for v in items)
+        rows = []
+        for row in items:
+            if len(row) != len(self.columns):
+                raise ValueError(f"Cần {len(self.columns)} giá trị mỗi dòng: {row!r}")
+            rows.append("(" + " ".join(c(v) for c, v in zip(self.columns, row)) + ")")
+        return " ".join(rows)
+
+
+class Fragments:
+    """Danh sách đoạn triple đã bind từ các template loại "fragment" (không nhận chuỗi tự do)"""
+    sample = []
+
+    def __call__(self, items):
+        parts = []
+        for item in items:
+            if not isinstance(item, Bound) or item.kind != "fragment":
+                raise TypeError(f"Cần fragment đã bind, nhận được {type(item).__name__}")
+            parts.append(item.text)
+        return "\n".join(parts)
+
+
+class Bound:
+    """Câu truy vấn đã bind đủ tham số, sẵn sàng gửi đi (đã có PREFIXES nếu cần)"""
+    __slots__ = ("name", "kind", "text")
+
+    def __init__(self, name, kind, text):
+        self.name = name
+        self.kind = kind
+        self.text = text
+
+    def __repr__(self):
+        return f"<Bound {self.name}>"
+
+
+_PARAM = re.compile(r"\$([A-Za-z_]\w*)")
+
+
+class QueryTemplate:
+    """
+    Câu SPARQL có tên với tham số `$ten`, được tách sẵn thành các đoạn cố định
+    khi đăng ký; bind() chỉ còn ghép chuỗi. kind: "query", "update" hoặc "fragment"
+    (đoạn triple để ghép vào INSERT DATA, không có PREFIXES).
+    """
+
+    def __init__(self, name, text, kind, params):
+        if kind not in ("query", "update", "fragment"):
+            raise ValueError(f"[{name}] kind không hợp lệ: {kind}")
+        # Bỏ thụt lề để câu gửi đi gọn và ổn định (giữ xuống dòng vì có chú thích '#')
+        text = "\n".join(line.strip() for line in text.strip().splitlines() if line.strip())
+        used = set(_PARAM.findall(text))
+        if used != set(params):
+            raise ValueError(f"[{name}] tham số không khớp: thiếu khai báo {sorted(used - set(params))}, "
+                             f"không dùng {sorted(set(params) - used)}")
+        if text.count("{") != text.count("}"):
+            raise ValueError(f"[{name}] dấu ngoặc nhọn không cân")
+        self.name = name
+        self.kind = kind
+        self.params = params
+        self.text = text
+        parts = _PARAM.split(text)
+        if kind != "fragment":
+            parts[0] = PREFIXES + parts[0]
+        self._parts = parts
+
+    def bind(self, **values):
+        if values.keys() != self.params.keys():
+            raise TypeError(f"[{self.name}] cần tham số {sorted(self.params)}, nhận {sorted(values)}")
+        parts = list(self._parts)
+        for i in range(1, len(parts), 2):
+            parts[i] = self.params[parts[i]](values[parts[i]])
+        return Bound(self.name, self.kind, "".join(parts))
+
+    def sample(self):
+        return self.bind(**{k: binder.sample for k, binder in self.params.items()})
+
+
+class QueryRegistry:
+    def __init__(self):
+        self._templates = {}
+
+    def register(self, name, text, /, kind="query", **params):
+        if name in self._templates:
+            raise ValueError(f"Trùng tên truy vấn: {name}")
+        template = QueryTemplate(name, text, kind, params)
+        self._templates[name] = template
+        return template
+
+    def __getitem__(self, name):
+        return self._templates[name]
+
+    def __len__(self):
+        return len(self._templates)
+
+    @staticmethod
+    def join(*bounds, name=None):
+        """Gộp nhiều lệnh update đã bind thành 1 request (1 transaction), PREFIXES chỉ 1 lần"""
+        if not bounds or any(b.kind != "update" for b in bounds):
+            raise ValueError("join chỉ nhận các lệnh update đã bind")
+        bodies = [b.text[len(PREFIXES):] for b in bounds]
+        return Bound(name or "+".join(dict.fromkeys(b.name for b in bounds)), "update",
+                     PREFIXES + " ;\n".join(bodies))
+
+    def validate(self):
+        """
+        Parse thử mọi template (với giá trị mẫu) bằng parser SPARQL của rdflib nếu có,
+        gọi 1 lần lúc khởi động. Trả về số template đã kiểm tra; lỗi thì ném ValueError.
+        """
+        try:
+            from rdflib.plugins.sparql.parser import parseQuery, parseUpdate
+        except ImportError:
+            parseQuery = parseUpdate = None
+        errors = []
+        for name, template in self._templates.items():
+            try:
+                bound = template.sample()
+                if parseQuery is None:
+                    continue
+                if bound.kind == "query":
+                    parseQuery(bound.text)
+                elif bound.kind == "update":
+                    parseUpdate(bound.text)
+                else:
+                    parseUpdate(PREFIXES + "INSERT DATA {\n" + bound.text + "\n}")
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+        if errors:
+            raise ValueError("Truy vấn SPARQL không hợp lệ:\n" + "\n".join(errors))
+        return len(self._templates)
+
+
+# Toàn bộ câu truy vấn của Dao được đăng ký ở đây khi import dao.py
+queries = QueryRegistry()
@@ -1,10 +1,61 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, send_file, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, make_response, current_app, Response
 from .dao import Dao
+from .auth import login_throttle
+from .metrics import metrics
+from .analytics import cohort_analytics
+import functools
+import gzip
+import hashlib
 import json
-import io
+import os
 
 main_bp = Blueprint('main', __name__)
 
+# Các loại dữ liệu mà trang thống kê / đồ thị / file export phụ thuộc
+STATS_TAGS = ("students", "teachers", "courses", "classes", "enrollments", "grades", "departments", "semesters",
+              "stats")
+GRAPH_TAGS = ("students", "teachers", "courses", "classes", "enrollments", "departments", "semesters")
+EXPORT_TAGS = GRAPH_TAGS + ("grades",)
+
+def _etag(*tags):
+    """
+    Conditional GET cho trang đọc: ETag tính từ phiên bản dữ liệu của `tags`
+    (tăng mỗi khi Dao ghi), nếu trình duyệt gửi lại đúng ETag thì trả 304 mà
+    không chạy view / truy vấn GraphDB. Bỏ qua khi còn thông báo flash chưa hiển thị.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            key = (f"{Dao.data_version(*tags)}|{session.get('role')}|{session.get('user')}|"
+                   f"{request.full_path}|{request.headers.get('Accept-Encoding', '')}")
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+@main_bp.before_app_request
+def _apply_shared_changes():
+    """Nhận các thay đổi do worker khác ghi (1 lần os.stat) trước khi đọc cache / tính ETag"""
+    Dao._apply_shared_changes()
+
+@main_bp.errorhandler(ValueError)
+def _invalid_input(e):
+    """Dữ liệu / mã không hợp lệ lọt ra khỏi view: báo lỗi thay vì trả về 500"""
+    if request.path.startswith('/api/'):
+        return jsonify({"error": str(e)}), 400
+    flash(str(e))
+    return redirect(request.referrer or url_for('main.index'))
+
 # ==========================================
 # 1. AUTHENTICATION (ĐĂNG NHẬP/ĐĂNG XUẤT)
 # ==========================================
@@ -22,12 +73,19 @@ def login():
     username = request.form['username']
     password = request.form['password']
     role = request.form['role']
-    
+
+    throttle_key = (role, username, request.remote_addr)
+    if login_throttle.blocked(throttle_key):
+        flash("Đăng nhập sai quá nhiều lần, vui lòng thử lại sau ít phút!")
+        return redirect(url_for('main.index'))
+
     if Dao.verify_user(username, password, role):
+        login_throttle.succeeded(throttle_key)
         session['user'] = username
         session['role'] = role
         return redirect(url_for('main.index'))
     else:
+        login_throttle.failed(throttle_key)
         flash("Sai tên đăng nhập hoặc mật khẩu!")
         return redirect(url_for('main.index'))
 
@@ -43,34 +101,31 @@ def logout():
 def student_dashboard():
     if session.get('role') != 'student': return redirect('/')
     
-    sid = session['user']
-    info = Dao.get_student_info(sid)
-    my_classes = Dao.get_student_enrolled_classes(sid)
-    stats = Dao.get_credit_stats(sid)
-    
-    total_credit = sum(int(c['credit']) for c in my_classes) if my_classes else 0
-    
-    return render_template('student/dashboard.html', info=info, classes=my_classes, total_credit=total_credit, stats=stats)
+    # Hồ sơ, lớp đã đăng ký, tín chỉ theo khoa và tổng tín chỉ: 1 truy vấn duy nhất
+    data = Dao.get_student_dashboard(session['user'])
+    return render_template('student/dashboard.html', info=data['info'], classes=data['classes'],
+                           total_credit=data['total_credit'], stats=data['stats'])
 
 @main_bp.route('/student/register', methods=['GET'])
 def student_register_view():
     if session.get('role') != 'student': return redirect('/')
     sid = session['user']
-    available_classes = Dao.get_available_classes_for_registration(sid)
-    return render_template('student/register.html', classes=available_classes)
+    semester = current_app.config['ACTIVE_SEMESTER'] or Dao.get_active_semester()
+    available_classes = Dao.get_available_classes_for_registration(sid, semester)
+    return render_template('student/register.html', classes=available_classes, semester=semester)
 
 @main_bp.route('/student/enroll/<class_id>')
 def student_enroll(class_id):
     if session.get('role') != 'student': return redirect('/')
-    Dao.enroll_class(session['user'], class_id)
-    flash(f"Đăng ký thành công lớp {class_id}")
+    result = Dao.enroll_class(session['user'], class_id)
+    flash(result['message'])
     return redirect(url_for('main.student_register_view'))
 
 @main_bp.route('/student/unenroll/<class_id>')
 def student_unenroll(class_id):
     if session.get('role') != 'student': return redirect('/')
-    Dao.unenroll_class(session['user'], class_id)
-    flash(f"Đã hủy đăng ký lớp {class_id}")
+    result = Dao.unenroll_class(session['user'], class_id)
+    flash(result['message'])
     return redirect(url_for('main.student_dashboard'))
 
 @main_bp.route('/student/search', methods=['GET', 'POST'])
@@ -94,16 +149,27 @@ def student_classmates():
 # 3. ADMIN FUNCTIONS (QUẢN TRỊ VIÊN)
 # ==========================================
 
+def _page_args():
+    """Đọc tham số phân trang/sắp xếp: ?sort=id|name&dir=asc|desc&after=...&before=...&size=..."""
+    size = request.args.get('size', type=int) or current_app.config['ADMIN_PAGE_SIZE']
+    size = max(1, min(size, current_app.config['ADMIN_PAGE_SIZE_MAX']))
+    return (request.args.get('sort', 'id'), request.args.get('dir') == 'desc',
+            request.args.get('after') or None, request.args.get('before') or None, size)
+
 # --- Quản lý Giảng viên ---
 @main_bp.route('/admin/teachers', methods=['GET', 'POST'])
+@_etag("teachers", "departments")
 def admin_teachers():
     if session.get('role') != 'admin': return redirect('/')
     if request.method == 'POST':
-        Dao.add_teacher(request.form['id'], request.form['name'], request.form['phone'], 
-                        request.form['position'], request.form['dept'])
-        flash("Đã thêm giảng viên!")
-    teachers = Dao.get_all_teachers()
-    return render_template('admin/teachers.html', teachers=teachers, title="Quản lý Giảng viên")
+        try:
+            Dao.add_teacher(request.form['id'], request.form['name'], request.form['phone'], 
+                            request.form['position'], request.form['dept'])
+            flash("Đã thêm giảng viên!")
+        except ValueError as e:
+            flash(str(e))
+    page = Dao.get_teachers_page(*_page_args())
+    return render_template('admin/teachers.html', teachers=page['items'], page=page, title="Quản lý Giảng viên")
 
 @main_bp.route('/admin/teachers/delete/<tid>')
 def delete_teacher_route(tid):
@@ -112,15 +178,19 @@ def delete_teacher_route(tid):
 
 # --- Quản lý Sinh viên ---
 @main_bp.route('/admin/students', methods=['GET', 'POST'])
+@_etag("students", "departments")
 def admin_students():
     if session.get('role') != 'admin': return redirect('/')
     if request.method == 'POST':
-        Dao.add_student(request.form['id'], request.form['name'], request.form['phone'],
-                        request.form['class'], int(request.form['year']), request.form['dept'],
-                        request.form['password'])
-        flash(f"Đã thêm sinh viên (Pass: {request.form['password']})")
-    students = Dao.get_all_students()
-    return render_template('admin/students.html', students=students, title="Quản lý Sinh viên")
+        try:
+            Dao.add_student(request.form['id'], request.form['name'], request.form['phone'],
+                            request.form['class'], int(request.form['year']), request.form['dept'],
+                            request.form['password'])
+            flash(f"Đã thêm sinh viên (Pass: {request.form['password']})")
+        except ValueError as e:
+            flash(str(e))
+    page = Dao.get_students_page(*_page_args())
+    return render_template('admin/students.html', students=page['items'], page=page, title="Quản lý Sinh viên")
 
 @main_bp.route('/admin/students/delete/<sid>')
 def delete_student_route(sid):
@@ -129,14 +199,18 @@ def delete_student_route(sid):
 
 # --- Quản lý Môn học ---
 @main_bp.route('/admin/courses', methods=['GET', 'POST'])
+@_etag("courses", "departments")
 def admin_courses():
     if session.get('role') != 'admin': return redirect('/')
     if request.method == 'POST':
-        Dao.add_course(request.form['id'], request.form['name'], int(request.form['credit']), 
-                       request.form['sem'], request.form['dept'])
-        flash("Đã thêm môn học!")
-    courses = Dao.get_all_courses()
-    return render_template('admin/courses.html', courses=courses, title="Quản lý Môn học")
+        try:
+            Dao.add_course(request.form['id'], request.form['name'], int(request.form['credit']), 
+                           request.form['sem'], request.form['dept'])
+            flash("Đã thêm môn học!")
+        except ValueError as e:
+            flash(str(e))
+    page = Dao.get_courses_page(*_page_args())
+    return render_template('admin/courses.html', courses=page['items'], page=page, title="Quản lý Môn học")
 
 # --- Quản lý Lớp Học Phần ---
 @main_bp.route('/admin/classes', methods=['GET', 'POST'])
@@ -144,9 +218,17 @@ def admin_classes():
     if session.get('role') != 'admin': return redirect('/')
     if request.method == 'POST':
         class_id = f"{request.form['course']}_{request.form['sem']}_01"
-        Dao.create_section(class_id, request.form['room'], request.form['schedule'],
-                           request.form['course'], request.form['teacher'], request.form['sem'])
-        flash(f"Đã tạo lớp học phần: {class_id}")
+        capacity = request.form.get('capacity', '').strip()
+        if capacity and (not capacity.isdigit() or int(capacity) <= 0):
+            flash("Sĩ số tối đa phải là số nguyên dương!")
+        else:
+            try:
+                Dao.create_section(class_id, request.form['room'], request.form['schedule'],
+                                   request.form['course'], request.form['teacher'], request.form['sem'],
+                                   capacity=int(capacity) if capacity else None)
+                flash(f"Đã tạo lớp học phần: {class_id}")
+            except ValueError as e:
+                flash(str(e))
     data = Dao.get_data_for_section_form()
     return render_template('admin/classes.html', data=data, title="Tạo Lớp Học Phần")
 
@@ -161,9 +243,12 @@ def edit_teacher(tid):
         return redirect(url_for('main.admin_teachers'))
 
     if request.method == 'POST':
-        Dao.update_teacher(tid, request.form['name'], request.form['phone'], 
-                           request.form['position'], request.form['dept'])
-        flash(f"Đã cập nhật thông tin giảng viên {tid}!")
+        try:
+            Dao.update_teacher(tid, request.form['name'], request.form['phone'], 
+                               request.form['position'], request.form['dept'])
+            flash(f"Đã cập nhật thông tin giảng viên {tid}!")
+        except ValueError as e:
+            flash(str(e))
         return redirect(url_for('main.admin_teachers'))
     
     return render_template('admin/edit_teacher.html', t=teacher)
@@ -179,10 +264,14 @@ def edit_student(sid):
         return redirect(url_for('main.admin_students'))
 
     if request.method == 'POST':
-        Dao.update_student(sid, request.form['name'], request.form['phone'],
-                           request.form['class'], int(request.form['year']), 
-                           request.form['dept'], request.form['password'])
-        flash(f"Đã cập nhật thông tin sinh viên {sid}!")
+        try:
+            Dao.update_student(sid, request.form['name'], request.form['phone'],
+                               request.form['class'], int(request.form['year']), 
+                               request.form['dept'], request.form['password'],
+                               old_dept_id=student.get('deptId'))
+            flash(f"Đã cập nhật thông tin sinh viên {sid}!")
+        except ValueError as e:
+            flash(str(e))
         return redirect(url_for('main.admin_students'))
         
     return render_template('admin/edit_student.html', s=student)
@@ -198,9 +287,12 @@ def edit_course(cid):
         return redirect(url_for('main.admin_courses'))
 
     if request.method == 'POST':
-        Dao.update_course(cid, request.form['name'], int(request.form['credit']), 
-                          request.form['sem'], request.form['dept'])
-        flash(f"Đã cập nhật môn học {cid}!")
+        try:
+            Dao.update_course(cid, request.form['name'], int(request.form['credit']), 
+                              request.form['sem'], request.form['dept'])
+            flash(f"Đã cập nhật môn học {cid}!")
+        except ValueError as e:
+            flash(str(e))
         return redirect(url_for('main.admin_courses'))
         
     return render_template('admin/edit_course.html', c=course)
@@ -214,6 +306,16 @@ def delete_course_route(cid):
     return redirect(url_for('main.admin_courses'))
 
 # --- Quản lý Điểm (Grading) ---
+def _flash_grade_report(report):
+    if report["errors"]:
+        details = "; ".join(
+            (f"dòng {e['row']} ({e['student_id']}): " if e["row"] else "") + e["error"]
+            for e in report["errors"][:5])
+        more = f" (và {len(report['errors']) - 5} lỗi khác)" if len(report["errors"]) > 5 else ""
+        flash(f"❌ Chưa lưu bảng điểm, {len(report['errors'])} dòng lỗi: {details}{more}")
+    else:
+        flash(f"✅ Đã cập nhật điểm! ({report['updated']} sinh viên có điểm, {report['cleared']} xóa điểm)")
+
 @main_bp.route('/admin/grading', methods=['GET', 'POST'])
 def admin_grading():
     if session.get('role') != 'admin': return redirect('/')
@@ -223,10 +325,14 @@ def admin_grading():
     
     if request.method == 'POST':
         class_id = request.form.get('class_id')
-        student_id = request.form.get('student_id')
-        score = request.form.get('score')
-        Dao.update_grade(class_id, student_id, score)
-        flash("Đã cập nhật điểm!")
+        if 'student_id' in request.form:
+            rows = [(request.form['student_id'], request.form.get('score'))]
+        else:
+            # Form cả lớp: các ô score_<MSSV>; nút "Lưu" từng dòng gửi kèm only=<MSSV>
+            only = request.form.get('only')
+            rows = [(key[len('score_'):], value) for key, value in request.form.items()
+                    if key.startswith('score_') and (not only or key == 'score_' + only)]
+        _flash_grade_report(Dao.update_grades_bulk(class_id, rows))
         return redirect(url_for('main.admin_grading', class_id=class_id))
         
     if selected_class:
@@ -234,6 +340,23 @@ def admin_grading():
     
     return render_template('admin/grading.html', roster=roster, selected_class=selected_class)
 
+@main_bp.route('/admin/grading/upload', methods=['POST'])
+def admin_grading_upload():
+    """Nhập điểm cả lớp từ file CSV (MSSV, Điểm)"""
+    if session.get('role') != 'admin': return redirect('/')
+    class_id = request.form.get('class_id')
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        flash("Chưa chọn file!")
+    else:
+        try:
+            rows = Dao.parse_grade_csv(file.read().decode('utf-8-sig'))
+        except UnicodeDecodeError:
+            flash("❌ File CSV phải dùng mã hóa UTF-8")
+        else:
+            _flash_grade_report(Dao.update_grades_bulk(class_id, rows))
+    return redirect(url_for('main.admin_grading', class_id=class_id))
+
 # ==========================================
 # 4. HỖ TRỢ & HỆ THỐNG (VISUALIZATION, STATS, IO)
 # ==========================================
@@ -244,23 +367,75 @@ def admin_visualization():
     if session.get('role') != 'admin': return redirect('/')
     return render_template('admin/visualization.html', title="Trực quan hóa Đồ thị")
 
+def _json_response(data, status=200):
+    """JSON gọn (không khoảng trắng), nén gzip nếu trình duyệt hỗ trợ và đủ lớn"""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    response = make_response(body, status)
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if len(body) >= 1024 and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 @main_bp.route('/api/graph-data')
+@_etag(*GRAPH_TAGS)
 def api_graph_data():
     """API trả về JSON cho Javascript vẽ (Đây là route bị lỗi trước đó)"""
     if session.get('role') != 'admin': return jsonify({})
+    cfg = current_app.config
     try:
-        data = Dao.get_graph_data_json()
-        return jsonify(data)
+        depth = min(max(request.args.get('depth', 1, type=int), 0), cfg['GRAPH_MAX_DEPTH'])
+        data = Dao.get_graph_data_json(request.args.get('root') or None, depth,
+                                       max_nodes=cfg['GRAPH_MAX_NODES'], max_edges=cfg['GRAPH_MAX_EDGES'])
+        # ?format=compact: dạng cột, nhỏ hơn nhiều lần (xem Dao.compact_graph)
+        if request.args.get('format') == 'compact':
+            data = Dao.compact_graph(data)
+        return _json_response(data)
+    except ValueError as e:
+        return _json_response({"nodes": [], "edges": [], "error": str(e)}, 400)
     except Exception as e:
         print(f"Lỗi API Visualization: {e}")
         return jsonify({"nodes": [], "edges": [], "error": str(e)})
 
 # --- Thống kê (Stats) ---
 @main_bp.route('/admin/stats')
+@_etag(*STATS_TAGS)
 def admin_stats():
     if session.get('role') != 'admin': return redirect('/')
     data = Dao.get_system_stats()
-    return render_template('admin/stats.html', stats=data, title="Thống kê hệ thống")
+    # Thống kê cả khóa theo học kỳ (?semester=...), mặc định học kỳ đang mở đăng ký
+    semesters = Dao.get_semesters()
+    semester = request.args.get('semester') or current_app.config['ACTIVE_SEMESTER'] or Dao.get_active_semester()
+    return render_template('admin/stats.html', stats=data, title="Thống kê hệ thống",
+                           semesters=semesters, semester=semester,
+                           analytics=Dao.get_cohort_analytics(semester),
+                           analytics_available=cohort_analytics.available)
+
+@main_bp.route('/admin/cache-stats')
+def admin_cache_stats():
+    """Số liệu cache (hit/miss/eviction) để chọn kích thước cache phù hợp"""
+    if session.get('role') != 'admin': return jsonify({})
+    return jsonify(Dao.cache_stats())
+
+@main_bp.route('/metrics')
+def metrics_endpoint():
+    """Số đo truy vấn SPARQL + cache dạng Prometheus text (chỉ khi bật METRICS_ENABLED)"""
+    if not current_app.config['METRICS_ENABLED']:
+        return make_response("Not Found", 404)
+    cache = Dao.cache_stats()
+    gauges = {f"app_query_cache_{k}": (f"Cache truy vấn Dao: {k}", v)
+              for k, v in cache.items() if isinstance(v, (int, float))}
+    # Chạy bằng serve.py thì mỗi worker process có số đo riêng, phân biệt bằng PID
+    gauges["app_process_id"] = ("PID của worker process trả lời", os.getpid())
+    body = metrics.render(gauges)
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+@main_bp.route('/admin/slow-queries')
+def admin_slow_queries():
+    """Các truy vấn chậm gần nhất (kèm câu truy vấn) để tìm chỗ cần tối ưu"""
+    if session.get('role') != 'admin': return jsonify({})
+    return jsonify(metrics.slow_queries())
 
 # --- Import / Export Data ---
 @main_bp.route('/admin/data-io')
@@ -269,20 +444,27 @@ def admin_data_io():
     return render_template('admin/data_io.html', title="Nhập/Xuất Dữ liệu")
 
 @main_bp.route('/admin/export-json')
+@_etag(*EXPORT_TAGS)
 def admin_export_json():
     if session.get('role') != 'admin': return redirect('/')
-    
-    data = Dao.export_full_data()
-    json_str = json.dumps(data, ensure_ascii=False, indent=4)
-    mem = io.BytesIO()
-    mem.write(json_str.encode('utf-8'))
-    mem.seek(0)
-    
-    return send_file(
-        mem, 
-        as_attachment=True, 
-        download_name='university_data.json', 
-        mimetype='application/json'
+    return _export_response("json")
+
+@main_bp.route('/admin/export/<fmt>')
+@_etag(*EXPORT_TAGS)
+def admin_export(fmt):
+    if session.get('role') != 'admin': return redirect('/')
+    if fmt not in Dao.EXPORT_FORMATS:
+        flash(f"Định dạng không hỗ trợ: {fmt}")
+        return redirect(url_for('main.admin_data_io'))
+    return _export_response(fmt)
+
+def _export_response(fmt):
+    """Trả file export theo luồng: ghi từng khối ngay khi GraphDB trả về"""
+    mimetype, ext = Dao.EXPORT_FORMATS[fmt]
+    return Response(
+        Dao.stream_export(fmt),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=university_data.{ext}"},
     )
 
 @main_bp.route('/admin/import-json', methods=['POST'])
@@ -301,8 +483,22 @@ def admin_import_json():
     if file:
         try:
             data = json.load(file)
-            Dao.import_from_json(data)
-            flash("✅ Import dữ liệu thành công!")
+            report = Dao.import_from_json(
+                data,
+                batch_triples=current_app.config['BULK_IMPORT_BATCH_TRIPLES'],
+                progress=lambda no, total, loaded: print(f"Import: batch {no}/{total} ({loaded} bản ghi)"),
+            )
+            for fb in report["failed_batches"]:
+                print(f"Import: batch {fb['batch']} lỗi ({len(fb['records'])} bản ghi): {fb['error']}")
+            for inv in report["invalid"]:
+                print(f"Import: bỏ qua {inv['record']}: {inv['error']}")
+
+            failed = sum(len(fb["records"]) for fb in report["failed_batches"])
+            if failed or report["invalid"]:
+                flash(f"⚠️ Import {report['loaded']} bản ghi ({report['batches']} batch); "
+                      f"{failed} bản ghi thuộc batch lỗi, {len(report['invalid'])} bản ghi không hợp lệ.")
+            else:
+                flash(f"✅ Import dữ liệu thành công! ({report['loaded']} bản ghi, {report['batches']} batch)")
         except Exception as e:
             flash(f"❌ Lỗi Import: {str(e)}")
             
@@ -0,0 +1,209 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+
+def fold(text):
+    """Chữ thường + bỏ dấu tiếng Việt: 'Nguyễn Đức  Anh' -> 'nguyen duc anh'"""
+    text = unicodedata.normalize('NFD', str(text or "").lower())
+    text = "".join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return " ".join(text.replace('đ', 'd').split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """
+    Chỉ mục tìm kiếm trong bộ nhớ cho tên Môn học, Giảng viên, Sinh viên, Lớp học phần.
+    - Từ khóa >= 3 ký tự: giao các posting trigram rồi kiểm tra lại chuỗi con.
+    - Từ khóa 1-2 ký tự: tìm theo tiền tố từ (danh sách token đã sắp xếp + bisect).
+    Được Dao cập nhật trực tiếp khi ghi dữ liệu, không cần truy vấn GraphDB khi tìm;
+    dựng lại toàn bộ sau `ttl` giây để nhận thay đổi từ process khác.
+    """
+
+    TYPE_LABELS = {"course": "Môn học", "teacher": "Giảng viên",
+                   "student": "Sinh viên", "class": "Lớp học phần"}
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self.ready = False
+        self._expires = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._doc_ids = {}      # (kind, id) -> doc_id
+        self._docs = []         # doc_id -> dict hoặc None (đã xóa)
+        self._free = []         # doc_id đã xóa, dùng lại cho doc thêm sau (không để _docs phình ra)
+        self._grams = {}        # trigram -> set(doc_id)
+        self._tokens = []       # [(token, doc_id)] đã sắp xếp, cho tìm tiền tố
+        # Liên kết Lớp học phần để hiển thị thông tin liên quan
+        self._class_links = {}  # class_id -> (course_id, teacher_id)
+        self._classes_of = {}   # ("course"|"teacher", id) -> set(class_id)
+
+    def fresh(self):
+        return self.ready and time.monotonic() < self._expires
+
+    # --- Cập nhật ---
+    def invalidate(self):
+        """Đánh dấu cần xây lại toàn bộ (vd. sau khi import hàng loạt)"""
+        self.ready = False
+
+    def load(self, docs, class_links):
+        """Xây lại toàn bộ chỉ mục. docs: [(kind, id, name, extra)], class_links: [(class_id, course_id, teacher_id)]"""
+        with self._lock:
+            self._reset()
+            for kind, key, name, extra in docs:
+                self._add(kind, key, name, extra)
+            self._tokens = sorted((token, doc_id) for doc_id, doc in enumerate(self._docs)
+                                  for token in set(doc["folded"].split()))
+            for class_id, course_id, teacher_id in class_links:
+                self.link_class(class_id, course_id, teacher_id)
+            self._expires = time.monotonic() + self.ttl
+            self.ready = True
+
+    def upsert(self, kind, key, name, extra=None):
+        with self._lock:
+            self._remove(kind, key)
+            doc_id = self._add(kind, key, name, extra)
+            for token in set(self._docs[doc_id]["folded"].split()):
+                bisect.insort(self._tokens, (token, doc_id))
+
+    def remove(self, kind, key):
+        with self._lock:
+            self._remove(kind, key)
+            if kind == "class":
+                self.unlink_class(key)
+
+    def link_class(self, class_id, course_id, teacher_id):
+        with self._lock:
+            self.unlink_class(class_id)
+            self._class_links[class_id] = (course_id, teacher_id)
+            if course_id:
+                self._classes_of.setdefault(("course", course_id), set()).add(class_id)
+            if teacher_id:
+                self._classes_of.setdefault(("teacher", teacher_id), set()).add(class_id)
+
+    def unlink_class(self, class_id):
+        with self._lock:
+            course_id, teacher_id = self._class_links.pop(class_id, (None, None))
+            self._classes_of.get(("course", course_id), set()).discard(class_id)
+            self._classes_of.get(("teacher", teacher_id), set()).discard(class_id)
+
+    def _add(self, kind, key, name, extra):
+        folded = fold(name)
+        doc = {"kind": kind, "id": key, "name": name or "",
+               "lower": str(name or "").lower(), "folded": folded, "extra": extra}
+        if self._free:
+            doc_id = self._free.pop()
+            self._docs[doc_id] = doc
+        else:
+            doc_id = len(self._docs)
+            self._docs.append(doc)
+        self._doc_ids[(kind, key)] = doc_id
+        for gram in _trigrams(folded):
+            self._grams.setdefault(gram, set()).add(doc_id)
+        return doc_id
+
+    def _remove(self, kind, key):
+        doc_id = self._doc_ids.pop((kind, key), None)
+        if doc_id is None:
+            return
+        doc = self._docs[doc_id]
+        self._docs[doc_id] = None
+        self._free.append(doc_id)
+        for gram in _trigrams(doc["folded"]):
+            postings = self._grams.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._grams[gram]
+        for token in set(doc["folded"].split()):
+            i = bisect.bisect_left(self._tokens, (token, doc_id))
+            if i < len(self._tokens) and self._tokens[i] == (token, doc_id):
+                del self._tokens[i]
+
+    # --- Tìm kiếm ---
+    def _candidates(self, token):
+        if len(token) >= 3:
+            grams = sorted(_trigrams(token), key=lambda g: len(self._grams.get(g, ())))
+            found = set(self._grams.get(grams[0], ()))
+            for gram in grams[1:]:
+                found &= self._grams.get(gram, set())
+                if not found:
+                    break
+            return {d for d in found if token in self._docs[d]["folded"]}
+        found = set()
+        i = bisect.bisect_left(self._tokens, (token,))
+        while i < len(self._tokens) and self._tokens[i][0].startswith(token):
+            found.add(self._tokens[i][1])
+            i += 1
+        return found
+
+    def search(self, keyword, limit=50):
+        """Tìm theo tên (không phân biệt dấu), trả về kết quả đã xếp hạng"""
+        query = fold(keyword)
+        tokens = query.split()
+        if not tokens:
+            return []
+        raw = " ".join(str(keyword).lower().split())
+        with self._lock:
+            matched = None
+            for token in sorted(set(tokens), key=len, reverse=True):
+                found = self._candidates(token)
+                matched = found if matched is None else matched & found
+                if not matched:
+                    return []
+
+            scored = []
+            for doc_id in matched:
+                doc = self._docs[doc_id]
+                name_tokens = doc["folded"].split()
+                score = 0.0
+                if doc["folded"] == query:
+                    score += 100
+                elif doc["folded"].startswith(query):
+                    score += 50
+                elif query in doc["folded"]:
+                    score += 10
+                score += 20 * sum(any(t.startswith(q) for t in name_tokens) for q in tokens) / len(tokens)
+                if raw in doc["lower"]:
+                    score += 5  # gõ đúng dấu thì ưu tiên hơn
+                score -= len(doc["folded"]) / 100.0
+                scored.append((-score, doc["folded"], doc_id))
+            scored.sort()
+            return [self._result(doc_id, -neg) for neg, _, doc_id in scored[:limit]]
+
+    def _result(self, doc_id, score):
+        doc = self._docs[doc_id]
+        return {"type": self.TYPE_LABELS[doc["kind"]], "kind": doc["kind"], "title": doc["name"],
+                "id": doc["id"], "score": round(score, 2), "related_info": self._related(doc)}
+
+    def _name(self, kind, key):
+        doc_id = self._doc_ids.get((kind, key))
+        return self._docs[doc_id]["name"] if doc_id is not None else None
+
+    def _related(self, doc):
+        kind, key = doc["kind"], doc["id"]
+        if kind == "student":
+            return [doc["extra"]] if doc["extra"] else []
+        if kind == "class":
+            course_id, teacher_id = self._class_links.get(key, (None, None))
+            names = [self._name("course", course_id), self._name("teacher", teacher_id)]
+            return [n for n in names if n]
+        # Môn học -> các giảng viên dạy; Giảng viên -> các môn đang dạy
+        other = "teacher" if kind == "course" else "course"
+        names = []
+        for class_id in sorted(self._classes_of.get((kind, key), ())):
+            course_id, teacher_id = self._class_links[class_id]
+            name = self._name(other, teacher_id if other == "teacher" else course_id)
+            if name and name not in names:
+                names.append(name)
+        return names
+
+
+# Chỉ mục dùng chung cho Dao (được xây lần đầu khi có người tìm kiếm)
+search_index = SearchIndex()
@@ -0,0 +1,169 @@
+import csv
+import io
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SparqlBackend:
+    """
+    Giao diện chung của nơi lưu trữ mà Dao gọi qua get_driver():
+    - select(query): danh sách bindings dạng SPARQL JSON ({biến: {"type", "value"}})
+    - select_rows(query): generator từng dòng {biến: chuỗi}, biến thiếu là chuỗi rỗng
+    - construct_chunks(query, accept): generator các khối bytes N-Triples/Turtle
+    - update(update_str): chạy INSERT/DELETE
+    `name` (tùy chọn) là tên template trong app/queries.py, chỉ dùng để đo theo từng truy vấn.
+    Lỗi được ném ra ngoài, Dao tự bắt và xử lý.
+    Cài đặt: SparqlClient (GraphDB qua HTTP), LocalStore (RDF store nhúng trong process).
+    """
+
+    # Hàm nhận số đo mỗi lời gọi: observer(op, query, giây, số dòng, số bytes, lỗi?, tên truy vấn)
+    # None = không đo gì (mặc định)
+    observer = None
+
+    def _observe(self, op, query_str, started, rows, nbytes, error, name=None):
+        if started is not None:
+            self.observer(op, query_str, time.perf_counter() - started, rows, nbytes, error, name)
+
+    def select(self, query_str, name=None):
+        raise NotImplementedError
+
+    def select_rows(self, query_str, name=None):
+        raise NotImplementedError
+
+    def construct_chunks(self, query_str, accept="application/n-triples", chunk_size=64 * 1024, name=None):
+        raise NotImplementedError
+
+    def update(self, update_str, name=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SparqlClient(SparqlBackend):
+    """
+    Client SPARQL dùng chung cho nhiều thread.
+    - Không giữ trạng thái theo từng truy vấn (khác SPARQLWrapper.setQuery),
+      nên 2 thread chạy song song không ghi đè query của nhau.
+    - Dùng 1 requests.Session với pool kết nối keep-alive có giới hạn
+      cho cả endpoint Query và endpoint /statements (Update).
+    """
+
+    def __init__(self, endpoint, pool_size=10, connect_timeout=3.0, read_timeout=30.0):
+        endpoint = endpoint.rstrip('/')
+        if endpoint.endswith('/statements'):
+            endpoint = endpoint[:-len('/statements')]
+        self.endpoint = endpoint
+        # GraphDB yêu cầu endpoint kết thúc bằng /statements cho lệnh Update SPARQL 1.1
+        self.update_endpoint = endpoint + '/statements'
+        self.timeout = (connect_timeout, read_timeout)
+        self.observer = None
+
+        self._session = requests.Session()
+        # pool_block=True: khi hết kết nối rảnh thì thread phải chờ,
+        # thay vì mở thêm kết nối ngoài giới hạn.
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size,
+                              pool_block=True, max_retries=0)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def select(self, query_str, name=None):
+        """Chạy SELECT/ASK, trả về danh sách bindings (ném lỗi nếu thất bại)"""
+        started = time.perf_counter() if self.observer else None
+        rows = nbytes = 0
+        error = True
+        try:
+            response = self._session.post(
+                self.endpoint,
+                data={'query': query_str},
+                headers={"Accept": "application/sparql-results+json"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            nbytes = len(response.content)
+            bindings = response.json()["results"]["bindings"]
+            rows, error = len(bindings), False
+            return bindings
+        finally:
+            self._observe("select", query_str, started, rows, nbytes, error, name)
+
+    def select_rows(self, query_str, name=None):
+        """
+        Chạy SELECT và trả về từng dòng (dict: biến -> giá trị chuỗi) ngay khi
+        GraphDB gửi về. Dùng định dạng CSV để đọc theo luồng, không giữ toàn bộ
+        kết quả trong bộ nhớ. Biến không có giá trị sẽ là chuỗi rỗng.
+        """
+        started = time.perf_counter() if self.observer else None
+        rows = 0
+        error = True
+        response = None
+        try:
+            response = self._session.post(
+                self.endpoint,
+                data={'query': query_str},
+                headers={"Accept": "text/csv"},
+                timeout=self.timeout,
+                stream=True,
+            )
+            response.raise_for_status()
+            response.raw.decode_content = True
+            # urllib3 tự đóng luồng khi đọc hết body, TextIOWrapper sẽ báo lỗi "closed file"
+            response.raw.auto_close = False
+            reader = csv.DictReader(io.TextIOWrapper(response.raw, encoding='utf-8', newline=''))
+            for row in reader:
+                rows += 1
+                yield row
+            error = False
+        finally:
+            nbytes = response.raw.tell() if response is not None else 0
+            if response is not None:
+                response.close()
+            self._observe("select_rows", query_str, started, rows, nbytes, error, name)
+
+    def construct_chunks(self, query_str, accept="application/n-triples", chunk_size=64 * 1024, name=None):
+        """Chạy CONSTRUCT và chuyển tiếp từng khối bytes RDF (N-Triples/Turtle) của GraphDB"""
+        started = time.perf_counter() if self.observer else None
+        nbytes = 0
+        error = True
+        response = None
+        try:
+            response = self._session.post(
+                self.endpoint,
+                data={'query': query_str},
+                headers={"Accept": accept},
+                timeout=self.timeout,
+                stream=True,
+            )
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size):
+                nbytes += len(chunk)
+                yield chunk
+            error = False
+        finally:
+            if response is not None:
+                response.close()
+            self._observe("construct", query_str, started, 0, nbytes, error, name)
+
+    def update(self, update_str, name=None):
+        """Chạy INSERT/DELETE qua /statements (ném lỗi nếu thất bại)"""
+        started = time.perf_counter() if self.observer else None
+        body = update_str.encode('utf-8')
+        error = True
+        try:
+            response = self._session.post(
+                self.update_endpoint,
+                data=body,
+                headers={
+                    "Content-Type": "application/sparql-update",
+                    "Accept": "application/json",
+                },
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            error = False
+        finally:
+            self._observe("update", update_str, started, 0, len(body), error, name)
+
+    def close(self):
+        self._session.close()
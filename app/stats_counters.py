@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import Counter
+
+
+class StatsCounters:
+    """
+    Bộ đếm thống kê giữ sẵn trong bộ nhớ để trang Thống kê không phải quét GraphDB:
+    - types: số node theo rdf:type (Student, Teacher, Course, Class, ...)
+    - students_by_dept: số sinh viên theo mã Khoa
+    - enrollments / grades: sĩ số và số đầu điểm theo mã lớp
+    Dao cộng/trừ ngay khi ghi; định kỳ nạp lại toàn bộ (reconcile) để sửa sai lệch
+    do ghi từ process khác hoặc lỗi giữa chừng.
+    """
+
+    KINDS = ("types", "students_by_dept", "enrollments", "grades")
+
+    def __init__(self):
+        self.ready = False
+        self.reconciled_at = None
+        self.drift = 0          # tổng chênh lệch phát hiện ở lần reconcile gần nhất
+        self._lock = threading.Lock()
+        self._counts = {kind: Counter() for kind in self.KINDS}
+        self._dept_names = {}   # mã Khoa -> tên
+
+    def load(self, counts, dept_names):
+        """Thay toàn bộ bằng số liệu vừa tính lại, trả về tổng chênh lệch so với trước"""
+        fresh = {kind: Counter({k: v for k, v in counts.get(kind, {}).items() if v}) for kind in self.KINDS}
+        with self._lock:
+            drift = 0
+            if self.ready:
+                for kind in self.KINDS:
+                    old, new = self._counts[kind], fresh[kind]
+                    drift += sum(abs(new[k] - old[k]) for k in set(old) | set(new))
+            self._counts = fresh
+            self._dept_names = dict(dept_names)
+            self.ready = True
+            self.drift = drift
+            self.reconciled_at = time.time()
+        return drift
+
+    def add(self, kind, key, delta=1):
+        if key is None or not delta:
+            return
+        with self._lock:
+            counter = self._counts[kind]
+            counter[key] += delta
+            if counter[key] <= 0:
+                del counter[key]
+
+    def invalidate(self):
+        """Đánh dấu cần nạp lại toàn bộ (vd. sau khi import hàng loạt)"""
+        self.ready = False
+
+    def snapshot(self):
+        with self._lock:
+            counts = {kind: dict(self._counts[kind]) for kind in self.KINDS}
+            return counts, dict(self._dept_names)
+
+
+_reconciler = None
+
+def start_reconciler(reconcile, interval):
+    """Thread nền gọi `reconcile()` mỗi `interval` giây (lỗi thì in ra và thử lại lần sau)"""
+    global _reconciler
+    if _reconciler is not None:
+        return _reconciler
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                reconcile()
+            except Exception as e:
+                print(f"Lỗi tính lại bộ đếm thống kê: {e}")
+
+    _reconciler = threading.Thread(target=run, name="stats-reconciler", daemon=True)
+    _reconciler.start()
+    return _reconciler
+
+
+# Bộ đếm dùng chung cho Dao (được nạp lần đầu khi xem thống kê)
+stats_counters = StatsCounters()
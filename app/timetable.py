@@ -0,0 +1,207 @@
+import bisect
+import re
+import threading
+import time
+
+from .search_index import fold
+
+MAX_PERIOD = 15   # số tiết tối đa trong 1 ngày
+
+# "Thứ 2, Thứ 4 (Tiết 1-3)", "T3 (tiết 7-9), CN (Tiết 1-5)" sau khi bỏ dấu / chữ thường
+_GROUP = re.compile(r"([^()]*)\(\s*tiet\s*(\d+)\s*[-–]\s*(\d+)\s*\)")
+_DAY = re.compile(r"\bthu\s*([2-7])\b|\bt([2-7])\b|\bchu nhat\b|\bcn\b")
+
+
+def parse_schedule(text):
+    """
+    Tách lịch học dạng chữ thành các buổi (thứ, tiết bắt đầu, tiết kết thúc), thứ 2..7, Chủ nhật = 8.
+    'Thứ 2, Thứ 4 (Tiết 1-3)' -> [(2, 1, 3), (4, 1, 3)]. Không đọc được thì trả về [].
+    """
+    slots = set()
+    for group in _GROUP.finditer(fold(text)):
+        days = [int(d.group(1) or d.group(2) or 8) for d in _DAY.finditer(group.group(1))]
+        start, end = int(group.group(2)), int(group.group(3))
+        if not days or not 1 <= start <= end <= MAX_PERIOD:
+            return []
+        slots.update((day, start, end) for day in days)
+    return sorted(slots)
+
+
+def room_key(room):
+    """Chuẩn hóa tên phòng để so trùng: ' a2 - 301 ' -> 'A2-301'"""
+    return "".join(str(room or "").split()).upper()
+
+
+def _span(slot):
+    """Buổi học -> khoảng [đầu, cuối] trên trục thời gian của 1 tuần"""
+    day, start, end = slot
+    return day * 100 + start, day * 100 + end
+
+
+class _Intervals:
+    """Các khoảng thời gian của 1 đối tượng, sắp theo điểm đầu để tìm giao nhau bằng bisect"""
+    __slots__ = ("starts", "items", "max_len")
+
+    def __init__(self):
+        self.starts = []
+        self.items = []      # (đầu, cuối, mã lớp), cùng thứ tự với starts
+        self.max_len = 0
+
+    def add(self, start, end, key):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.items.insert(i, (start, end, key))
+        self.max_len = max(self.max_len, end - start)
+
+    def remove(self, key):
+        keep = [item for item in self.items if item[2] != key]
+        self.items = keep
+        self.starts = [item[0] for item in keep]
+
+    def overlapping(self, start, end):
+        # Khoảng giao [start, end] phải bắt đầu trong [start - max_len, end]
+        lo = bisect.bisect_left(self.starts, start - self.max_len)
+        hi = bisect.bisect_right(self.starts, end)
+        return [key for s, e, key in self.items[lo:hi] if e >= start]
+
+
+class TimetableIndex:
+    """
+    Chỉ mục thời khóa biểu trong bộ nhớ: với mỗi sinh viên / giảng viên / phòng học và mỗi
+    học kỳ, giữ các buổi học đã sắp xếp để kiểm tra trùng lịch bằng tìm kiếm nhị phân
+    (không truy vấn GraphDB khi đăng ký). Lớp có lịch học không đọc được thì không được xét.
+    Dao cập nhật ngay khi ghi; dựng lại toàn bộ sau `ttl` giây để nhận thay đổi từ process khác.
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self.ready = False
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._classes = {}   # mã lớp -> (học kỳ, [buổi học])
+        self._owners = {}    # (kind, mã đối tượng, học kỳ) -> _Intervals
+        self._links = {}     # (kind, mã đối tượng) -> set(mã lớp)
+
+    def fresh(self):
+        return self.ready and time.monotonic() < self._expires
+
+    def invalidate(self):
+        """Đánh dấu cần dựng lại toàn bộ (vd. sau khi import hàng loạt)"""
+        self.ready = False
+
+    def load(self, classes, links):
+        """classes: [(mã lớp, học kỳ, lịch học dạng chữ)], links: [(kind, mã đối tượng, mã lớp)]"""
+        with self._lock:
+            self._reset()
+            for key, semester, schedule in classes:
+                slots = parse_schedule(schedule)
+                if slots:
+                    self._classes[key] = (semester, slots)
+            for kind, owner, key in links:
+                self._link(kind, owner, key)
+            self._expires = time.monotonic() + self.ttl
+            self.ready = True
+
+    # --- Cập nhật ---
+    def add_class(self, key, semester, schedule, links=()):
+        """Thêm (hoặc thay) 1 lớp cùng các liên kết giảng viên / phòng của lớp"""
+        slots = parse_schedule(schedule)
+        with self._lock:
+            if slots and self._classes.get(key) == (semester, slots):
+                for kind, owner in links:   # lịch không đổi: chỉ thêm liên kết
+                    self._link(kind, owner, key)
+                return
+            owners = [k for k, keys in self._links.items() if key in keys]
+            for kind, owner in owners:
+                self._unlink(kind, owner, key)
+            if not slots:
+                self._classes.pop(key, None)
+                return
+            self._classes[key] = (semester, slots)
+            for kind, owner in [*owners, *links]:
+                self._link(kind, owner, key)
+
+    def link(self, kind, owner, key):
+        with self._lock:
+            self._link(kind, owner, key)
+
+    def unlink(self, kind, owner, key):
+        with self._lock:
+            self._unlink(kind, owner, key)
+
+    def sync(self, kind, owner, keys):
+        """Đặt lại các lớp của 1 đối tượng theo dữ liệu vừa đọc từ GraphDB"""
+        keys = set(keys)
+        with self._lock:
+            for key in self._links.get((kind, owner), set()) - keys:
+                self._unlink(kind, owner, key)
+            for key in keys:
+                self._link(kind, owner, key)
+
+    def drop_owner(self, kind, owner):
+        """Bỏ toàn bộ lịch của 1 đối tượng (vd. giảng viên bị xóa)"""
+        with self._lock:
+            for key in list(self._links.get((kind, owner), ())):
+                self._unlink(kind, owner, key)
+
+    def _link(self, kind, owner, key):
+        cls = self._classes.get(key)
+        if cls is None or key in self._links.get((kind, owner), ()):
+            return
+        self._links.setdefault((kind, owner), set()).add(key)
+        semester, slots = cls
+        intervals = self._owners.setdefault((kind, owner, semester), _Intervals())
+        for slot in slots:
+            intervals.add(*_span(slot), key)
+
+    def _unlink(self, kind, owner, key):
+        keys = self._links.get((kind, owner))
+        if not keys or key not in keys:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._links[(kind, owner)]
+        semester = self._classes[key][0]
+        intervals = self._owners.get((kind, owner, semester))
+        if intervals is not None:
+            intervals.remove(key)
+            if not intervals.items:
+                del self._owners[(kind, owner, semester)]
+
+    # --- Kiểm tra trùng lịch ---
+    def conflicts(self, kind, owner, key, extra=(), ignore=()):
+        """
+        Các lớp của đối tượng trùng lịch với lớp `key` (cùng học kỳ). `extra`: các lớp coi như
+        đã có thêm (vd. đã nhận trong cùng batch), `ignore`: các lớp coi như đã bỏ.
+        """
+        with self._lock:
+            cls = self._classes.get(key)
+            if cls is None:
+                return []
+            return self._conflicts(kind, owner, cls[0], cls[1], extra, set(ignore) | {key})
+
+    def conflicts_for(self, kind, owner, semester, schedule, ignore=()):
+        """Như conflicts() nhưng cho 1 lịch học chưa có trong chỉ mục (vd. lớp sắp tạo)"""
+        with self._lock:
+            return self._conflicts(kind, owner, semester, parse_schedule(schedule), (), set(ignore))
+
+    def _conflicts(self, kind, owner, semester, slots, extra, ignore):
+        found = set()
+        intervals = self._owners.get((kind, owner, semester))
+        for slot in slots:
+            start, end = _span(slot)
+            if intervals is not None:
+                found.update(intervals.overlapping(start, end))
+            for other in extra:
+                cls = self._classes.get(other)
+                if cls and cls[0] == semester and any(
+                        _span(s)[0] <= end and start <= _span(s)[1] for s in cls[1]):
+                    found.add(other)
+        return sorted(found - set(ignore))
+
+
+# Chỉ mục dùng chung cho Dao (dựng lần đầu khi đăng ký học phần / tạo lớp)
+timetable_index = TimetableIndex()
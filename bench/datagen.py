@@ -0,0 +1,146 @@
+"""
+Sinh dữ liệu trường đại học giả lập (N-Triples) theo đúng mô hình mà Dao đọc/ghi:
+Khoa, Học kỳ, Giảng viên, Môn học, Lớp học phần, Sinh viên, Đăng ký, Điểm.
+
+    python -m bench.datagen --scale medium > university_medium.nt
+
+File .nt có thể nạp thẳng vào GraphDB (Import > RDF) hoặc vào stand-in của bench.
+"""
+import argparse
+import random
+import sys
+
+UNI = "http://example.org/university/"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+# Quy mô: số Giảng viên, Môn học, Lớp học phần, Sinh viên, số lớp mỗi SV đăng ký
+SCALES = {
+    "small": {"teachers": 20, "courses": 40, "classes": 80, "students": 400, "per_student": 4},
+    "medium": {"teachers": 80, "courses": 160, "classes": 320, "students": 3000, "per_student": 5},
+    "large": {"teachers": 300, "courses": 600, "classes": 1200, "students": 15000, "per_student": 6},
+}
+
+DEPARTMENTS = [("CNTT", "Công nghệ thông tin"), ("KT", "Kinh tế"), ("NN", "Ngoại ngữ"),
+               ("QTKD", "Quản trị Kinh doanh"), ("DL", "Du lịch & Khách sạn")]
+SEMESTERS = ["HK1_2024", "HK2_2024", "HK1_2025"]
+SURNAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ"]
+MIDDLES = ["Văn", "Thị", "Minh", "Hữu", "Đức", "Thanh", "Ngọc", "Quốc", "Gia", "Bảo"]
+GIVEN = ["An", "Bình", "Châu", "Dũng", "Giang", "Hà", "Hải", "Hạnh", "Khoa", "Lan", "Long",
+         "Mai", "Nam", "Nhung", "Phúc", "Quân", "Sơn", "Tâm", "Thảo", "Trang", "Tú", "Vy"]
+SUBJECTS = ["Cơ sở dữ liệu", "Lập trình", "Kinh tế vi mô", "Kế toán", "Tiếng Anh", "Marketing",
+            "Mạng máy tính", "Quản trị học", "Du lịch học", "Xác suất thống kê", "Trí tuệ nhân tạo"]
+DAYS = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7"]
+
+
+def _lit(value):
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'"{text}"'
+
+
+def _name(rng):
+    return f"{rng.choice(SURNAMES)} {rng.choice(MIDDLES)} {rng.choice(GIVEN)}"
+
+
+def generate(scale="small", seed=42):
+    """
+    Sinh từng triple dạng (s, p, o) đã viết theo cú pháp N-Triples.
+    Cùng scale + seed luôn cho cùng dữ liệu, để kết quả bench so sánh được giữa các lần chạy.
+    """
+    size = SCALES[scale] if isinstance(scale, str) else scale
+    rng = random.Random(seed)
+    uri = lambda local: f"<{UNI}{local}>"
+    typ = lambda name: f"<{UNI}{name}>"
+    p = lambda name: f"<{UNI}{name}>"
+    rdf_type = f"<{RDF_TYPE}>"
+
+    yield uri("admin_01"), rdf_type, typ("Admin")
+    yield uri("admin_01"), p("username"), _lit("admin")
+    yield uri("admin_01"), p("password"), _lit("admin123")
+    yield uri("admin_01"), p("name"), _lit("Quản trị viên")
+    for dept_id, name in DEPARTMENTS:
+        yield uri(f"dept_{dept_id}"), rdf_type, typ("Department")
+        yield uri(f"dept_{dept_id}"), p("id"), _lit(dept_id)
+        yield uri(f"dept_{dept_id}"), p("name"), _lit(name)
+    for sem in SEMESTERS:
+        yield uri(f"sem_{sem}"), rdf_type, typ("Semester")
+        yield uri(f"sem_{sem}"), p("id"), _lit(sem)
+        yield uri(f"sem_{sem}"), p("year"), _lit(sem[-4:])
+        yield uri(f"sem_{sem}"), p("term"), _lit(sem[2])
+
+    teachers = [f"GV{i:04d}" for i in range(1, size["teachers"] + 1)]
+    for tid in teachers:
+        t = uri(f"teacher_{tid}")
+        yield t, rdf_type, typ("Teacher")
+        yield t, p("id"), _lit(tid)
+        yield t, p("name"), _lit(_name(rng))
+        yield t, p("phone"), _lit(f"09{rng.randrange(10**8):08d}")
+        yield t, p("position"), _lit(rng.choice(["Giảng viên", "Giảng viên chính", "Phó Giáo sư"]))
+        yield t, p("status"), _lit("Đang giảng dạy")
+        yield t, p("belongsTo"), uri(f"dept_{rng.choice(DEPARTMENTS)[0]}")
+
+    courses = [f"MH{i:04d}" for i in range(1, size["courses"] + 1)]
+    for n, cid in enumerate(courses):
+        c = uri(f"course_{cid}")
+        yield c, rdf_type, typ("Course")
+        yield c, p("id"), _lit(cid)
+        yield c, p("name"), _lit(f"{SUBJECTS[n % len(SUBJECTS)]} {n // len(SUBJECTS) + 1}")
+        yield c, p("credit"), _lit(rng.choice([2, 3, 3, 4]))
+        yield c, p("semester"), _lit(rng.randint(1, 8))
+        yield c, p("belongsTo"), uri(f"dept_{rng.choice(DEPARTMENTS)[0]}")
+
+    classes = []
+    for n in range(size["classes"]):
+        cid, sem = courses[n % len(courses)], SEMESTERS[n % len(SEMESTERS)]
+        class_id = f"{cid}_{sem}_{n // len(courses) + 1:02d}"
+        classes.append(class_id)
+        cl = uri(f"class_{class_id}")
+        yield cl, rdf_type, typ("Class")
+        yield cl, p("id"), _lit(class_id)
+        yield cl, p("room"), _lit(f"{rng.choice('ABCDE')}{rng.randint(1, 5)}-{rng.randint(101, 410)}")
+        yield cl, p("schedule"), _lit(f"{rng.choice(DAYS)} (Tiết {rng.choice([1, 4, 7, 10])}-{rng.choice([3, 6, 9, 12])})")
+        yield cl, p("offeredIn"), uri(f"sem_{sem}")
+        yield cl, p("capacity"), _lit(rng.choice([40, 60, 80, 120]))
+        yield uri(f"course_{cid}"), p("hasClass"), cl
+        yield uri(f"teacher_{rng.choice(teachers)}"), p("teaches"), cl
+
+    for i in range(1, size["students"] + 1):
+        sid = f"SV{i:06d}"
+        s = uri(f"student_{sid}")
+        yield s, rdf_type, typ("Student")
+        yield s, p("id"), _lit(sid)
+        yield s, p("name"), _lit(_name(rng))
+        yield s, p("phone"), _lit(f"03{rng.randrange(10**8):08d}")
+        yield s, p("class"), _lit(f"K{rng.randint(20, 24)}{rng.choice(['A', 'B', 'C'])}")
+        yield s, p("year"), _lit(rng.randint(2020, 2024))
+        yield s, p("status"), _lit("Đang học")
+        yield s, p("password"), _lit("123456")
+        yield s, p("majorIn"), uri(f"dept_{rng.choice(DEPARTMENTS)[0]}")
+        for class_id in rng.sample(classes, min(size["per_student"], len(classes))):
+            yield s, p("enrolledIn"), uri(f"class_{class_id}")
+            if rng.random() < 0.7:
+                g = uri(f"grade_{class_id}.{sid}")
+                yield g, rdf_type, typ("Grade")
+                yield g, p("class"), uri(f"class_{class_id}")
+                yield g, p("student"), s
+                yield g, p("value"), _lit(f"{rng.randint(0, 100) / 10:g}")
+
+
+def write_ntriples(scale, out, seed=42):
+    count = 0
+    for s, p, o in generate(scale, seed):
+        out.write(f"{s} {p} {o} .\n")
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu trường đại học giả lập (N-Triples)")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    count = write_ntriples(args.scale, sys.stdout, args.seed)
+    print(f"Đã sinh {count} triple (scale={args.scale})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
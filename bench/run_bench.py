@@ -0,0 +1,283 @@
+"""
+Đo thời gian các hàm public của Dao trên endpoint SPARQL giả lập (bench.sparql_standin)
+với dữ liệu sinh bởi bench.datagen ở nhiều quy mô, ghi kết quả ra file JSON.
+
+    python -m bench.run_bench --scales small,medium --repeat 5 --out bench_results.json
+    python -m bench.run_bench --scales small --compare bench_results_old.json
+    python -m bench.run_bench --scales small --backend local --engine oxigraph
+
+- cold: xóa cache/chỉ mục trong bộ nhớ trước mỗi lần gọi (luôn chạm endpoint)
+- warm: gọi 1 lần rồi mới đo (đọc từ cache/chỉ mục nếu hàm có dùng)
+Với --compare, các hàm có median chậm hơn ngưỡng so với file cũ được liệt kê
+và lệnh trả mã lỗi 1 (dùng để chặn hồi quy hiệu năng giữa các bản phát hành).
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from bench.datagen import SCALES, generate
+from bench.sparql_standin import SparqlStandIn
+
+
+def _reset_memory():
+    """Xóa mọi trạng thái trong bộ nhớ của Dao để lần gọi sau phải hỏi endpoint"""
+    from app.cache import query_cache
+    from app.search_index import search_index
+    from app.auth import credential_index
+    from app.stats_counters import stats_counters
+    from app.catalog import semester_catalog
+    from app.timetable import timetable_index
+    from app.coenrollment import co_enrollment
+    query_cache.clear()
+    search_index.invalidate()
+    credential_index.invalidate()
+    stats_counters.invalidate()
+    semester_catalog.invalidate()
+    timetable_index.invalidate()
+    co_enrollment.invalidate()
+
+
+def _cases(Dao, sid, tid, cid, class_id):
+    """(tên, hàm không tham số, có ghi dữ liệu?) cho mỗi hàm public của Dao"""
+    counter = iter(range(10**9))
+
+    def add_delete_student():
+        new_id = f"BENCH{next(counter):06d}"
+        Dao.add_student(new_id, "Sinh viên Bench", "0900000000", "K24A", "2024", "CNTT", "123456")
+        Dao.delete_student(new_id)
+
+    def enroll_unenroll():
+        Dao.enroll_class(sid, class_id)
+        Dao.unenroll_class(sid, class_id)
+
+    def grade_roster():
+        roster = Dao.get_class_roster(class_id)
+        return Dao.update_grades_bulk(class_id, [(r["id"], r["score"] or "") for r in roster])
+
+    def update_teacher():
+        t = Dao.get_teacher_by_id(tid)
+        Dao.update_teacher(tid, t["name"], t["phone"], t["pos"], t["deptId"])
+
+    def add_delete_teacher():
+        new_id = f"BGV{next(counter):06d}"
+        Dao.add_teacher(new_id, "Giảng viên Bench", "0900000000", "Giảng viên", "CNTT")
+        Dao.delete_teacher(new_id)
+
+    def add_delete_course():
+        new_id = f"BMH{next(counter):06d}"
+        Dao.add_course(new_id, "Môn Bench", 3, 1, "CNTT")
+        Dao.delete_course(new_id)
+
+    def update_course():
+        c = Dao.get_course_by_id(cid)
+        Dao.update_course(cid, c["name"], c["credit"], c["sem"], c["deptId"])
+
+    def update_student():
+        s = Dao.get_student_by_id(sid)
+        Dao.update_student(sid, s["name"], s["phone"], s["class"], s["year"], s["deptId"], s["password"])
+
+    def create_section():
+        # Mỗi lớp 1 học kỳ riêng để không bị báo trùng lịch giảng viên / phòng
+        n = next(counter)
+        Dao.create_section(f"BENCH_{n:06d}", "A1-101", "Thứ 2 (Tiết 1-3)",
+                           cid, tid, f"BENCH_{n:06d}", capacity=40)
+
+    def import_json():
+        # 200 sinh viên đã có: nạp lại (idempotent) để đo đường batch INSERT DATA
+        data = {"students": [{"data": {"student_id": f"SV{i:06d}", "name": "Sinh viên Import",
+                                       "class": "K24A", "year": "2024"}, "major": "Kinh tế"}
+                             for i in range(1, 201)]}
+        return Dao.import_from_json(data)
+
+    def export(fmt):
+        return lambda: sum(len(chunk) for chunk in Dao.stream_export(fmt))
+
+    return [
+        ("init_db", Dao.init_db, False),
+        ("load_credentials", Dao.load_credentials, False),
+        ("verify_user", lambda: Dao.verify_user(sid, "123456", "student"), False),
+        ("get_all_teachers", Dao.get_all_teachers, False),
+        ("get_all_students", Dao.get_all_students, False),
+        ("get_all_courses", Dao.get_all_courses, False),
+        ("count_entities", lambda: Dao.count_entities("students"), False),
+        ("get_teachers_page", Dao.get_teachers_page, False),
+        ("get_students_page", Dao.get_students_page, False),
+        ("get_students_page[name,desc]", lambda: Dao.get_students_page("name", True), False),
+        ("get_courses_page", Dao.get_courses_page, False),
+        ("get_data_for_section_form", Dao.get_data_for_section_form, False),
+        ("get_student_info", lambda: Dao.get_student_info(sid), False),
+        ("get_student_dashboard", lambda: Dao.get_student_dashboard(sid), False),
+        ("get_semesters", Dao.get_semesters, False),
+        ("get_active_semester", Dao.get_active_semester, False),
+        ("rebuild_catalog", lambda: Dao.rebuild_catalog(Dao.get_active_semester()), False),
+        ("get_cohort_analytics", lambda: Dao.get_cohort_analytics(Dao.get_active_semester()), False),
+        ("rebuild_timetable", Dao.rebuild_timetable, False),
+        ("rebuild_coenrollment", Dao.rebuild_coenrollment, False),
+        ("get_available_classes_for_registration", lambda: Dao.get_available_classes_for_registration(sid), False),
+        ("get_student_enrolled_classes", lambda: Dao.get_student_enrolled_classes(sid), False),
+        ("get_classmates", lambda: Dao.get_classmates(sid), False),
+        ("get_credit_stats", lambda: Dao.get_credit_stats(sid), False),
+        ("rebuild_search_index", Dao.rebuild_search_index, False),
+        ("search_graph", lambda: Dao.search_graph("nguyen an"), False),
+        ("search_graph[prefix]", lambda: Dao.search_graph("an"), False),
+        ("get_graph_data_json", Dao.get_graph_data_json, False),
+        ("get_graph_data_json[student,2]", lambda: Dao.get_graph_data_json(f"student_{sid}", 2), False),
+        ("compact_graph", lambda: Dao.compact_graph(Dao.get_graph_data_json(f"student_{sid}", 2)), False),
+        ("reconcile_stats", Dao.reconcile_stats, False),
+        ("get_system_stats", Dao.get_system_stats, False),
+        ("warm_up", Dao.warm_up, False),
+        ("get_class_roster", lambda: Dao.get_class_roster(class_id), False),
+        ("get_teacher_by_id", lambda: Dao.get_teacher_by_id(tid), False),
+        ("get_student_by_id", lambda: Dao.get_student_by_id(sid), False),
+        ("get_course_by_id", lambda: Dao.get_course_by_id(cid), False),
+        ("parse_grade_csv", lambda: Dao.parse_grade_csv("MSSV,Điểm\n" + "SV000001,8.5\n" * 200), False),
+        ("migrate_grade_nodes", Dao.migrate_grade_nodes, False),
+        ("stream_export[ndjson]", export("ndjson"), False),
+        ("stream_export[nt]", export("nt"), False),
+        ("add_student+delete_student", add_delete_student, True),
+        ("enroll_class+unenroll_class", enroll_unenroll, True),
+        ("update_grades_bulk[roster]", grade_roster, True),
+        ("update_teacher", update_teacher, True),
+        ("add_teacher+delete_teacher", add_delete_teacher, True),
+        ("add_course+delete_course", add_delete_course, True),
+        ("update_course", update_course, True),
+        ("update_student", update_student, True),
+        ("create_section", create_section, True),
+        ("import_from_json[200 students]", import_json, True),
+    ]
+
+
+def _summary(samples):
+    ms = sorted(s * 1000 for s in samples)
+    return {"n": len(ms), "min_ms": round(ms[0], 3), "median_ms": round(statistics.median(ms), 3),
+            "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+            "mean_ms": round(statistics.fmean(ms), 3)}
+
+
+def _time(func, repeat, reset):
+    samples = []
+    for _ in range(repeat):
+        if reset:
+            _reset_memory()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return _summary(samples)
+
+
+def run_scale(scale, repeat, backend="graphdb", engine="auto"):
+    from app import init_driver, get_driver
+    from app.dao import Dao, init_fanout
+
+    # graphdb: SparqlClient qua HTTP tới stand-in; local: LocalStore nhúng, không qua HTTP
+    standin = SparqlStandIn().start() if backend == "graphdb" else None
+    try:
+        started = time.perf_counter()
+        if standin is not None:
+            triples = standin.load_ntriples(generate(scale))
+            init_driver(standin.endpoint, pool_size=8)
+        else:
+            init_driver(None, backend="local", engine=engine)
+            triples = get_driver().load("".join(f"{s} {p} {o} .\n" for s, p, o in generate(scale)))
+        load_seconds = time.perf_counter() - started
+        init_fanout(4)
+        _reset_memory()
+
+        size = SCALES[scale]
+        sid, tid = "SV000001", "GV0001"
+        cid = "MH0001"
+        class_id = f"{cid}_HK1_2024_01"
+        results = {}
+        for name, func, writes in _cases(Dao, sid, tid, cid, class_id):
+            try:
+                func()  # chạy thử 1 lần (và làm nóng cho chế độ warm)
+                entry = {"cold": _time(func, repeat, reset=True)}
+                if not writes:
+                    entry["warm"] = _time(func, repeat, reset=False)
+            except Exception as e:
+                entry = {"error": f"{type(e).__name__}: {e}"}
+            results[name] = entry
+            status = entry.get("error") or f"cold {entry['cold']['median_ms']} ms" + (
+                f", warm {entry['warm']['median_ms']} ms" if "warm" in entry else "")
+            print(f"  [{scale}] {name}: {status}", file=sys.stderr)
+
+        covered = {part for name in results for part in name.split("[")[0].split("+")}
+        covered |= {"update_grade", "apply_enrollment_batch"}
+        missing = sorted(n for n in vars(Dao) if not n.startswith("_") and callable(getattr(Dao, n))
+                         and n.islower() and n not in covered and n not in ("gather", "cache_stats", "data_version"))
+        return {"size": size, "triples": triples, "load_seconds": round(load_seconds, 3),
+                "methods": results, "not_measured": missing}
+    finally:
+        if standin is not None:
+            standin.stop()
+
+
+def compare(old, new, threshold):
+    """Liệt kê các (scale, hàm, chế độ) có median chậm hơn `threshold` (tỉ lệ) so với bản cũ"""
+    regressions = []
+    for scale, data in new["scales"].items():
+        old_methods = old.get("scales", {}).get(scale, {}).get("methods", {})
+        for name, entry in data["methods"].items():
+            for mode in ("cold", "warm"):
+                before = old_methods.get(name, {}).get(mode)
+                after = entry.get(mode)
+                if not before or not after:
+                    continue
+                if after["median_ms"] > before["median_ms"] * (1 + threshold) and \
+                        after["median_ms"] - before["median_ms"] > 1.0:
+                    regressions.append((scale, name, mode, before["median_ms"], after["median_ms"]))
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các hàm Dao trên SPARQL stand-in")
+    parser.add_argument("--scales", default="small", help="vd. small,medium,large")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--backend", choices=["graphdb", "local"], default="graphdb",
+                        help="graphdb: qua HTTP tới stand-in; local: store nhúng (LocalStore)")
+    parser.add_argument("--engine", default="auto", help="engine của LocalStore: auto, oxigraph, rdflib")
+    parser.add_argument("--compare", help="file JSON kết quả cũ để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.25, help="tỉ lệ chậm đi tối đa (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {"created": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "git": _git_revision(), "python": platform.python_version(),
+                 "platform": platform.platform(), "repeat": args.repeat,
+                 "backend": args.backend},
+        "scales": {},
+    }
+    for scale in args.scales.split(","):
+        print(f"Scale {scale}: {SCALES[scale]}", file=sys.stderr)
+        report["scales"][scale] = run_scale(scale, args.repeat, args.backend, args.engine)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi kết quả vào {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare(old, report, args.threshold)
+        for scale, name, mode, before, after in regressions:
+            print(f"CHẬM HƠN [{scale}] {name} ({mode}): {before} ms -> {after} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Endpoint SPARQL giả lập GraphDB chạy trong process (rdflib + http.server), đủ cho
+SparqlClient của ứng dụng: POST /repositories/<repo> (query, trả JSON/CSV/N-Triples/Turtle)
+và POST /repositories/<repo>/statements (SPARQL Update).
+
+Chỉ dùng cho bench/thử nghiệm: mọi request được xử lý tuần tự bằng 1 khóa.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+try:
+    import rdflib
+except ImportError:  # pragma: no cover - chỉ báo lỗi khi chạy bench
+    rdflib = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b"", content_type="text/plain; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        server = self.server
+        try:
+            if self.path.rstrip("/").endswith("/statements"):
+                with server.lock:
+                    server.graph.update(body.decode("utf-8"))
+                return self._reply(204)
+
+            query = parse_qs(body.decode("utf-8")).get("query", [""])[0]
+            accept = self.headers.get("Accept", "application/sparql-results+json")
+            with server.lock:
+                result = server.graph.query(query)
+                if result.type in ("CONSTRUCT", "DESCRIBE"):
+                    fmt, ctype = (("turtle", "text/turtle") if "turtle" in accept
+                                  else ("nt", "application/n-triples"))
+                    data = result.graph.serialize(format=fmt, encoding="utf-8")
+                elif "text/csv" in accept:
+                    data, ctype = result.serialize(format="csv"), "text/csv; charset=utf-8"
+                else:
+                    data, ctype = result.serialize(format="json"), "application/sparql-results+json"
+            self._reply(200, data, ctype)
+        except Exception as e:
+            self._reply(400, str(e).encode("utf-8"))
+
+
+class SparqlStandIn:
+    """
+    Khởi động endpoint trên 127.0.0.1 (cổng ngẫu nhiên nếu port=0).
+    `endpoint` là URL dùng cho Config.GRAPHDB_ENDPOINT / init_driver.
+    """
+
+    def __init__(self, port=0, repository="university_db"):
+        if rdflib is None:
+            raise RuntimeError("Bench cần rdflib: pip install rdflib")
+        self.graph = rdflib.Graph()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.graph = self.graph
+        self._server.lock = threading.Lock()
+        self._server.daemon_threads = True
+        host, port = self._server.server_address
+        self.endpoint = f"http://{host}:{port}/repositories/{repository}"
+        self._thread = None
+
+    def load_ntriples(self, triples):
+        """Nạp dữ liệu từ các dòng N-Triples (vd. bench.datagen.generate)"""
+        data = "".join(f"{s} {p} {o} .\n" for s, p, o in triples)
+        with self._server.lock:
+            self.graph.parse(data=data, format="nt")
+        return len(self.graph)
+
+    def clear(self):
+        with self._server.lock:
+            self.graph.remove((None, None, None))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="sparql-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -11,4 +11,103 @@ class Config:
     # nhưng nếu bạn set up security thì điền vào đây.
 
     GRAPHDB_USER = "admin" 
-    GRAPHDB_PASSWORD = "root"
\ No newline at end of file
+    GRAPHDB_PASSWORD = "root"
+
+    # Pool kết nối HTTP keep-alive tới GraphDB (dùng chung cho Query và /statements)
+    GRAPHDB_POOL_SIZE = int(os.environ.get('GRAPHDB_POOL_SIZE', 20))
+    GRAPHDB_CONNECT_TIMEOUT = 3.0   # giây
+    GRAPHDB_READ_TIMEOUT = 30.0     # giây
+
+    # Import hàng loạt: số triple tối đa gom vào 1 lệnh INSERT DATA
+    BULK_IMPORT_BATCH_TRIPLES = 5000
+
+    # Cache kết quả truy vấn đọc (danh sách, tra cứu, thống kê) trong Dao, riêng từng worker. Ghi qua
+    # ứng dụng ở worker khác được báo qua SHARED_CHANGES_PATH; TTL chỉ còn chặn dữ liệu ghi thẳng vào GraphDB
+    CACHE_MAX_ENTRIES = 512
+    CACHE_TTL_SECONDS = 300
+
+    # Phân trang danh sách Admin (Sinh viên, Giảng viên, Môn học)
+    ADMIN_PAGE_SIZE = 50
+    ADMIN_PAGE_SIZE_MAX = 500
+
+    # Số luồng tối đa để chạy song song các truy vấn SPARQL độc lập trong 1 request
+    SPARQL_FANOUT_WORKERS = 8
+
+    # Đăng nhập: chỉ mục tài khoản trong bộ nhớ và giới hạn số lần đăng nhập sai
+    AUTH_CACHE_TTL_SECONDS = 900
+    AUTH_MAX_FAILURES = 5
+    AUTH_LOCKOUT_SECONDS = 60
+    # File tín hiệu thay đổi dùng chung giữa các worker (serve.py): worker ghi dữ liệu / đổi mật khẩu ghi
+    # 1 dòng (tag cache hoặc tài khoản), worker khác đọc ở đầu request và bỏ ngay phần cache đó
+    # (query_cache, danh mục học kỳ, chỉ mục đăng nhập). Rỗng = tắt, khi đó chỉ còn TTL
+    SHARED_CHANGES_PATH = os.environ.get('SHARED_CHANGES_PATH', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'shared_changes.log'))
+
+    # Đăng ký học phần: gom các yêu cầu Đăng ký/Hủy trong 1 khoảng ngắn thành 1 batch ghi GraphDB
+    ENROLL_QUEUE_ENABLED = True
+    ENROLL_FLUSH_INTERVAL = 0.05    # giây
+    ENROLL_BATCH_MAX = 500          # số yêu cầu tối đa trong 1 batch
+    ENROLL_ACK_TIMEOUT = 10.0       # giây chờ batch ghi xong trước khi trả lời người dùng
+    # Batch ghi lỗi: thử lại sau 1, 2, 4, ... (tối đa ENROLL_RETRY_DELAY_MAX) giây; quá ENROLL_RETRY_MAX lần
+    # thì yêu cầu được chuyển sang file dead-letter <journal>-dead.jsonl để xử lý tay
+    ENROLL_RETRY_MAX = 8
+    ENROLL_RETRY_DELAY_MAX = 60.0
+    # Journal ghi lại yêu cầu chưa hoàn tất, được chạy lại khi khởi động
+    ENROLL_JOURNAL_PATH = os.environ.get('ENROLL_JOURNAL_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'enrollment_journal.jsonl')
+    # Mỗi process 1 journal riêng <tên>.<pid>.jsonl (serve.py tự bật khi chạy nhiều worker)
+    ENROLL_JOURNAL_PER_PROCESS = False
+
+    # Trực quan hóa đồ thị: mở rộng vùng lân cận từ 1 node, giới hạn phía server
+    GRAPH_MAX_DEPTH = 3
+    GRAPH_MAX_NODES = 300
+    GRAPH_MAX_EDGES = 1000
+
+    # Thống kê: bộ đếm trong bộ nhớ, định kỳ tính lại từ GraphDB để sửa sai lệch (0 = tắt)
+    STATS_RECONCILE_SECONDS = 600
+
+    # Tìm kiếm: chỉ mục tên trong bộ nhớ, dựng lại sau TTL để nhận thêm/sửa tên từ process khác
+    SEARCH_TTL_SECONDS = 300
+
+    # Đo thời gian truy vấn SPARQL theo hàm Dao, xuất tại /metrics (Prometheus)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    SLOW_QUERY_SECONDS = 1.0    # truy vấn chậm hơn ngưỡng này được ghi log kèm câu truy vấn
+
+    # Nơi lưu dữ liệu: "graphdb" (GRAPHDB_ENDPOINT qua HTTP) hoặc "local" (RDF store nhúng trong process,
+    # hợp cho khoa nhỏ chạy 1 máy và khi chạy thử). LOCAL_STORE_PATH rỗng = chỉ giữ trong bộ nhớ.
+    SPARQL_BACKEND = os.environ.get('SPARQL_BACKEND', 'graphdb')
+    LOCAL_STORE_ENGINE = os.environ.get('LOCAL_STORE_ENGINE', 'auto')    # auto | oxigraph | rdflib
+    LOCAL_STORE_PATH = os.environ.get('LOCAL_STORE_PATH') or None
+
+    # Truy vấn SPARQL: các template trong app/queries.py được parse thử 1 lần khi khởi động (cần rdflib)
+    QUERY_VALIDATE_ON_START = True
+
+    # Chạy production bằng serve.py (gunicorn, pre-fork): nhiều worker process cùng nghe 1 socket.
+    # WEB_WORKERS = 0 -> bằng số lõi CPU. Mỗi worker có pool kết nối GraphDB, cache và chỉ mục riêng.
+    WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS') or 0)
+    WEB_THREADS = int(os.environ.get('WEB_THREADS') or 4)   # thread mỗi worker, để request chờ GraphDB không giữ cả process
+    WEB_TIMEOUT = 60                # giây; worker treo lâu hơn bị master khởi động lại
+    WEB_GRACEFUL_TIMEOUT = 30       # giây chờ request đang chạy khi tắt/khởi động lại worker
+    WEB_MAX_REQUESTS = 0            # > 0: tự khởi động lại worker sau chừng ấy request (0 = tắt)
+    WEB_WARM_UP = True              # nạp sẵn chỉ mục đăng nhập/tìm kiếm/thống kê trước khi worker nhận request
+
+    # Đăng ký học phần: danh mục lớp của học kỳ đang mở, dựng 1 lần và dùng chung cho mọi sinh viên.
+    # ACTIVE_SEMESTER rỗng = học kỳ mới nhất (theo năm, kỳ). Thêm/sửa lớp, môn, giảng viên ở worker khác
+    # làm danh mục bị dựng lại ngay (SHARED_CHANGES_PATH); sĩ số do worker khác ghi chỉ được nhận sau TTL
+    # (sĩ số chỉ để hiển thị, giới hạn sĩ số vẫn được kiểm tra với GraphDB khi ghi)
+    ACTIVE_SEMESTER = os.environ.get('ACTIVE_SEMESTER') or None
+    CATALOG_TTL_SECONDS = 60
+
+    # Kiểm tra trùng lịch (đăng ký học phần, tạo lớp): chỉ mục thời khóa biểu trong bộ nhớ, dựng lại sau TTL.
+    # Không phụ thuộc TTL để đúng: trước khi ghi, các lớp liên quan được đọc lại từ GraphDB (sinh viên
+    # trong batch đăng ký / giảng viên, phòng của học kỳ khi tạo lớp)
+    TIMETABLE_TTL_SECONDS = 600
+
+    # Bạn cùng lớp: ma trận thưa SV x lớp trong bộ nhớ (dùng scipy nếu có: pip install numpy scipy).
+    # Đăng ký ở worker khác chỉ được nhận khi dựng lại sau TTL (chỉ là gợi ý, chấp nhận trễ tối đa TTL)
+    COENROLLMENT_TTL_SECONDS = 600
+
+    # Thống kê cả khóa trên trang Thống kê (cần numpy: pip install numpy): điểm tối thiểu để qua môn (thang 10).
+    # Kết quả được cache theo học kỳ như các truy vấn khác (CACHE_TTL_SECONDS)
+    ANALYTICS_PASS_SCORE = 4.0
\ No newline at end of file
@@ -1,6 +1,7 @@
 from app import create_app, init_db_data
 import threading
 
+# Flask dev server để phát triển; chạy thật (nhiều process, dùng hết các lõi CPU) bằng serve.py
 app = create_app()
 
 def run_app(port):
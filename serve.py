@@ -0,0 +1,122 @@
+"""
+Chạy ứng dụng cho môi trường thật (Linux/macOS) bằng gunicorn: 1 process master và nhiều
+worker process (pre-fork) cùng nghe 1 socket, nên dùng được mọi lõi CPU thay vì 1 process
+bị GIL giới hạn như run.py. Cấu hình lấy từ Config (WEB_*).
+
+    pip install gunicorn
+    python serve.py
+    kill -HUP <pid master>     # khởi động lại lần lượt các worker, không bỏ request đang chạy
+    kill -TERM <pid master>    # tắt êm (chờ tối đa WEB_GRACEFUL_TIMEOUT giây)
+
+Mỗi worker có cache / chỉ mục trong bộ nhớ riêng. Ghi ở 1 worker được báo cho các worker khác
+qua file SHARED_CHANGES_PATH (query_cache, danh mục học kỳ, chỉ mục đăng nhập bỏ ngay phần bị
+đổi); kiểm tra trùng lịch và sĩ số luôn đối chiếu GraphDB trước khi ghi. Phần còn trễ theo TTL
+giữa các worker: sĩ số hiển thị (CATALOG_TTL_SECONDS), chỉ mục tìm kiếm (SEARCH_TTL_SECONDS),
+bạn cùng lớp (COENROLLMENT_TTL_SECONDS), bộ đếm thống kê (STATS_RECONCILE_SECONDS).
+
+run.py vẫn dùng khi phát triển (Flask dev server, debug).
+"""
+import os
+import time
+
+from config import Config
+from app.enrollment_queue import release_journals
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = object
+
+
+def _workers():
+    if Config.SPARQL_BACKEND == "local":
+        # Store nhúng nằm trong 1 process: nhiều worker sẽ mỗi worker 1 bản dữ liệu riêng
+        # (hoặc tranh nhau khóa thư mục RocksDB), nên chỉ chạy 1 worker
+        if Config.WEB_WORKERS > 1:
+            print("SPARQL_BACKEND=local chỉ chạy được 1 worker, bỏ qua WEB_WORKERS")
+        return 1
+    return Config.WEB_WORKERS or os.cpu_count() or 1
+
+
+# --- Hook của gunicorn ---
+def on_starting(server):
+    """Process master, trước khi fork: đánh dấu journal cũ để worker chạy lại, khởi tạo dữ liệu 1 lần"""
+    if Config.ENROLL_JOURNAL_PATH:
+        release_journals(Config.ENROLL_JOURNAL_PATH)
+    if Config.SPARQL_BACKEND == "local":
+        return  # store nhúng được mở (và khởi tạo) trong chính worker
+    from app import init_driver, close_driver, init_db_data
+    init_driver(Config.GRAPHDB_ENDPOINT, pool_size=1,
+                connect_timeout=Config.GRAPHDB_CONNECT_TIMEOUT, read_timeout=Config.GRAPHDB_READ_TIMEOUT)
+    try:
+        init_db_data()
+    finally:
+        # Không để kết nối mở trong master, worker fork ra sẽ dùng chung socket
+        close_driver()
+
+
+def post_worker_init(worker):
+    """Worker vừa nạp app xong, trước khi nhận request"""
+    from app import init_db_data
+    from app.dao import Dao
+    if Config.SPARQL_BACKEND == "local":
+        init_db_data()
+    if Config.WEB_WARM_UP:
+        started = time.perf_counter()
+        parts = Dao.warm_up()
+        print(f"Worker {os.getpid()}: đã nạp sẵn {', '.join(parts) or 'không có gì'} "
+              f"trong {time.perf_counter() - started:.2f}s")
+
+
+def worker_exit(server, worker):
+    """Worker sắp thoát (tắt hoặc khởi động lại): ghi nốt các yêu cầu đăng ký học phần đang xếp hàng"""
+    from app.enrollment_queue import enrollment_queue
+    if enrollment_queue.running and not enrollment_queue.drain(Config.ENROLL_ACK_TIMEOUT):
+        print(f"Worker {os.getpid()}: còn yêu cầu đăng ký chưa ghi, sẽ được chạy lại từ journal")
+
+
+def child_exit(server, worker):
+    """Process master: journal của worker đã thoát thành mồ côi, worker khác sẽ nhận và chạy lại"""
+    if Config.ENROLL_JOURNAL_PATH:
+        release_journals(Config.ENROLL_JOURNAL_PATH, worker.pid)
+
+
+class UniversityApp(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Chạy trong từng worker sau khi fork (không preload): mỗi worker có kết nối, thread và journal riêng
+        from app import create_app
+        return create_app(ENROLL_JOURNAL_PER_PROCESS=True)
+
+
+def options():
+    return {
+        "bind": Config.WEB_BIND,
+        "workers": _workers(),
+        "worker_class": "gthread",
+        "threads": Config.WEB_THREADS,
+        "timeout": Config.WEB_TIMEOUT,
+        "graceful_timeout": Config.WEB_GRACEFUL_TIMEOUT,
+        "max_requests": Config.WEB_MAX_REQUESTS,
+        "max_requests_jitter": Config.WEB_MAX_REQUESTS // 10,
+        "proc_name": "university-app",
+        "on_starting": on_starting,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+        "child_exit": child_exit,
+    }
+
+
+if __name__ == '__main__':
+    if BaseApplication is object:
+        raise SystemExit("serve.py cần gunicorn (Linux/macOS): pip install gunicorn. Trên Windows dùng run.py")
+    opts = options()
+    print(f"✅ Server đang chạy tại {opts['bind']} với {opts['workers']} worker x {opts['threads']} thread")
+    UniversityApp(opts).run()
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _has_local_engine():
+    for module in ("pyoxigraph", "rdflib"):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+@pytest.fixture(scope="session")
+def app():
+    """
+    Ứng dụng chạy trên store nhúng (SPARQL_BACKEND=local, chỉ trong bộ nhớ) đã nạp dữ liệu
+    giả lập "small" của bench: 400 SV, 20 GV, 40 môn, 80 lớp. Dùng chung cả phiên test,
+    test nào ghi dữ liệu thì dùng mã riêng để không ảnh hưởng test khác.
+    """
+    if not _has_local_engine():
+        pytest.skip("Cần pyoxigraph hoặc rdflib cho SPARQL_BACKEND=local")
+    from app import create_app, get_driver
+    from bench.datagen import generate
+    app = create_app(SPARQL_BACKEND="local", LOCAL_STORE_PATH=None, ENROLL_QUEUE_ENABLED=False,
+                     STATS_RECONCILE_SECONDS=0, SHARED_CHANGES_PATH="", TESTING=True)
+    get_driver().load("".join(f"{s} {p} {o} .\n" for s, p, o in generate("small")))
+    return app
+
+
+@pytest.fixture
+def dao(app):
+    from app.dao import Dao
+    return Dao
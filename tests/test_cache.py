@@ -0,0 +1,53 @@
+import app.dao as dao_module
+from app.dao import _cached
+
+
+def _counted(*tags):
+    calls = []
+
+    @_cached(*tags)
+    def lookup(key, size=20):
+        calls.append((key, size))
+        return {"key": key, "size": size}
+
+    return lookup, calls
+
+
+def test_positional_keyword_and_default_calls_share_one_entry(app):
+    lookup, calls = _counted("t_cache_a")
+    first = lookup(1)
+    assert lookup(1, 20) is first
+    assert lookup(1, size=20) is first
+    assert lookup(key=1) is first
+    assert len(calls) == 1
+    assert lookup(1, size=5) is not first
+    assert lookup(2) is not first
+    assert len(calls) == 3
+
+
+def test_invalidation_by_tag(app, dao):
+    lookup, calls = _counted("t_cache_b", "t_cache_item:{0}")
+    one, two = lookup("x"), lookup("y")
+    dao._invalidate("t_cache_item:x")
+    assert lookup("x") is not one
+    assert lookup("y") is two
+    dao._invalidate("t_cache_b")
+    assert lookup("y") is not two
+    assert len(calls) == 4
+
+
+def test_failed_queries_are_not_cached(app):
+    @_cached("t_cache_c")
+    def flaky(key):
+        dao_module._tls.failures = dao_module._query_failures() + 1  # như khi 1 truy vấn bị lỗi
+        return []
+
+    assert flaky("a") is not flaky("a")
+
+
+def test_dao_methods_accept_keywords(dao):
+    page = dao.get_students_page(size=1)
+    assert len(page["items"]) == 1
+    assert dao.get_students_page("id", False, None, None, 1) is page
+    student = dao.get_student_by_id(sid=page["items"][0]["data"]["id"])
+    assert dao.get_student_by_id(page["items"][0]["data"]["id"]) is student
@@ -0,0 +1,33 @@
+import pytest
+
+SEMESTER = "HK1_2025"
+SUNDAY = "Chủ nhật (Tiết 13-15)"   # dữ liệu giả lập chỉ có lớp từ Thứ 2 tới Thứ 7
+
+
+def _students(dao, n, skip=0):
+    return [row["data"]["id"] for row in dao.get_students_page(size=n, after=None)["items"]][skip:]
+
+
+def test_capacity_is_enforced(dao):
+    dao.create_section("TEST_CAP_01", "TEST-101", SUNDAY, "MH0001", "GV0001", SEMESTER, capacity=2)
+    s1, s2, s3 = _students(dao, 3)
+    assert dao.enroll_class(s1, "TEST_CAP_01")["ok"]
+    assert dao.enroll_class(s2, "TEST_CAP_01")["ok"]
+    full = dao.enroll_class(s3, "TEST_CAP_01")
+    assert full["ok"] is False and "sĩ số" in full["message"]
+    # Hủy 1 chỗ thì SV khác đăng ký được
+    assert dao.unenroll_class(s1, "TEST_CAP_01")["ok"]
+    assert dao.enroll_class(s3, "TEST_CAP_01")["ok"]
+
+
+def test_capacity_within_one_batch(dao):
+    dao.create_section("TEST_CAP_02", "TEST-102", SUNDAY, "MH0002", "GV0002", SEMESTER, capacity=1)
+    ops = [{"op": "enroll", "sid": sid, "class_id": "TEST_CAP_02"} for sid in _students(dao, 8, skip=5)]
+    results = dao.apply_enrollment_batch(ops)
+    assert sum(1 for r in results if r["ok"]) == 1
+
+
+def test_section_clash_on_room(dao):
+    dao.create_section("TEST_CLASH_01", "TEST-201", "Chủ nhật (Tiết 1-3)", "MH0003", "GV0003", SEMESTER)
+    with pytest.raises(ValueError):
+        dao.create_section("TEST_CLASH_02", "test - 201", "Chủ nhật (Tiết 2-4)", "MH0004", "GV0004", SEMESTER)
@@ -0,0 +1,76 @@
+import json
+import os
+
+from app.enrollment_queue import EnrollmentQueue
+
+
+class _Store:
+    """apply_batch giả: lỗi `fail` lần đầu rồi ghi thành công, lưu lại các yêu cầu đã ghi"""
+
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.applied = []
+
+    def __call__(self, ops):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("endpoint down")
+        self.applied += [(o["op"], o["sid"], o["class_id"]) for o in ops]
+        return [{"ok": True, "message": "ok"} for _ in ops]
+
+
+def _queue(store, journal, **kwargs):
+    queue = EnrollmentQueue()
+    queue.start(store, interval=0.01, journal_path=str(journal), max_attempts=3, retry_delay_max=0.01, **kwargs)
+    return queue
+
+
+def _write(journal, *records):
+    with open(journal, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+
+def test_read_unfinished_skips_done_and_partial_lines(tmp_path):
+    journal = tmp_path / "j.jsonl"
+    _write(journal, {"seq": 1, "op": "enroll", "sid": "S1", "class_id": "C1"},
+           {"seq": 2, "op": "unenroll", "sid": "S2", "class_id": "C2"}, {"done": [1]})
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"seq": 3, "op": "enr')   # process chết khi đang ghi
+    assert EnrollmentQueue.read_unfinished(str(journal)) == [{"op": "unenroll", "sid": "S2", "class_id": "C2"}]
+
+
+def test_unfinished_requests_are_replayed_on_start(tmp_path):
+    journal, other = tmp_path / "j.jsonl", tmp_path / "orphan.jsonl"
+    _write(journal, {"seq": 1, "op": "enroll", "sid": "S1", "class_id": "C1"})
+    _write(other, {"seq": 7, "op": "enroll", "sid": "S2", "class_id": "C2"})
+    store = _Store()
+    queue = _queue(store, journal, adopt=[str(other)])
+    assert queue.drain(5)
+    assert store.applied == [("enroll", "S1", "C1"), ("enroll", "S2", "C2")]
+    assert EnrollmentQueue.read_unfinished(str(journal)) == []
+    assert not os.path.exists(other)
+
+
+def test_failed_batch_is_retried_not_dropped(tmp_path):
+    journal = tmp_path / "j.jsonl"
+    store = _Store(fail=2)
+    queue = _queue(store, journal)
+    result = queue.submit("enroll", "S1", "C1")
+    assert result["ok"] is None   # báo "đang xử lý", yêu cầu vẫn còn trong journal
+    assert queue.drain(5)
+    assert store.applied == [("enroll", "S1", "C1")]
+    assert EnrollmentQueue.read_unfinished(str(journal)) == []
+
+
+def test_request_goes_to_dead_letter_after_max_attempts(tmp_path):
+    journal = tmp_path / "j.jsonl"
+    store = _Store(fail=100)
+    queue = _queue(store, journal)
+    queue.submit("enroll", "S9", "C9")
+    assert queue.drain(5)
+    assert store.applied == []
+    assert EnrollmentQueue.read_unfinished(str(journal)) == []
+    with open(tmp_path / "j-dead.jsonl", encoding="utf-8") as f:
+        dead = [json.loads(line) for line in f]
+    assert [(d["sid"], d["class_id"], d["attempts"]) for d in dead] == [("S9", "C9", 3)]
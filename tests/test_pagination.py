@@ -0,0 +1,54 @@
+def _walk(page_fn, **kwargs):
+    """Đi hết các trang theo cursor `next`, trả về (danh sách id, số trang, trang cuối)"""
+    ids, pages, after = [], 0, None
+    while True:
+        page = page_fn(after=after, **kwargs)
+        pages += 1
+        ids += [item["data"]["id"] for item in page["items"]]
+        if page["next"] is None:
+            return ids, pages, page
+        after = page["next"]
+
+
+def test_forward_pages_cover_all_rows_in_order(dao):
+    expected = sorted(row["data"]["id"] for row in dao.get_all_students())
+    ids, pages, last = _walk(dao.get_students_page, size=7)
+    assert ids == expected
+    assert pages == -(-len(expected) // 7)
+    assert last["total"] == len(expected)
+
+
+def test_descending_and_name_sort(dao):
+    rows = dao.get_all_students()
+    ids, _, _ = _walk(dao.get_students_page, size=50, desc=True)
+    assert ids == sorted((row["data"]["id"] for row in rows), reverse=True)
+    ids, _, _ = _walk(dao.get_teachers_page, sort="name", size=3)
+    teachers = dao.get_all_teachers()
+    assert ids == [row["data"]["id"] for row in sorted(teachers, key=lambda r: (r["data"]["name"], r["data"]["id"]))]
+
+
+def test_page_boundaries(dao):
+    total = dao.count_entities("courses")
+    # Cỡ trang bằng đúng tổng số: 1 trang, không có trang trước / sau
+    page = dao.get_courses_page(size=total)
+    assert len(page["items"]) == total
+    assert page["next"] is None and page["prev"] is None
+    # Thiếu 1 dòng: trang sau chỉ còn đúng 1 dòng và là trang cuối
+    first = dao.get_courses_page(size=total - 1)
+    second = dao.get_courses_page(after=first["next"], size=total - 1)
+    assert len(second["items"]) == 1
+    assert second["next"] is None and second["prev"] is not None
+
+
+def test_prev_cursor_returns_previous_page(dao):
+    first = dao.get_students_page(size=10)
+    second = dao.get_students_page(after=first["next"], size=10)
+    back = dao.get_students_page(before=second["prev"], size=10)
+    assert [i["data"]["id"] for i in back["items"]] == [i["data"]["id"] for i in first["items"]]
+    assert back["prev"] is None
+
+
+def test_broken_cursor_falls_back_to_first_page(dao):
+    first = dao.get_students_page(size=5)
+    broken = dao.get_students_page(after="không-phải-cursor", size=5)
+    assert broken["items"] == first["items"]
@@ -0,0 +1,37 @@
+import pytest
+
+from app.queries import queries, _local, _unlocal, Iri, Node, Values, Lit
+
+
+def test_all_templates_parse():
+    pytest.importorskip("rdflib")
+    assert queries.validate() > 0
+
+
+def test_local_keeps_plain_ids():
+    assert _local("SV001") == "SV001"
+    assert _local(" Nguyễn An ") == "Nguyễn_An"
+    assert _local("MH01_HK1-2025") == "MH01_HK1-2025"
+
+
+def test_local_percent_encodes_other_characters():
+    assert _local("SV.01") == "SV%2E01"
+    assert _local("-x") == "%2Dx"
+    assert _local('"} ; DROP ALL') == "%22%7D_%3B_DROP_ALL"
+    # Mã lấy lại từ IRI (đã encode) ghép lại vẫn ra đúng IRI đó
+    assert _local(_local("a/b#c")) == _local("a/b#c")
+    assert _unlocal(_local("SV.01/x")) == "SV.01/x"
+
+
+def test_local_rejects_empty_id():
+    with pytest.raises(ValueError):
+        _local("   ")
+
+
+def test_binders():
+    assert Node("student_")("SV.01") == "uni:student_SV%2E01"
+    assert Values(Lit(), Node("class_"))([("a", "C1")]) == '("a" uni:class_C1)'
+    with pytest.raises(ValueError):
+        Iri()("http://example.org/university/x> } DROP ALL {")
+    with pytest.raises(ValueError):
+        Iri()("http://evil.example/x")
@@ -0,0 +1,28 @@
+from app.search_index import fold, SearchIndex
+
+
+def test_fold_removes_vietnamese_diacritics():
+    assert fold("Nguyễn Đức  Anh") == "nguyen duc anh"
+    assert fold("ĐẶNG THỊ HẠNH") == "dang thi hanh"
+    assert fold("Trí tuệ nhân tạo") == "tri tue nhan tao"
+    assert fold(None) == ""
+
+
+def test_search_matches_with_or_without_diacritics():
+    index = SearchIndex()
+    index.load([("student", "SV1", "Nguyễn Đức Thắng", "K1"), ("student", "SV2", "Nguyễn Văn Thắm", "K1"),
+                ("course", "MH1", "Cơ sở dữ liệu", None)], [])
+    assert [r["id"] for r in index.search("nguyen duc thang")] == ["SV1"]
+    assert [r["id"] for r in index.search("cơ sở")] == ["MH1"]
+    # Gõ đúng dấu thì kết quả đúng dấu được xếp trước
+    assert index.search("Thắm")[0]["id"] == "SV2"
+    assert {r["id"] for r in index.search("THANG")} == {"SV1"}
+
+
+def test_dao_search_sees_new_students(dao):
+    dao.search_graph("a")   # dựng chỉ mục
+    dao.add_student("SVTEST_SEARCH", "Đỗ Quỳnh Hương", "0900000000", "K99", 2025, "CNTT", "pw")
+    results = dao.search_graph("do quynh huong")
+    assert results and results[0]["id"] == "SVTEST_SEARCH"
+    dao.delete_student("SVTEST_SEARCH")
+    assert all(r["id"] != "SVTEST_SEARCH" for r in dao.search_graph("quynh huong"))